@@ -1,16 +1,23 @@
 from flask import Flask, request, jsonify
 from sqlalchemy.orm import sessionmaker
-from sqlalchemy import create_engine
+from sqlalchemy import create_engine, insert, literal, select, tuple_
+from sqlalchemy.orm import load_only
 from models import Booking, Base
 import os
 from dotenv import load_dotenv
 import logging
-import requests
+import base64
+from datetime import date, datetime
+from outbox import BOOKING_CONFIRMED_QUEUE, OutboxRelay, add_message, make_broker
+from rollups import record_sales, sales_series, sales_totals, top_events
+from idempotency import MAX_KEY_LENGTH, KeyPurger, KeyReused, claim, complete
+from metrics import instrument_flask, instrument_sqlalchemy_pool
 
 # Load environment variables
 load_dotenv()
 
 app = Flask(__name__)
+instrument_flask(app)
 
 # Configure logging
 logging.basicConfig(level=logging.INFO)
@@ -19,42 +26,82 @@ logging.basicConfig(level=logging.INFO)
 DATABASE_URL = os.getenv("BOOKING_DB_URL")
 engine = create_engine(DATABASE_URL)
 SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind=engine)
+instrument_sqlalchemy_pool(engine, "booking")
+# New tables get their indexes here; indexes added to an existing table are
+# built online by the one-off migration `python indexes.py`
 Base.metadata.create_all(bind=engine)
 
-NOTIFICATION_SERVICE_URL = "http://notification-service:5004/send-email"
+IDEMPOTENCY_HEADER = "Idempotency-Key"
 
-def notify_user(booking_id, user_email):
-    """Send booking confirmation request to the Notification Service"""
-    try:
-        payload = {
-            "booking_id": booking_id,
-            "user_email": user_email
-        }
-        response = requests.post(f"{NOTIFICATION_SERVICE_URL}", json=payload)
+# Booking confirmations are written to the outbox and relayed to RabbitMQ
+outbox_relay = OutboxRelay(SessionLocal, make_broker())
+# Idempotency keys past their TTL are deleted periodically
+key_purger = KeyPurger(SessionLocal)
 
-        if response.status_code == 200:
-            logging.info(f"✅ Notification sent successfully: {payload}")
-        else:
-            logging.error(f"❌ Failed to send notification: {response.text}")
+REQUIRED_FIELDS = ["user_id", "event_id", "tickets", "amount", "user_email"]
+BOOKING_BATCH_MAX = int(os.getenv("BOOKING_BATCH_MAX", 500))
 
-    except Exception as e:
-        logging.error(f"❌ Error calling Notification Service: {str(e)}")
+def validate_booking(data):
+    """Return an error message for an invalid booking payload, or None"""
+    if not isinstance(data, dict):
+        return "Booking must be an object"
+    for field in REQUIRED_FIELDS:
+        if field not in data:
+            return f"Missing required field: {field}"
+    if isinstance(data["tickets"], bool) or not isinstance(data["tickets"], int) or data["tickets"] <= 0:
+        return "tickets must be a positive integer"
+    if isinstance(data["amount"], bool) or not isinstance(data["amount"], (int, float)) or data["amount"] < 0:
+        return "amount must be a non-negative number"
+    if "reservation_id" in data and not isinstance(data["reservation_id"], str):
+        return "reservation_id must be a string"
+    return None
+
+def replayed(stored):
+    """Response recorded for an idempotency key, flagged as a replay"""
+    status_code, body = stored
+    response = jsonify(body)
+    response.headers["Idempotent-Replayed"] = "true"
+    return response, status_code
+
+def idempotency_key():
+    """Idempotency-Key header, or None; raises ValueError if it is too long"""
+    key = request.headers.get(IDEMPOTENCY_HEADER)
+    if key and len(key) > MAX_KEY_LENGTH:
+        raise ValueError(f"{IDEMPOTENCY_HEADER} must be at most {MAX_KEY_LENGTH} characters")
+    return key or None
 
 @app.route('/bookings', methods=['POST'])
 def create_booking():
-    """Create a new booking and publish confirmation event"""
-    data = request.get_json()
+    """Create a new booking and publish confirmation event
+
+    With an Idempotency-Key header, retries of the same request get the first
+    response back instead of creating another booking. An optional
+    reservation_id (the Event Service reservation paying for the tickets) is
+    echoed back, so a replay tells the caller which reservation the booking
+    used; it is not part of what makes two requests the same.
+    """
+    data = request.get_json(silent=True)
     logging.debug(f"Incoming request data: {data}")
 
-    # Validate required fields
-    required_fields = ["user_id", "event_id", "tickets", "amount", "user_email"]
-    for field in required_fields:
-        if field not in data:
-            logging.error(f"Missing required field: {field}")
-            return jsonify({"error": f"Missing required field: {field}"}), 400
+    # Same checks as every item of a batch
+    error = validate_booking(data)
+    if error:
+        logging.error(f"Invalid booking: {error}")
+        return jsonify({"error": error}), 400
+    try:
+        key = idempotency_key()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
 
     db = SessionLocal()
     try:
+        if key:
+            stored = claim(db, key, "create_booking",
+                           {field: value for field, value in data.items() if field != "reservation_id"})
+            if stored:
+                db.rollback()
+                return replayed(stored)
+
         # Create booking record
         booking = Booking(
             user_id=data["user_id"],
@@ -65,24 +112,36 @@ def create_booking():
         )
         
         db.add(booking)
-        db.commit()
-        db.refresh(booking)
-        logging.info(f"Booking created: ID {booking.id}")
+        db.flush()
+        record_sales(db, [data])
 
-        # Publish confirmation event
-        notify_user(
-            booking_id=booking.id,
-            user_email=data["user_email"]
-        )
+        # Confirmation message commits atomically with the booking
+        add_message(db, BOOKING_CONFIRMED_QUEUE, {
+            "booking_id": booking.id,
+            "user_email": data["user_email"]
+        })
 
-        return jsonify({
+        result = {
             "id": booking.id,
             "user_id": booking.user_id,
             "event_id": booking.event_id,
             "tickets": booking.tickets,
             "amount": booking.amount,
             "status": booking.status
-        }), 201
+        }
+        if "reservation_id" in data:
+            result["reservation_id"] = data["reservation_id"]
+        if key:
+            complete(db, key, 201, result)
+        db.commit()
+        outbox_relay.notify()
+        logging.info(f"Booking created: ID {result['id']}")
+
+        return jsonify(result), 201
+
+    except KeyReused:
+        db.rollback()
+        return jsonify({"error": f"{IDEMPOTENCY_HEADER} was already used for a different request"}), 422
 
     except Exception as e:
         db.rollback()
@@ -92,5 +151,210 @@ def create_booking():
     finally:
         db.close()
 
+def encode_booking_cursor(booking):
+    raw = f"{booking.created_at.isoformat()}|{booking.id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_booking_cursor(token):
+    created_at, booking_id = base64.urlsafe_b64decode(token.encode()).decode().split("|")
+    return datetime.fromisoformat(created_at), int(booking_id)
+
+@app.route('/bookings', methods=['GET'])
+def list_bookings():
+    """Booking history filtered by user_id, event_id and/or status, newest first
+
+    Optional created_from/created_to (ISO timestamps) bound created_at, `fields`
+    (comma separated) picks the returned columns, and `after` is the opaque
+    cursor from the previous page.
+    """
+    try:
+        user_id = int(request.args['user_id']) if request.args.get('user_id') else None
+    except ValueError:
+        return jsonify({"error": "user_id must be an integer"}), 400
+    event_id = request.args.get('event_id')
+    status = request.args.get('status')
+    if user_id is None and not event_id and not status:
+        return jsonify({"error": "One of user_id, event_id or status is required"}), 400
+    limit = max(1, min(request.args.get('limit', 50, type=int), 200))
+
+    fields = Booking.FIELDS
+    if request.args.get('fields'):
+        fields = tuple(f for f in request.args['fields'].split(',') if f in Booking.FIELDS)
+        if not fields:
+            return jsonify({"error": f"fields must be among {', '.join(Booking.FIELDS)}"}), 400
+
+    try:
+        created_from = request.args.get('created_from')
+        created_to = request.args.get('created_to')
+        created_from = datetime.fromisoformat(created_from) if created_from else None
+        created_to = datetime.fromisoformat(created_to) if created_to else None
+        after = decode_booking_cursor(request.args['after']) if request.args.get('after') else None
+    except ValueError:
+        return jsonify({"error": "Invalid created_from, created_to or after"}), 400
+
+    # Sort keys are always loaded so the next cursor can be built
+    columns = {Booking.id, Booking.created_at} | {getattr(Booking, f) for f in fields}
+    query = select(Booking).options(load_only(*columns))
+    if user_id is not None:
+        query = query.where(Booking.user_id == user_id)
+    if event_id:
+        query = query.where(Booking.event_id == event_id)
+    if status:
+        query = query.where(Booking.status == status)
+    if created_from:
+        query = query.where(Booking.created_at >= created_from)
+    if created_to:
+        query = query.where(Booking.created_at < created_to)
+    if after:
+        query = query.where(tuple_(Booking.created_at, Booking.id) < tuple_(literal(after[0]), literal(after[1])))
+    query = query.order_by(Booking.created_at.desc(), Booking.id.desc()).limit(limit + 1)
+
+    db = SessionLocal()
+    try:
+        bookings = db.execute(query).scalars().all()
+        next_cursor = None
+        if len(bookings) > limit:
+            bookings = bookings[:limit]
+            next_cursor = encode_booking_cursor(bookings[-1])
+        return jsonify({
+            "bookings": [booking.to_dict(fields) for booking in bookings],
+            "next_cursor": next_cursor
+        })
+    finally:
+        db.close()
+
+@app.route('/bookings/batch', methods=['POST'])
+def create_bookings_batch():
+    """Create many bookings in one transaction with one confirmation per user"""
+    data = request.get_json(silent=True) or {}
+    items = data.get("bookings")
+    if not isinstance(items, list) or not items:
+        return jsonify({"error": "'bookings' must be a non-empty list"}), 400
+    if len(items) > BOOKING_BATCH_MAX:
+        return jsonify({"error": f"At most {BOOKING_BATCH_MAX} bookings per batch"}), 400
+
+    # Validate every item before touching the database
+    errors = [(index, validate_booking(item)) for index, item in enumerate(items)]
+    errors = [{"index": index, "status": "invalid", "error": error} for index, error in errors if error]
+    if errors:
+        return jsonify({"error": "Invalid bookings in batch", "results": errors}), 400
+    try:
+        key = idempotency_key()
+    except ValueError as e:
+        return jsonify({"error": str(e)}), 400
+
+    rows = [{
+        "user_id": item["user_id"],
+        "event_id": item["event_id"],
+        "tickets": item["tickets"],
+        "amount": item["amount"],
+        "status": "confirmed"
+    } for item in items]
+
+    db = SessionLocal()
+    try:
+        if key:
+            stored = claim(db, key, "create_bookings_batch", items)
+            if stored:
+                db.rollback()
+                return replayed(stored)
+
+        # One multi-row INSERT ... RETURNING, ids come back in input order
+        inserted = db.execute(
+            insert(Booking).returning(Booking.id, sort_by_parameter_order=True),
+            rows
+        ).scalars().all()
+        record_sales(db, rows)
+
+        # One aggregated confirmation per recipient
+        by_email = {}
+        for item, booking_id in zip(items, inserted):
+            by_email.setdefault(item["user_email"], []).append(booking_id)
+        for user_email, booking_ids in by_email.items():
+            add_message(db, BOOKING_CONFIRMED_QUEUE, {
+                "booking_id": booking_ids,
+                "user_email": user_email
+            })
+
+        results = [
+            {"index": index, "status": "created", "booking": {"id": booking_id, **row}}
+            for index, (row, booking_id) in enumerate(zip(rows, inserted))
+        ]
+        body = {"created": len(results), "results": results}
+        if key:
+            complete(db, key, 201, body)
+
+        db.commit()
+        outbox_relay.notify()
+        logging.info(f"Batch of {len(inserted)} bookings created: IDs {inserted}")
+        return jsonify(body), 201
+
+    except KeyReused:
+        db.rollback()
+        return jsonify({"error": f"{IDEMPOTENCY_HEADER} was already used for a different request"}), 422
+
+    except Exception as e:
+        db.rollback()
+        logging.error(f"Batch booking creation failed: {str(e)}")
+        return jsonify({"error": "Internal server error"}), 500
+
+    finally:
+        db.close()
+
+def _sales_range():
+    start = request.args.get('from')
+    end = request.args.get('to')
+    return (date.fromisoformat(start) if start else None,
+            date.fromisoformat(end) if end else None)
+
+@app.route('/sales/totals', methods=['GET'])
+def get_sales_totals():
+    """Bookings, tickets sold and revenue across all events (optional from/to days)"""
+    try:
+        start, end = _sales_range()
+    except ValueError:
+        return jsonify({"error": "from/to must be YYYY-MM-DD"}), 400
+    db = SessionLocal()
+    try:
+        return jsonify(sales_totals(db, start, end))
+    finally:
+        db.close()
+
+@app.route('/sales/events/<event_id>', methods=['GET'])
+def get_event_sales(event_id):
+    """Totals and daily time series for one event"""
+    try:
+        start, end = _sales_range()
+    except ValueError:
+        return jsonify({"error": "from/to must be YYYY-MM-DD"}), 400
+    db = SessionLocal()
+    try:
+        return jsonify({
+            "event_id": event_id,
+            "totals": sales_totals(db, start, end, event_id),
+            "daily": sales_series(db, event_id, start, end)
+        })
+    finally:
+        db.close()
+
+@app.route('/sales/top', methods=['GET'])
+def get_top_events():
+    """Top-N events by revenue, tickets or bookings"""
+    by = request.args.get('by', 'revenue')
+    if by not in ("revenue", "tickets", "bookings"):
+        return jsonify({"error": "by must be revenue, tickets or bookings"}), 400
+    limit = max(1, min(request.args.get('limit', 10, type=int), 100))
+    try:
+        start, end = _sales_range()
+    except ValueError:
+        return jsonify({"error": "from/to must be YYYY-MM-DD"}), 400
+    db = SessionLocal()
+    try:
+        return jsonify({"by": by, "events": top_events(db, limit, start, end, by)})
+    finally:
+        db.close()
+
 if __name__ == '__main__':
+    outbox_relay.start()
+    key_purger.start()
     app.run(host="0.0.0.0", port=5003)
\ No newline at end of file
@@ -0,0 +1,107 @@
+"""Compare 1,000 single POST /bookings with 10 POST /bookings/batch of 100
+
+Runs the app in-process with Flask's test client against the database in
+BOOKING_DB_URL (use a scratch database: the booking tables are truncated
+before each run). Over a real network each single request also pays an
+HTTP round trip, so these numbers understate the gap.
+
+    BOOKING_DB_URL=postgresql://localhost/booking_bench OUTBOX_BROKER=memory python benchmarks/batch_throughput.py
+"""
+import argparse
+import os
+import sys
+import time
+from contextlib import contextmanager
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+TABLES = "bookings, outbox, event_sales_daily, idempotency_keys"
+
+
+def make_bookings(total, events=10, users=50):
+    return [{"user_id": i % users, "event_id": f"evt-{i % events}", "tickets": 1 + i % 4,
+             "amount": 100.0 * (1 + i % 4), "user_email": f"user{i % users}@example.com"}
+            for i in range(total)]
+
+
+def reset(app_module):
+    from sqlalchemy import text
+    with app_module.engine.begin() as conn:
+        conn.execute(text(f"TRUNCATE {TABLES} RESTART IDENTITY"))
+
+
+def run_single(client, bookings):
+    for item in bookings:
+        response = client.post("/bookings", json=item)
+        assert response.status_code == 201, response.get_json()
+    return len(bookings)
+
+
+def run_batched(client, bookings, batch_size):
+    requests = 0
+    for start in range(0, len(bookings), batch_size):
+        response = client.post("/bookings/batch", json={"bookings": bookings[start:start + batch_size]})
+        assert response.status_code == 201, response.get_json()
+        requests += 1
+    return requests
+
+
+def stored_counts(app_module):
+    from sqlalchemy import func, select
+    from models import Booking, OutboxMessage
+    with app_module.SessionLocal() as db:
+        return {"bookings": db.scalar(select(func.count()).select_from(Booking)),
+                "outbox_messages": db.scalar(select(func.count()).select_from(OutboxMessage))}
+
+
+@contextmanager
+def count_statements(engine):
+    """Count the SQL statements (database round trips) sent through `engine`"""
+    from sqlalchemy import event
+    counter = {"statements": 0}
+
+    def before_cursor_execute(*args):
+        counter["statements"] += 1
+
+    event.listen(engine, "before_cursor_execute", before_cursor_execute)
+    try:
+        yield counter
+    finally:
+        event.remove(engine, "before_cursor_execute", before_cursor_execute)
+
+
+def compare(app_module, total=1000, batch_size=100):
+    """Time both ways of creating `total` bookings from a clean table each"""
+    bookings = make_bookings(total)
+    client = app_module.app.test_client()
+    results = {}
+    for mode in ("single", "batched"):
+        reset(app_module)
+        with count_statements(app_module.engine) as counter:
+            started = time.perf_counter()
+            if mode == "single":
+                requests = run_single(client, bookings)
+            else:
+                requests = run_batched(client, bookings, batch_size)
+            elapsed = time.perf_counter() - started
+        results[mode] = {"requests": requests, "statements": counter["statements"], "seconds": round(elapsed, 3),
+                         "bookings_per_sec": round(total / elapsed, 1), **stored_counts(app_module)}
+    reset(app_module)
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--total", type=int, default=1000)
+    parser.add_argument("--batch-size", type=int, default=100)
+    args = parser.parse_args()
+
+    import app as app_module
+    results = compare(app_module, args.total, args.batch_size)
+    for mode, result in results.items():
+        print(f"{mode:>8}: {result}")
+    print(f"speedup: {results['batched']['bookings_per_sec'] / results['single']['bookings_per_sec']:.1f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,101 @@
+import hashlib
+import json
+import logging
+import os
+import threading
+from datetime import timedelta
+from sqlalchemy import delete, func, select, update
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models import IdempotencyKey
+
+# Keys older than this may be reused for a new request
+IDEMPOTENCY_KEY_TTL = timedelta(hours=int(os.getenv("IDEMPOTENCY_KEY_TTL_HOURS", 24)))
+MAX_KEY_LENGTH = 255
+# How often expired keys are deleted
+IDEMPOTENCY_PURGE_INTERVAL = float(os.getenv("IDEMPOTENCY_PURGE_INTERVAL", 3600))
+
+
+class KeyReused(Exception):
+    """The key was already used for a different request"""
+
+
+def request_hash(payload):
+    return hashlib.sha256(json.dumps(payload, sort_keys=True, default=str).encode()).hexdigest()
+
+
+def claim(db, key, endpoint, payload):
+    """Claim `key` inside the caller's transaction
+
+    Returns None when this request owns the key and should run, or the stored
+    (status_code, body) to replay. The key row is inserted uncommitted, so a
+    concurrent request with the same key blocks on the unique index until this
+    transaction commits (and then replays its response) or rolls back (and then
+    runs itself). Raises KeyReused if the key belongs to a different request.
+    """
+    digest = request_hash(payload)
+    stmt = pg_insert(IdempotencyKey).values(key=key, endpoint=endpoint, request_hash=digest)
+    stmt = stmt.on_conflict_do_update(
+        index_elements=[IdempotencyKey.key],
+        set_={"endpoint": endpoint, "request_hash": digest, "status_code": None,
+              "response_body": None, "created_at": func.now()},
+        where=IdempotencyKey.created_at < func.now() - IDEMPOTENCY_KEY_TTL
+    ).returning(IdempotencyKey.key)
+    if db.execute(stmt).first() is not None:
+        return None
+
+    stored = db.execute(select(IdempotencyKey).where(IdempotencyKey.key == key)).scalar_one()
+    if stored.endpoint != endpoint or stored.request_hash != digest:
+        raise KeyReused(key)
+    return stored.status_code, json.loads(stored.response_body)
+
+
+def complete(db, key, status_code, body):
+    """Store the response for `key`; commits with the caller's transaction"""
+    db.execute(
+        update(IdempotencyKey)
+        .where(IdempotencyKey.key == key)
+        .values(status_code=status_code, response_body=json.dumps(body, default=str))
+    )
+
+
+def purge_expired(db):
+    """Delete keys past their TTL; returns the number removed"""
+    result = db.execute(delete(IdempotencyKey).where(
+        IdempotencyKey.created_at < func.now() - IDEMPOTENCY_KEY_TTL
+    ))
+    db.commit()
+    return result.rowcount
+
+
+class KeyPurger:
+    """Background thread running purge_expired every `interval` seconds"""
+
+    def __init__(self, session_factory, interval=IDEMPOTENCY_PURGE_INTERVAL):
+        self.session_factory = session_factory
+        self.interval = interval
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name="idempotency-purger", daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def purge_once(self):
+        db = self.session_factory()
+        try:
+            return purge_expired(db)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                removed = self.purge_once()
+                if removed:
+                    logging.info(f"Purged {removed} expired idempotency keys")
+            except Exception as e:
+                logging.error(f"Idempotency key purge failed: {str(e)}")
@@ -0,0 +1,56 @@
+import argparse
+import logging
+from sqlalchemy import text
+from sqlalchemy.schema import CreateIndex
+from models import Base
+
+
+def invalid_indexes(conn):
+    """Names of indexes left INVALID by an interrupted concurrent build"""
+    return set(conn.execute(text(
+        "SELECT c.relname FROM pg_index i JOIN pg_class c ON c.oid = i.indexrelid "
+        "WHERE NOT i.indisvalid"
+    )).scalars())
+
+
+def create_indexes_concurrently(engine, tables=None):
+    """Create missing model indexes without blocking writes to their tables
+
+    Base.metadata.create_all() only builds indexes together with a new table,
+    so indexes added to an existing table go through here instead. CREATE
+    INDEX CONCURRENTLY can't run in a transaction, so the connection is in
+    autocommit mode; an index a previous run left INVALID is dropped and
+    built again. Returns the names of the indexes (re)built.
+    """
+    built = []
+    with engine.connect().execution_options(isolation_level="AUTOCOMMIT") as conn:
+        invalid = invalid_indexes(conn)
+        for table in Base.metadata.sorted_tables:
+            if tables and table.name not in tables:
+                continue
+            for index in sorted(table.indexes, key=lambda index: index.name):
+                if index.name in invalid:
+                    logging.warning(f"Rebuilding invalid index {index.name}")
+                    conn.execute(text(f'DROP INDEX CONCURRENTLY IF EXISTS "{index.name}"'))
+                elif conn.execute(text("SELECT to_regclass(:name)"), {"name": index.name}).scalar():
+                    continue
+                index.dialect_options["postgresql"]["concurrently"] = True
+                try:
+                    conn.execute(CreateIndex(index))
+                finally:
+                    index.dialect_options["postgresql"]["concurrently"] = False
+                logging.info(f"Created index {index.name} on {table.name}")
+                built.append(index.name)
+    return built
+
+
+if __name__ == "__main__":
+    from database import engine
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Create missing indexes with CREATE INDEX CONCURRENTLY")
+    parser.add_argument("tables", nargs="*", help="only these tables (default: all)")
+    args = parser.parse_args()
+
+    built = create_indexes_concurrently(engine, set(args.tables))
+    logging.info(f"{len(built)} indexes created")
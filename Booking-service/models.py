@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, Float, String, DateTime, func  # Add func import
+from sqlalchemy import Column, Integer, Float, String, Text, Date, DateTime, Index, func  # Add func import
 from database import Base
 from datetime import datetime
 
@@ -14,13 +14,71 @@ class Booking(Base):
 
     created_at = Column(DateTime, server_default=func.now())  # Use server_default
 
+    # History lookups filter on one key and page newest-first by (created_at, id)
+    __table_args__ = (
+        Index("ix_bookings_user_created", "user_id", "created_at", "id"),
+        Index("ix_bookings_event_created", "event_id", "created_at", "id"),
+        Index("ix_bookings_status_created", "status", "created_at", "id"),
+    )
+
+    FIELDS = ("id", "user_id", "event_id", "tickets", "amount", "status", "created_at")
+
+    def to_dict(self, fields=FIELDS):
+        data = {field: getattr(self, field) for field in fields}
+        if data.get("created_at") is not None:
+            data["created_at"] = data["created_at"].isoformat()
+        return data
+
+
+class OutboxMessage(Base):
+    """Message written in the same transaction as a booking, published later by the relay"""
+    __tablename__ = "outbox"
+    id = Column(Integer, primary_key=True)
+    queue = Column(String, nullable=False)
+    payload = Column(Text, nullable=False)
+    attempts = Column(Integer, nullable=False, default=0)
+    created_at = Column(DateTime, server_default=func.now())
+    published_at = Column(DateTime, nullable=True)
+
+    # The relay only ever scans unpublished rows in id order
+    __table_args__ = (
+        Index("ix_outbox_unpublished", "id", postgresql_where=published_at.is_(None)),
+    )
+
+
+class EventSalesDaily(Base):
+    """Tickets sold and revenue per event per day, kept up to date on every booking"""
+    __tablename__ = "event_sales_daily"
+    event_id = Column(String, primary_key=True)
+    day = Column(Date, primary_key=True)
+    bookings = Column(Integer, nullable=False, default=0)
+    tickets_sold = Column(Integer, nullable=False, default=0)
+    revenue = Column(Float, nullable=False, default=0.0)
+
+    __table_args__ = (
+        Index("ix_event_sales_daily_day", "day"),
+    )
+
     def to_dict(self):
         return {
-            "id": self.id,
-            "user_id": self.user_id,
             "event_id": self.event_id,
-            "tickets": self.tickets,
-            "amount": self.amount,
-            "status": self.status,
-            "created_at": self.created_at.isoformat() if self.created_at else None
-        }
\ No newline at end of file
+            "day": self.day.isoformat(),
+            "bookings": self.bookings,
+            "tickets_sold": self.tickets_sold,
+            "revenue": self.revenue
+        }
+
+
+class IdempotencyKey(Base):
+    """First response for an Idempotency-Key, replayed to retries of the same request"""
+    __tablename__ = "idempotency_keys"
+    key = Column(String, primary_key=True)
+    endpoint = Column(String, nullable=False)
+    request_hash = Column(String, nullable=False)
+    status_code = Column(Integer, nullable=True)
+    response_body = Column(Text, nullable=True)
+    created_at = Column(DateTime, server_default=func.now())
+
+    __table_args__ = (
+        Index("ix_idempotency_keys_created", "created_at"),
+    )
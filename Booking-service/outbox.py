@@ -0,0 +1,163 @@
+import json
+import logging
+import os
+import threading
+import pika
+from collections import defaultdict
+from datetime import datetime
+from sqlalchemy import select
+from models import OutboxMessage
+from metrics import rabbitmq_published
+
+OUTBOX_BROKER = os.getenv("OUTBOX_BROKER", "rabbitmq")
+OUTBOX_BATCH_SIZE = int(os.getenv("OUTBOX_BATCH_SIZE", 100))
+OUTBOX_POLL_INTERVAL = float(os.getenv("OUTBOX_POLL_INTERVAL", 0.5))
+
+BOOKING_CONFIRMED_QUEUE = "booking_confirmed"
+
+
+class InMemoryBroker:
+    """Broker that keeps published messages in memory (for tests and local runs)"""
+
+    def __init__(self):
+        self.queues = defaultdict(list)
+        self._lock = threading.Lock()
+
+    def publish_batch(self, queue, payloads):
+        with self._lock:
+            self.queues[queue].extend(json.loads(payload) for payload in payloads)
+
+    def close(self):
+        pass
+
+
+class RabbitMQBroker:
+    """Publishes persistent messages to RabbitMQ with publisher confirms"""
+
+    def __init__(self, host=None, port=None):
+        self.host = host or os.getenv("RABBITMQ_HOST", "rabbitmq")
+        self.port = int(port or os.getenv("RABBITMQ_PORT", 5672))
+        self._connection = None
+        self._channel = None
+        self._declared = set()
+
+    def _ensure_channel(self):
+        if self._channel is None or self._channel.is_closed:
+            self._connection = pika.BlockingConnection(
+                pika.ConnectionParameters(host=self.host, port=self.port)
+            )
+            self._channel = self._connection.channel()
+            self._channel.confirm_delivery()
+            self._declared.clear()
+        return self._channel
+
+    def publish_batch(self, queue, payloads):
+        try:
+            channel = self._ensure_channel()
+            if queue not in self._declared:
+                channel.queue_declare(queue=queue)
+                self._declared.add(queue)
+            properties = pika.BasicProperties(content_type="application/json", delivery_mode=2)
+            for payload in payloads:
+                channel.basic_publish(exchange="", routing_key=queue, body=payload, properties=properties)
+        except pika.exceptions.AMQPError:
+            # Drop the broken connection so the next batch reconnects
+            self.close()
+            raise
+
+    def close(self):
+        try:
+            if self._connection is not None and self._connection.is_open:
+                self._connection.close()
+        finally:
+            self._connection = self._channel = None
+
+
+def make_broker(kind=OUTBOX_BROKER):
+    return InMemoryBroker() if kind == "memory" else RabbitMQBroker()
+
+
+def add_message(db, queue, payload):
+    """Stage an outbox row in the caller's session; it commits with the caller"""
+    db.add(OutboxMessage(queue=queue, payload=json.dumps(payload)))
+
+
+class OutboxRelay:
+    """Background thread that publishes unpublished outbox rows in batches"""
+
+    def __init__(self, session_factory, broker, batch_size=OUTBOX_BATCH_SIZE,
+                 poll_interval=OUTBOX_POLL_INTERVAL):
+        self.session_factory = session_factory
+        self.broker = broker
+        self.batch_size = batch_size
+        self.poll_interval = poll_interval
+        self._stop = threading.Event()
+        self._wakeup = threading.Event()
+        self._thread = None
+
+    def start(self):
+        self._thread = threading.Thread(target=self._run, name="outbox-relay", daemon=True)
+        self._thread.start()
+
+    def stop(self, timeout=5.0):
+        self._stop.set()
+        self._wakeup.set()
+        if self._thread is not None:
+            self._thread.join(timeout)
+        self.broker.close()
+
+    def notify(self):
+        """Wake the relay early, e.g. right after a booking commits"""
+        self._wakeup.set()
+
+    def relay_once(self):
+        """Publish one batch; returns the number of messages published"""
+        db = self.session_factory()
+        try:
+            # SKIP LOCKED lets several relays share the table without double-sending
+            rows = db.execute(
+                select(OutboxMessage)
+                .where(OutboxMessage.published_at.is_(None))
+                .order_by(OutboxMessage.id)
+                .limit(self.batch_size)
+                .with_for_update(skip_locked=True)
+            ).scalars().all()
+            if not rows:
+                db.rollback()
+                return 0
+
+            by_queue = defaultdict(list)
+            for row in rows:
+                by_queue[row.queue].append(row)
+            try:
+                for queue, queue_rows in by_queue.items():
+                    self.broker.publish_batch(queue, [row.payload for row in queue_rows])
+                    rabbitmq_published.inc(queue, amount=len(queue_rows))
+            except Exception:
+                for row in rows:
+                    row.attempts += 1
+                db.commit()
+                raise
+
+            now = datetime.utcnow()
+            for row in rows:
+                row.published_at = now
+                row.attempts += 1
+            db.commit()
+            return len(rows)
+        except Exception:
+            db.rollback()
+            raise
+        finally:
+            db.close()
+
+    def _run(self):
+        while not self._stop.is_set():
+            try:
+                published = self.relay_once()
+            except Exception as e:
+                logging.error(f"Outbox relay failed: {str(e)}")
+                published = 0
+            if published < self.batch_size:
+                self._wakeup.wait(self.poll_interval)
+                self._wakeup.clear()
@@ -0,0 +1,197 @@
+import argparse
+import logging
+from collections import defaultdict
+from datetime import datetime, time, timedelta
+from sqlalchemy import Date, cast, delete, func, insert, select, text
+from sqlalchemy.dialects.postgresql import insert as pg_insert
+from models import Booking, EventSalesDaily
+
+ROLLUP_STATUSES = ("confirmed",)
+
+
+def record_sales(db, bookings):
+    """Add bookings to today's per-event rollups inside the caller's transaction
+
+    `bookings` are dicts with event_id, tickets and amount. Rows are upserted
+    in event_id order so concurrent batches lock them in the same order.
+    """
+    totals = defaultdict(lambda: [0, 0, 0.0])
+    for booking in bookings:
+        entry = totals[booking["event_id"]]
+        entry[0] += 1
+        entry[1] += booking["tickets"]
+        entry[2] += booking["amount"]
+    if not totals:
+        return
+
+    stmt = pg_insert(EventSalesDaily).values([
+        {
+            "event_id": event_id,
+            "day": func.current_date(),
+            "bookings": count,
+            "tickets_sold": tickets,
+            "revenue": revenue
+        }
+        for event_id, (count, tickets, revenue) in sorted(totals.items())
+    ])
+    db.execute(stmt.on_conflict_do_update(
+        index_elements=[EventSalesDaily.event_id, EventSalesDaily.day],
+        set_={
+            "bookings": EventSalesDaily.bookings + stmt.excluded.bookings,
+            "tickets_sold": EventSalesDaily.tickets_sold + stmt.excluded.tickets_sold,
+            "revenue": EventSalesDaily.revenue + stmt.excluded.revenue
+        }
+    ))
+
+
+def _in_range(query, start, end):
+    if start:
+        query = query.where(EventSalesDaily.day >= start)
+    if end:
+        query = query.where(EventSalesDaily.day <= end)
+    return query
+
+
+def _aggregates():
+    return (
+        func.coalesce(func.sum(EventSalesDaily.bookings), 0).label("bookings"),
+        func.coalesce(func.sum(EventSalesDaily.tickets_sold), 0).label("tickets_sold"),
+        func.coalesce(func.sum(EventSalesDaily.revenue), 0.0).label("revenue")
+    )
+
+
+def sales_totals(db, start=None, end=None, event_id=None):
+    query = _in_range(select(*_aggregates()), start, end)
+    if event_id:
+        query = query.where(EventSalesDaily.event_id == event_id)
+    return dict(db.execute(query).one()._mapping)
+
+
+def sales_series(db, event_id, start=None, end=None):
+    query = _in_range(
+        select(EventSalesDaily).where(EventSalesDaily.event_id == event_id),
+        start, end
+    ).order_by(EventSalesDaily.day)
+    return [row.to_dict() for row in db.execute(query).scalars()]
+
+
+def top_events(db, limit=10, start=None, end=None, by="revenue"):
+    aggregates = _aggregates()
+    order = {"revenue": aggregates[2], "tickets": aggregates[1], "bookings": aggregates[0]}[by]
+    query = _in_range(
+        select(EventSalesDaily.event_id, *aggregates).group_by(EventSalesDaily.event_id),
+        start, end
+    ).order_by(order.desc()).limit(limit)
+    return [dict(row._mapping) for row in db.execute(query)]
+
+
+def compute_range(db, start, end):
+    """Totals per (event_id, day) recomputed from bookings created in [start, end)
+
+    The status/created_at filter is served by ix_bookings_status_created, so a
+    range costs a scan of its own bookings only.
+    """
+    day = cast(Booking.created_at, Date)
+    rows = db.execute(
+        select(Booking.event_id, day, func.count(), func.sum(Booking.tickets), func.sum(Booking.amount))
+        .where(Booking.status.in_(ROLLUP_STATUSES))
+        .where(Booking.created_at >= datetime.combine(start, time.min))
+        .where(Booking.created_at < datetime.combine(end, time.min))
+        .group_by(Booking.event_id, day)
+    )
+    return {
+        (event_id, booking_day): [count, tickets or 0, revenue or 0.0]
+        for event_id, booking_day, count, tickets, revenue in rows
+    }
+
+
+def day_ranges(db, days_per_chunk=7):
+    """[start, end) date ranges covering every booking and rollup day, oldest first
+
+    Today always comes last in a range of its own: it is the only day live
+    bookings still add to.
+    """
+    first_booking = db.scalar(
+        select(func.min(Booking.created_at)).where(Booking.status.in_(ROLLUP_STATUSES))
+    )
+    first_rollup = db.scalar(select(func.min(EventSalesDaily.day)))
+    today = db.scalar(select(func.current_date()))
+    days = [d.date() if isinstance(d, datetime) else d for d in (first_booking, first_rollup) if d]
+    start = min(days, default=today)
+    while start < today:
+        end = min(start + timedelta(days=days_per_chunk), today)
+        yield start, end
+        start = end
+    yield today, today + timedelta(days=1)
+
+
+def rebuild(db, days_per_chunk=7):
+    """Replace the rollups with totals recomputed from bookings, one day range at a time
+
+    Each range is recomputed and swapped in (delete + insert) in its own short
+    transaction. Days before today no longer change, so their ranges take no
+    lock. Only today's range locks the rollup table, and only while today's
+    bookings are recounted: bookings committing meanwhile wait and then apply
+    their increments on top of the rebuilt rows.
+    """
+    ranges = list(day_ranges(db, days_per_chunk))
+    db.commit()
+    count = 0
+    for start, end in ranges:
+        if (start, end) == ranges[-1]:
+            db.execute(text(f"LOCK TABLE {EventSalesDaily.__tablename__} IN EXCLUSIVE MODE"))
+        totals = compute_range(db, start, end)
+        db.execute(delete(EventSalesDaily).where(EventSalesDaily.day >= start, EventSalesDaily.day < end))
+        rows = [
+            {"event_id": event_id, "day": day, "bookings": bookings, "tickets_sold": tickets, "revenue": revenue}
+            for (event_id, day), (bookings, tickets, revenue) in totals.items()
+        ]
+        if rows:
+            db.execute(insert(EventSalesDaily), rows)
+        db.commit()
+        count += len(rows)
+        logging.info(f"Rollups rebuilt for {start}..{end - timedelta(days=1)}: {len(rows)} rows")
+    return count
+
+
+def verify(db, days_per_chunk=7, tolerance=1e-6):
+    """Differences between the stored rollups and a recomputation from bookings"""
+    diffs = []
+    for start, end in day_ranges(db, days_per_chunk):
+        expected = compute_range(db, start, end)
+        stored = {
+            (row.event_id, row.day): [row.bookings, row.tickets_sold, row.revenue]
+            for row in db.execute(
+                select(EventSalesDaily).where(EventSalesDaily.day >= start, EventSalesDaily.day < end)
+            ).scalars()
+        }
+        for key in sorted(expected.keys() | stored.keys()):
+            want = expected.get(key, [0, 0, 0.0])
+            have = stored.get(key, [0, 0, 0.0])
+            if want[0] != have[0] or want[1] != have[1] or abs(want[2] - have[2]) > tolerance:
+                diffs.append({"event_id": key[0], "day": key[1].isoformat(), "expected": want, "stored": have})
+    return diffs
+
+
+if __name__ == "__main__":
+    from database import SessionLocal
+
+    logging.basicConfig(level=logging.INFO)
+    parser = argparse.ArgumentParser(description="Rebuild or verify event sales rollups")
+    parser.add_argument("command", choices=["rebuild", "verify"])
+    parser.add_argument("--days-per-chunk", type=int, default=7)
+    args = parser.parse_args()
+
+    session = SessionLocal()
+    try:
+        if args.command == "rebuild":
+            count = rebuild(session, args.days_per_chunk)
+            logging.info(f"Rebuilt {count} rollup rows")
+        else:
+            diffs = verify(session, args.days_per_chunk)
+            for diff in diffs:
+                logging.warning(f"Rollup mismatch: {diff}")
+            logging.info(f"{len(diffs)} rollup rows differ from bookings")
+            raise SystemExit(1 if diffs else 0)
+    finally:
+        session.close()
@@ -0,0 +1,42 @@
+"""Booking Service test setup
+
+The service relies on PostgreSQL features (ON CONFLICT, RETURNING, SKIP
+LOCKED), so tests need a real server: point TEST_BOOKING_DB_URL at a
+scratch database (its booking tables are truncated between tests). Without
+it the database tests are skipped. The outbox uses the in-memory broker.
+"""
+import os
+import sys
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+TEST_BOOKING_DB_URL = os.getenv("TEST_BOOKING_DB_URL")
+# Engines connect lazily, so modules import fine even without a database
+os.environ["BOOKING_DB_URL"] = TEST_BOOKING_DB_URL or "postgresql://localhost/unused"
+os.environ["OUTBOX_BROKER"] = "memory"
+
+TABLES = "bookings, outbox, event_sales_daily, idempotency_keys"
+
+
+@pytest.fixture
+def app_module():
+    if not TEST_BOOKING_DB_URL:
+        pytest.skip("needs a PostgreSQL database (set TEST_BOOKING_DB_URL)")
+    import app
+    from sqlalchemy import text
+    with app.engine.begin() as conn:
+        conn.execute(text(f"TRUNCATE {TABLES} RESTART IDENTITY"))
+    app.outbox_relay.broker.queues.clear()
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+def booking(**fields):
+    return {"user_id": 1, "event_id": "evt-1", "tickets": 2, "amount": 200.0,
+            "user_email": "buyer@example.com", **fields}
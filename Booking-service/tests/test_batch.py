@@ -0,0 +1,83 @@
+import json
+from sqlalchemy import func, select
+from benchmarks.batch_throughput import compare
+from conftest import booking
+from models import Booking, EventSalesDaily, OutboxMessage
+
+
+def count(app_module, model):
+    with app_module.SessionLocal() as db:
+        return db.scalar(select(func.count()).select_from(model))
+
+
+def test_batch_creates_every_booking_in_input_order(app_module, client):
+    items = [booking(user_id=i, tickets=i) for i in range(1, 6)]
+    response = client.post("/bookings/batch", json={"bookings": items})
+
+    assert response.status_code == 201
+    body = response.get_json()
+    assert body["created"] == 5
+    assert [result["booking"]["id"] for result in body["results"]] == [1, 2, 3, 4, 5]
+    assert [result["booking"]["tickets"] for result in body["results"]] == [1, 2, 3, 4, 5]
+    assert count(app_module, Booking) == 5
+
+
+def test_batch_sends_one_confirmation_per_recipient(app_module, client):
+    items = [booking(user_email="a@example.com"), booking(user_email="b@example.com"),
+             booking(user_email="a@example.com")]
+    client.post("/bookings/batch", json={"bookings": items})
+
+    with app_module.SessionLocal() as db:
+        payloads = [json.loads(row.payload) for row in db.scalars(select(OutboxMessage).order_by(OutboxMessage.id))]
+    assert payloads == [{"booking_id": [1, 3], "user_email": "a@example.com"},
+                        {"booking_id": [2], "user_email": "b@example.com"}]
+
+
+def test_batch_updates_the_sales_rollup(app_module, client):
+    items = [booking(event_id="evt-1", tickets=2, amount=50.0), booking(event_id="evt-1", tickets=3, amount=75.0)]
+    client.post("/bookings/batch", json={"bookings": items})
+
+    with app_module.SessionLocal() as db:
+        rollup = db.scalars(select(EventSalesDaily)).one()
+    assert (rollup.bookings, rollup.tickets_sold, rollup.revenue) == (2, 5, 125.0)
+
+
+def test_invalid_item_rejects_the_whole_batch(app_module, client):
+    items = [booking(), booking(tickets=0), booking()]
+    response = client.post("/bookings/batch", json={"bookings": items})
+
+    assert response.status_code == 400
+    assert response.get_json()["results"] == [
+        {"index": 1, "status": "invalid", "error": "tickets must be a positive integer"}]
+    assert count(app_module, Booking) == 0
+    assert count(app_module, OutboxMessage) == 0
+
+
+def test_oversized_batch_is_rejected(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, "BOOKING_BATCH_MAX", 2)
+    response = client.post("/bookings/batch", json={"bookings": [booking()] * 3})
+
+    assert response.status_code == 400
+    assert count(app_module, Booking) == 0
+
+
+def test_batch_retry_with_the_same_key_is_replayed(app_module, client):
+    items = [booking(), booking(user_id=2)]
+    first = client.post("/bookings/batch", json={"bookings": items}, headers={"Idempotency-Key": "batch-1"})
+    second = client.post("/bookings/batch", json={"bookings": items}, headers={"Idempotency-Key": "batch-1"})
+
+    assert second.status_code == 201
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.get_json() == first.get_json()
+    assert count(app_module, Booking) == 2
+
+
+def test_a_batch_costs_as_many_statements_as_a_single_booking(app_module):
+    results = compare(app_module, total=200, batch_size=50)
+
+    assert results["single"]["bookings"] == results["batched"]["bookings"] == 200
+    assert results["batched"]["requests"] == 4
+    # Aggregated per recipient: 50 users in every batch
+    assert results["batched"]["outbox_messages"] == 200
+    # Database round trips don't grow with the batch size
+    assert results["batched"]["statements"] * 50 == results["single"]["statements"]
@@ -0,0 +1,23 @@
+from conftest import booking
+
+
+def test_history_filters_by_user_and_pages_newest_first(client):
+    for tickets in range(1, 6):
+        client.post("/bookings", json=booking(user_id=7, tickets=tickets))
+    client.post("/bookings", json=booking(user_id=8))
+
+    first = client.get("/bookings?user_id=7&limit=3").get_json()
+    second = client.get(f"/bookings?user_id=7&limit=3&after={first['next_cursor']}").get_json()
+
+    assert [b["id"] for b in first["bookings"]] == [5, 4, 3]
+    assert [b["id"] for b in second["bookings"]] == [2, 1]
+    assert second["next_cursor"] is None
+
+
+def test_invalid_user_id_is_rejected_not_dropped(client):
+    client.post("/bookings", json=booking(user_id=7))
+
+    response = client.get("/bookings?user_id=abc&status=confirmed")
+
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "user_id must be an integer"}
@@ -0,0 +1,69 @@
+import time
+from sqlalchemy import func, select, text
+from conftest import booking
+from idempotency import KeyPurger
+from models import Booking, IdempotencyKey
+
+
+def keys(app_module):
+    with app_module.SessionLocal() as db:
+        return set(db.scalars(select(IdempotencyKey.key)))
+
+
+def age_key(app_module, key, hours):
+    with app_module.engine.begin() as conn:
+        conn.execute(text("UPDATE idempotency_keys SET created_at = now() - make_interval(hours => :hours) "
+                          "WHERE key = :key"), {"hours": hours, "key": key})
+
+
+def test_retry_with_the_same_key_replays_the_booking(app_module, client):
+    first = client.post("/bookings", json=booking(), headers={"Idempotency-Key": "k1"})
+    second = client.post("/bookings", json=booking(), headers={"Idempotency-Key": "k1"})
+
+    assert second.status_code == 201
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.get_json() == first.get_json()
+    with app_module.SessionLocal() as db:
+        assert db.scalar(select(func.count()).select_from(Booking)) == 1
+
+
+def test_key_reused_for_a_different_booking_is_rejected(client):
+    client.post("/bookings", json=booking(), headers={"Idempotency-Key": "k1"})
+    response = client.post("/bookings", json=booking(tickets=5), headers={"Idempotency-Key": "k1"})
+
+    assert response.status_code == 422
+
+
+def test_replay_names_the_reservation_the_booking_used(client):
+    first = client.post("/bookings", json=booking(reservation_id="r1"), headers={"Idempotency-Key": "k1"})
+    # A client retry arrives through the gateway with a reservation of its own
+    second = client.post("/bookings", json=booking(reservation_id="r2"), headers={"Idempotency-Key": "k1"})
+
+    assert first.get_json()["reservation_id"] == "r1"
+    assert second.headers["Idempotent-Replayed"] == "true"
+    assert second.get_json()["reservation_id"] == "r1"
+    assert client.post("/bookings", json=booking(reservation_id=7)).status_code == 400
+
+
+def test_purger_deletes_only_expired_keys(app_module, client):
+    for key in ("old", "fresh"):
+        client.post("/bookings", json=booking(), headers={"Idempotency-Key": key})
+    age_key(app_module, "old", 25)
+
+    assert KeyPurger(app_module.SessionLocal).purge_once() == 1
+    assert keys(app_module) == {"fresh"}
+
+
+def test_purger_runs_in_the_background(app_module, client):
+    client.post("/bookings", json=booking(), headers={"Idempotency-Key": "old"})
+    age_key(app_module, "old", 25)
+
+    purger = KeyPurger(app_module.SessionLocal, interval=0.05)
+    purger.start()
+    try:
+        deadline = time.monotonic() + 5
+        while keys(app_module) and time.monotonic() < deadline:
+            time.sleep(0.05)
+    finally:
+        purger.stop()
+    assert keys(app_module) == set()
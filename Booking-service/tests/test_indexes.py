@@ -0,0 +1,27 @@
+from sqlalchemy import event, text
+from indexes import create_indexes_concurrently
+
+
+def index_exists(conn, name):
+    return conn.execute(text("SELECT to_regclass(:name)"), {"name": name}).scalar() is not None
+
+
+def test_missing_index_is_built_concurrently(app_module):
+    engine = app_module.engine
+    with engine.begin() as conn:
+        conn.execute(text("DROP INDEX ix_bookings_status_created"))
+
+    statements = []
+    listener = lambda conn, cursor, statement, *args: statements.append(statement)
+    event.listen(engine, "before_cursor_execute", listener)
+    try:
+        built = create_indexes_concurrently(engine)
+    finally:
+        event.remove(engine, "before_cursor_execute", listener)
+
+    assert built == ["ix_bookings_status_created"]
+    assert any(s.startswith("CREATE INDEX CONCURRENTLY ix_bookings_status_created") for s in statements)
+    with engine.connect() as conn:
+        assert index_exists(conn, "ix_bookings_status_created")
+    # Nothing left to do on a second run
+    assert create_indexes_concurrently(engine) == []
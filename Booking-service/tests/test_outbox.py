@@ -0,0 +1,77 @@
+import threading
+import time
+from sqlalchemy import func, select
+from conftest import booking
+from models import OutboxMessage
+from outbox import BOOKING_CONFIRMED_QUEUE, InMemoryBroker, OutboxRelay
+
+
+def unpublished(app_module):
+    with app_module.SessionLocal() as db:
+        return db.scalar(select(func.count()).select_from(OutboxMessage).where(OutboxMessage.published_at.is_(None)))
+
+
+def test_booking_commits_its_confirmation_to_the_outbox(app_module, client):
+    response = client.post("/bookings", json=booking())
+    assert response.status_code == 201
+    # Nothing is published on the request path; the relay does that later
+    assert app_module.outbox_relay.broker.queues[BOOKING_CONFIRMED_QUEUE] == []
+    assert unpublished(app_module) == 1
+
+
+def test_relay_publishes_pending_rows_once(app_module, client):
+    for user_id in (1, 2, 3):
+        client.post("/bookings", json=booking(user_id=user_id))
+    broker = InMemoryBroker()
+    relay = OutboxRelay(app_module.SessionLocal, broker, batch_size=2)
+    assert relay.relay_once() == 2
+    assert relay.relay_once() == 1
+    assert relay.relay_once() == 0
+    messages = broker.queues[BOOKING_CONFIRMED_QUEUE]
+    assert [message["booking_id"] for message in messages] == [1, 2, 3]
+    assert unpublished(app_module) == 0
+
+
+class FailingBroker(InMemoryBroker):
+    def __init__(self, failures):
+        super().__init__()
+        self.failures = failures
+
+    def publish_batch(self, queue, payloads):
+        if self.failures:
+            self.failures -= 1
+            raise ConnectionError("broker down")
+        super().publish_batch(queue, payloads)
+
+
+def test_failed_publish_keeps_rows_for_the_next_attempt(app_module, client):
+    client.post("/bookings", json=booking())
+    broker = FailingBroker(failures=1)
+    relay = OutboxRelay(app_module.SessionLocal, broker)
+    try:
+        relay.relay_once()
+    except ConnectionError:
+        pass
+    assert unpublished(app_module) == 1
+    assert relay.relay_once() == 1
+    assert len(broker.queues[BOOKING_CONFIRMED_QUEUE]) == 1
+
+
+class SlowBroker(InMemoryBroker):
+    def publish_batch(self, queue, payloads):
+        time.sleep(0.2)
+        super().publish_batch(queue, payloads)
+
+
+def test_concurrent_relays_never_publish_a_row_twice(app_module, client):
+    for user_id in range(10):
+        client.post("/bookings", json=booking(user_id=user_id))
+    broker = SlowBroker()
+    relays = [OutboxRelay(app_module.SessionLocal, broker, batch_size=5) for _ in range(3)]
+    threads = [threading.Thread(target=relay.relay_once) for relay in relays]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    ids = [message["booking_id"] for message in broker.queues[BOOKING_CONFIRMED_QUEUE]]
+    assert sorted(ids) == list(range(1, 11))
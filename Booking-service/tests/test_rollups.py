@@ -0,0 +1,84 @@
+from datetime import date, datetime, timedelta
+from sqlalchemy import event, insert, select, update
+from conftest import booking
+from models import Booking, EventSalesDaily
+from rollups import rebuild, verify
+
+
+def rollups(app_module):
+    with app_module.SessionLocal() as db:
+        return {(row.event_id, row.day): (row.bookings, row.tickets_sold, row.revenue)
+                for row in db.scalars(select(EventSalesDaily))}
+
+
+def backdate(app_module, days_ago, **fields):
+    """Insert a confirmed booking `days_ago` days old, bypassing the rollups"""
+    row = {"user_id": 1, "event_id": "evt-1", "tickets": 1, "amount": 10.0, "status": "confirmed",
+           "created_at": datetime.now() - timedelta(days=days_ago), **fields}
+    with app_module.SessionLocal() as db:
+        db.execute(insert(Booking), [row])
+        db.commit()
+
+
+def test_single_booking_is_validated_like_a_batch_item(app_module, client):
+    response = client.post("/bookings", json=booking(tickets="2"))
+
+    assert response.status_code == 400
+    assert response.get_json() == {"error": "tickets must be a positive integer"}
+    assert client.post("/bookings", json=booking(amount=True)).status_code == 400
+    assert client.post("/bookings", data="not json").status_code == 400
+    assert rollups(app_module) == {}
+
+
+def test_bookings_update_todays_rollup(app_module, client):
+    client.post("/bookings", json=booking(tickets=2, amount=50.0))
+    client.post("/bookings", json=booking(tickets=3, amount=75.0))
+
+    assert rollups(app_module) == {("evt-1", date.today()): (2, 5, 125.0)}
+    with app_module.SessionLocal() as db:
+        assert verify(db) == []
+
+
+def test_rebuild_repairs_drifted_and_missing_rollups(app_module, client):
+    client.post("/bookings", json=booking(tickets=2, amount=50.0))
+    backdate(app_module, 3, tickets=4, amount=40.0)
+    backdate(app_module, 20, event_id="evt-2")
+    backdate(app_module, 20, event_id="evt-2", status="cancelled")
+    with app_module.SessionLocal() as db:
+        db.execute(update(EventSalesDaily).values(tickets_sold=99))
+        db.execute(insert(EventSalesDaily), [{"event_id": "evt-9", "day": date.today() - timedelta(days=40),
+                                              "bookings": 1, "tickets_sold": 1, "revenue": 1.0}])
+        db.commit()
+        assert len(verify(db)) == 4
+
+        assert rebuild(db, days_per_chunk=7) == 3
+        assert verify(db) == []
+
+    today = date.today()
+    assert rollups(app_module) == {
+        ("evt-1", today): (1, 2, 50.0),
+        ("evt-1", today - timedelta(days=3)): (1, 4, 40.0),
+        ("evt-2", today - timedelta(days=20)): (1, 1, 10.0),
+    }
+
+
+def test_rebuild_locks_the_rollups_only_for_today(app_module, client):
+    client.post("/bookings", json=booking())
+    backdate(app_module, 30)
+    statements = []
+
+    def record(conn, cursor, statement, *args):
+        statements.append(statement)
+
+    event.listen(app_module.engine, "before_cursor_execute", record)
+    try:
+        with app_module.SessionLocal() as db:
+            rebuild(db, days_per_chunk=7)
+    finally:
+        event.remove(app_module.engine, "before_cursor_execute", record)
+
+    locks = [i for i, statement in enumerate(statements) if statement.startswith("LOCK TABLE")]
+    ranges = [i for i, statement in enumerate(statements) if statement.startswith("DELETE FROM event_sales_daily")]
+    # Five past week-long ranges swap in without the lock, then today's under it
+    assert len(ranges) == 6
+    assert len(locks) == 1 and ranges[-2] < locks[0] < ranges[-1]
@@ -1,47 +1,307 @@
-from flask import Flask, render_template, request, redirect, url_for, session, flash, jsonify
-from pymongo import MongoClient
+from flask import (Flask, render_template, request, redirect, url_for, session, flash, jsonify, Response,
+                   copy_current_request_context, stream_with_context)
+from werkzeug.middleware.proxy_fix import ProxyFix
+from pymongo import MongoClient, ReturnDocument
+from pymongo.errors import BulkWriteError
 from bson.objectid import ObjectId
 import os
+import hashlib
 from dotenv import load_dotenv
 from datetime import datetime
+from search import HIDDEN_FIELDS, SEARCH_MODES, build_search, ensure_search_indexes, search_terms
+from pagination import EventCounter, decode_cursor, encode_cursor, keyset_filter, parse_per_page, with_tiebreaker
+from cache import TTLCache
+from page_cache import PageCache, fill_slots, slot
+from filters import build_filters, date_string, ensure_filter_indexes, migrate_dates, parse_date, parse_sort
+from inventory import (ReservationPending, available_filter, ensure_reservation_indexes, finish_reservation,
+                       release_many, release_reservation, reserve_many, sell, start_reservation)
+from holds import HoldLimitReached, HoldSweeper, convert_hold, create_hold, ensure_hold_indexes, release_hold
+from coalescing import ReserveCoalescer
+import uuid
+from json_provider import OrjsonProvider
+from compression import compress_response
+from metrics import instrument_flask, instrument_requests_session, mongo_listener
+import requests
 
 load_dotenv()
 
 app = Flask(__name__)
 app.secret_key = os.getenv('SECRET_KEY')
+# Proxies (ingress, gateway) in front of the service; their X-Forwarded-For
+# entries are trusted so request.remote_addr is the buyer, not the last proxy
+PROXY_FIX_HOPS = int(os.getenv('PROXY_FIX_HOPS', 0))
+if PROXY_FIX_HOPS:
+    app.wsgi_app = ProxyFix(app.wsgi_app, x_for=PROXY_FIX_HOPS)
+app.json = OrjsonProvider(app)
+instrument_flask(app)
 
-client = MongoClient(os.getenv('MONGO_URI'))
+@app.after_request
+def compress(response):
+    return compress_response(response, request.headers.get('Accept-Encoding'))
+
+client = MongoClient(os.getenv('MONGO_URI'), event_listeners=[mongo_listener()])
 db = client['event_db']
 events_collection = db['events']
+ensure_search_indexes(events_collection)
+migrate_dates(events_collection)
+ensure_filter_indexes(events_collection)
+holds_collection = db['holds']
+ensure_hold_indexes(holds_collection)
+reservations_collection = db['reservations']
+ensure_reservation_indexes(reservations_collection)
+event_counter = EventCounter(events_collection)
+event_cache = TTLCache(
+    maxsize=int(os.getenv('EVENT_CACHE_SIZE', 10000)),
+    ttl=float(os.getenv('EVENT_CACHE_TTL', 30))
+)
+page_cache = PageCache(
+    maxsize=int(os.getenv('PAGE_CACHE_SIZE', 256)),
+    ttl=float(os.getenv('PAGE_CACHE_TTL', 60)),
+    stale_ttl=float(os.getenv('PAGE_CACHE_STALE_TTL', 30))
+)
+
+def invalidate_event(event_id):
+    """Drop an event's cached copy after a ticket or hold change
+
+    Rendered pages are kept: tickets left, the only thing such a change alters
+    on them, is filled into every page as it is served.
+    """
+    event_cache.invalidate(event_id)
+
+def invalidate_rendered_event(event_id):
+    """After a write to fields the event grid shows (name, date, price...) or a delete"""
+    event_cache.invalidate(event_id)
+    page_cache.bump()
+
+def invalidate_all_events():
+    event_cache.clear()
+
+# Cart ticket holds: held tickets can't be sold to anyone else until they expire
+HOLD_TTL = int(os.getenv('HOLD_TTL_SECONDS', 600))
+# Off by default: every hold locks inventory, so only enable it with the caps below
+CART_HOLDS_ENABLED = os.getenv('CART_HOLDS_ENABLED', 'false').lower() == 'true'
+HOLDS_MAX_PER_SESSION = int(os.getenv('HOLDS_MAX_PER_SESSION', 10))
+HOLDS_MAX_PER_CLIENT = int(os.getenv('HOLDS_MAX_PER_CLIENT', 50))
+hold_sweeper = HoldSweeper(
+    events_collection, holds_collection,
+    interval=float(os.getenv('HOLD_SWEEP_INTERVAL', 1.0)),
+    on_release=invalidate_all_events
+)
+
+# Optional write coalescing for /reserve on hot events; 0 sends one update per request
+RESERVE_COALESCE_WINDOW_MS = float(os.getenv('RESERVE_COALESCE_WINDOW_MS', 0))
+reserve_coalescer = (ReserveCoalescer(events_collection, RESERVE_COALESCE_WINDOW_MS / 1000)
+                     if RESERVE_COALESCE_WINDOW_MS > 0 else None)
+
+def hold_session_id():
+    """Stable id for this browser session, used as the hold owner"""
+    if 'hold_session' not in session:
+        session['hold_session'] = uuid.uuid4().hex
+    return session['hold_session']
+
+def place_hold(event_id, session_id, tickets, ttl):
+    """create_hold with this request's client address and the per-owner caps
+
+    Behind proxies the address is only the buyer's if PROXY_FIX_HOPS counts
+    them; otherwise every buyer shares the proxy's address and its cap.
+    """
+    return create_hold(events_collection, holds_collection, event_id, session_id, tickets, ttl,
+                       client=request.remote_addr, max_per_session=HOLDS_MAX_PER_SESSION,
+                       max_per_client=HOLDS_MAX_PER_CLIENT)
+
+def hold_owner():
+    """Owner a hold request acts for: the body's session_id, else this browser session's"""
+    data = request.get_json(silent=True) or {}
+    return data.get('session_id') or session.get('hold_session')
+
+# Checkout submits the whole cart to the Booking Service in one call
+BOOKING_SERVICE_URL = os.getenv('BOOKING_SERVICE_URL', 'http://booking-service:5003')
+booking_http = requests.Session()
+instrument_requests_session(booking_http, 'booking')
 
 # Helper function to format date
 def format_date(date_str):
-    return datetime.strptime(date_str, '%Y-%m-%d').strftime('%B %d, %Y')
+    if isinstance(date_str, datetime):
+        return date_str.strftime('%B %d, %Y')
+    try:
+        return datetime.strptime(date_str, '%Y-%m-%d').strftime('%B %d, %Y')
+    except (TypeError, ValueError):
+        return date_str or ''
 
-@app.route('/')
-def index():
-    search_query = request.args.get('search', '')
-    page = int(request.args.get('page', 1))
-    per_page = 6
-    
-    query = {}
-    if search_query:
-        query['$or'] = [
-            {'name': {'$regex': search_query, '$options': 'i'}},
-            {'location': {'$regex': search_query, '$options': 'i'}},
-            {'description': {'$regex': search_query, '$options': 'i'}}
-        ]
-    
-    total_events = events_collection.count_documents(query)
-    events = list(events_collection.find(query).skip((page-1)*per_page).limit(per_page))
-    
-    return render_template('index.html',
+def serialize_event(event):
+    """Make a Mongo event document JSON friendly, in place"""
+    event['_id'] = str(event['_id'])  # Convert ObjectId to string
+    if 'date' in event:
+        event['date'] = date_string(event['date'])  # Keep date in raw format (YYYY-MM-DD)
+    return event
+
+def parse_fields(value):
+    """Requested response fields from a `fields=a,b` parameter (None for all)"""
+    if not value:
+        return None
+    fields = value.split(',') if isinstance(value, str) else value
+    fields = [field.strip() for field in fields if field.strip() and field.strip() not in HIDDEN_FIELDS]
+    return fields or None
+
+def find_events(search_query, mode, per_page, page=1, after=None, fields=None, filters=None, sort_by=None):
+    """One page of events matching a search box query, plus the next page cursor
+
+    Listings are keyset-paginated over a stable (sort key, _id) order when an
+    `after` cursor is given. Relevance-ranked text search has no stable document
+    key, so it keeps offset paging and never returns a cursor. An explicit
+    `sort_by` replaces relevance/name order; `filters` narrow the result.
+    """
+    if mode not in SEARCH_MODES:
+        mode = 'text'
+    query, projection, sort = build_search(search_query, mode)
+    if filters:
+        query = {**query, **filters}
+    if sort_by:
+        sort = sort_by
+    ranked = mode == 'text' and bool(search_query) and not sort_by
+    if fields:
+        # Push the field selection into find(), keeping what sorting needs
+        projection = {field: 1 for field in fields}
+        projection.update({field: 1 for field, _ in (sort or []) if field != 'score'})
+        projection['version'] = 1  # listing ETags are built from versions
+        if ranked:
+            projection['score'] = {'$meta': 'textScore'}
+
+    if ranked:
+        cursor = events_collection.find(query, projection).sort(sort).skip((page-1)*per_page)
+    else:
+        sort = with_tiebreaker(sort or [])
+        find_query = query
+        if after:
+            after_filter = keyset_filter(sort, decode_cursor(after, sort))
+            find_query = {'$and': [query, after_filter]} if query else after_filter
+        cursor = events_collection.find(find_query, projection).sort(sort)
+        if not after:
+            cursor = cursor.skip((page-1)*per_page)
+
+    # Fetch one extra row to learn whether there is a next page
+    events = list(cursor.limit(per_page + 1))
+    next_cursor = None
+    if len(events) > per_page:
+        events = events[:per_page]
+        if not ranked:
+            next_cursor = encode_cursor(events[-1], sort)
+    if fields:
+        extra = set(projection) - set(fields) - {'_id'}
+        for event in events:
+            for field in extra:
+                event.pop(field, None)
+    return query, events, next_cursor
+
+def get_event(event_id):
+    """Event by id through the read-through cache, or None if it doesn't exist"""
+    event = event_cache.get(event_id)
+    if event is None:
+        generation = event_cache.generation()
+        event = events_collection.find_one({'_id': ObjectId(event_id)}, HIDDEN_FIELDS)
+        if not event:
+            return None
+        # Skipped if a write invalidated the event while it was being read
+        event_cache.set(event_id, serialize_event(event), generation)
+    return event
+
+def event_etag(event):
+    """Weak validator for one event, derived from the version every write bumps"""
+    return f"{event['_id']}-{event.get('version', 0)}"
+
+def listing_etag(events, *meta):
+    """Weak validator for a listing page: its events' ids/versions plus paging metadata"""
+    digest = hashlib.sha1()
+    for event in events:
+        digest.update(f"{event['_id']}:{event.get('version', 0)};".encode())
+    digest.update(repr(meta).encode())
+    return digest.hexdigest()
+
+def not_modified(etag):
+    """304 response if the client's If-None-Match already has this ETag"""
+    if request.if_none_match.contains_weak(etag):
+        response = app.response_class(status=304)
+        response.set_etag(etag, weak=True)
+        return response
+    return None
+
+def with_etag(response, etag):
+    response.set_etag(etag, weak=True)
+    return response
+
+def total_pages_for(total, per_page):
+    return max(1, -(-total // per_page))
+
+def grid_args(args):
+    """(search, mode, page, per_page, after) of an index request; also its page cache key"""
+    return (args.get('search', ''), args.get('mode', 'text'), int(args.get('page', 1)),
+            parse_per_page(args.get('per_page')), args.get('after'))
+
+def render_event_grid(search_query, search_mode, page, per_page, after):
+    """Search form, event cards and pagination for one index page
+
+    Tickets left are rendered as slots, filled in by tickets_left() on every
+    request, so ticket sales don't invalidate the cached grid.
+    """
+    query, events, next_cursor = find_events(search_query, search_mode, per_page, page, after)
+    total_events = event_counter.count(query)
+    return render_template('_event_grid.html',
                          events=events,
                          search_query=search_query,
                          page=page,
-                         total_pages=(total_events // per_page) + 1,
+                         per_page=per_page,
+                         next_cursor=next_cursor,
+                         total_pages=total_pages_for(total_events, per_page),
+                         tickets_left_slot=lambda event: slot('tickets_left', event['_id']),
                          format_date=format_date)
 
+def tickets_left(event_ids):
+    """Unsold, unheld tickets per event id, with one query"""
+    object_ids = [ObjectId(eid) for eid in event_ids if ObjectId.is_valid(eid)]
+    return {
+        str(event['_id']): event.get('tickets_available', 0) - event.get('tickets_held', 0)
+        for event in events_collection.find({'_id': {'$in': object_ids}}, {'tickets_available': 1, 'tickets_held': 1})
+    }
+
+@app.route('/')
+def index():
+    # The event grid is the same for every visitor, so it is rendered once per
+    # query/page and cached; the layout around it (cart, flashes) is per session
+    args = grid_args(request.args)
+
+    # The background refresh only borrows this request's context to build URLs
+    @copy_current_request_context
+    def refresh_grid():
+        return render_event_grid(*args)
+
+    try:
+        event_grid = page_cache.get_or_render(args, lambda: render_event_grid(*args), refresh_grid)
+    except ValueError:
+        flash('Invalid page cursor!', 'danger')
+        return redirect(url_for('index'))
+
+    return render_template('index.html', event_grid=fill_slots(event_grid, 'tickets_left', tickets_left))
+
+def build_event(event_data):
+    """New event document from request data; raises ValueError if it is invalid"""
+    name = event_data.get('name')
+    if not name:
+        raise ValueError("Missing 'name' field")
+
+    event = {
+        'name': name,
+        'location': event_data.get('location', ''),
+        'date': parse_date(event_data.get('date', '')),
+        'price': float(event_data.get('price', 0)),
+        'tickets_available': int(event_data.get('tickets_available', 0)),
+        'description': event_data.get('description', ''),
+        'picture': event_data.get('picture', 'https://via.placeholder.com/400x250')
+    }
+    event['search_terms'] = search_terms(event)
+    event['date_display'] = format_date(event['date'])
+    event['version'] = 1
+    return event
+
 @app.route('/events/create', methods=['POST'])
 def create_event():
     try:
@@ -50,23 +310,18 @@ def create_event():
         else:  # If the request is form-data
             event_data = request.form.to_dict()
 
-        name = event_data.get('name')
-        if not name:
+        if not event_data.get('name'):
             return jsonify({"error": "Missing 'name' field"}), 400
-
-        event = {
-            'name': name,
-            'location': event_data.get('location', ''),
-            'date': event_data.get('date', ''),
-            'price': float(event_data.get('price', 0)),
-            'tickets_available': int(event_data.get('tickets_available', 0)),
-            'description': event_data.get('description', ''),
-            'picture': event_data.get('picture', 'https://via.placeholder.com/400x250')
-        }
+        event = build_event(event_data)
 
         result = events_collection.insert_one(event)
+        event_counter.adjust(1)
+        page_cache.bump()
         return jsonify({"message": "Event created successfully!", "event_id": str(result.inserted_id)}), 201
 
+    except ValueError as e:
+        # Bad date, price or ticket count in the request
+        return jsonify({"error": str(e)}), 400
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
@@ -75,14 +330,15 @@ from flask import jsonify
 
 @app.route('/events/<event_id>')
 def event_detail(event_id):
-    event = events_collection.find_one({'_id': ObjectId(event_id)})
+    event = get_event(event_id)
     if not event:
         return jsonify({'error': 'Event not found!'}), 404
     
-    # Convert ObjectId to string for JSON compatibility
-    event['_id'] = str(event['_id'])
-    
-    return jsonify(event)
+    etag = event_etag(event)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    return with_etag(jsonify(event), etag)
 
 @app.route('/api/events/<event_id>/edit', methods=['PUT'])
 def edit_event(event_id):
@@ -105,11 +361,22 @@ def edit_event(event_id):
 
             update_data['price'] = float(update_data.get('price', 0))
             update_data['tickets_available'] = int(update_data.get('tickets_available', 0))
+            update_data['search_terms'] = search_terms({**event, **update_data})
+            if 'date' in update_data:
+                update_data['date'] = parse_date(update_data['date'])
+                update_data['date_display'] = format_date(update_data['date'])
+            # _id is immutable and version is only ever bumped server-side
+            update_data.pop('_id', None)
+            update_data.pop('version', None)
 
-            events_collection.update_one({'_id': ObjectId(event_id)}, {'$set': update_data})
+            events_collection.update_one({'_id': ObjectId(event_id)}, {'$set': update_data, '$inc': {'version': 1}})
+            event_counter.invalidate()
+            invalidate_rendered_event(event_id)
             flash('Event updated successfully!', 'success')
             return jsonify({"message": "Event updated successfully"}), 200
 
+        except ValueError as e:
+            return jsonify({"error": str(e)}), 400
         except Exception as e:
             return jsonify({"error": str(e)}), 500
 
@@ -118,7 +385,9 @@ def edit_event(event_id):
 
 @app.route('/events/<event_id>/delete', methods=['POST'])
 def delete_event(event_id):
-    events_collection.delete_one({'_id': ObjectId(event_id)})
+    result = events_collection.delete_one({'_id': ObjectId(event_id)})
+    event_counter.adjust(-result.deleted_count)
+    invalidate_rendered_event(event_id)
     if 'my_events' in session and event_id in session['my_events']:
         session['my_events'].remove(event_id)
     flash('Event deleted successfully!', 'success')
@@ -134,18 +403,32 @@ def my_events():
     events = list(events_collection.find({'_id': {'$in': event_ids}}))
     return render_template('my_events.html', events=events, format_date=format_date)
 
-@app.route('/add-to-cart/<event_id>')
+@app.route('/add-to-cart/<event_id>', methods=['POST'])
 def add_to_cart(event_id):
+    if not ObjectId.is_valid(event_id):
+        flash('Event not found!', 'danger')
+        return redirect(request.referrer or url_for('index'))
     if 'cart' not in session:
         session['cart'] = []
     
     if event_id not in session['cart']:
+        if CART_HOLDS_ENABLED:
+            try:
+                hold = place_hold(event_id, hold_session_id(), 1, HOLD_TTL)
+            except HoldLimitReached:
+                flash('You are holding too many tickets, check out or remove some first.', 'warning')
+                return redirect(request.referrer or url_for('index'))
+            if not hold:
+                flash('Sorry, this event is sold out!', 'danger')
+                return redirect(request.referrer or url_for('index'))
+            invalidate_event(event_id)
+            session.setdefault('holds', {})[event_id] = str(hold['_id'])
         session['cart'].append(event_id)
         session.modified = True
         flash('Event added to cart!', 'success')
     else:
         flash('Event already in cart!', 'info')
-    return redirect(request.referrer)
+    return redirect(request.referrer or url_for('index'))
 
 @app.route('/cart')
 def view_cart():
@@ -161,38 +444,174 @@ def view_cart():
 def remove_from_cart(event_id):
     if 'cart' in session and event_id in session['cart']:
         session['cart'].remove(event_id)
+        hold_id = session.get('holds', {}).pop(event_id, None)
+        if hold_id and release_hold(events_collection, holds_collection, hold_id, hold_session_id()):
+            invalidate_event(event_id)
         session.modified = True
         flash('Event removed from cart!', 'success')
     return redirect(url_for('view_cart'))
-# ... (previous imports remain the same)
+
+def _checkout_response(payload, status_code, message, category):
+    if request.is_json:
+        return jsonify(payload), status_code
+    flash(message, category)
+    return redirect(url_for('view_cart' if status_code >= 400 and session.get('cart') else 'index'))
+
+@app.route('/cart/checkout', methods=['POST'])
+def checkout_cart():
+    """Price, reserve and book every event in the cart in one go
+
+    Expects user_id and user_email, and optionally a per-event `quantities`
+    map (default 1 ticket each). Inventory for all items is reserved with one
+    bulk write, then all bookings go to the Booking Service batch endpoint.
+    """
+    data = request.get_json(silent=True) if request.is_json else request.form.to_dict()
+    data = data or {}
+    cart = session.get('cart') or []
+    if not cart:
+        return _checkout_response({"error": "Cart is empty"}, 400, 'Your cart is empty!', 'info')
+    invalid = [eid for eid in cart if not ObjectId.is_valid(eid)]
+    if invalid:
+        # Nothing valid can come of them: drop them so the next attempt can go through
+        session['cart'] = [eid for eid in cart if eid not in invalid]
+        session.modified = True
+        return _checkout_response({"error": "Invalid event ids", "event_ids": invalid}, 400,
+                                  'Some events in your cart no longer exist.', 'danger')
+    if not data.get('user_id') or not data.get('user_email'):
+        return _checkout_response({"error": "user_id and user_email are required"}, 400,
+                                  'Please provide your user id and email to check out.', 'danger')
+
+    try:
+        user_id = int(data['user_id'])
+        requested = data.get('quantities')
+        if not isinstance(requested, dict):
+            requested = {}
+        quantities = {eid: int(requested.get(eid, 1)) for eid in cart}
+        if any(tickets <= 0 for tickets in quantities.values()):
+            raise ValueError("quantities must be positive")
+    except (TypeError, ValueError) as e:
+        return _checkout_response({"error": str(e)}, 400, 'Invalid checkout request!', 'danger')
+
+    # Price every item with one query
+    events = {
+        str(event['_id']): event for event in events_collection.find(
+            {'_id': {'$in': [ObjectId(eid) for eid in cart]}}, {'name': 1, 'price': 1}
+        )
+    }
+    missing = [eid for eid in cart if eid not in events]
+    if missing:
+        return _checkout_response({"error": "Events not found", "event_ids": missing}, 404,
+                                  'Some events in your cart no longer exist.', 'danger')
+
+    # Items still covered by a matching hold are sold straight from the hold;
+    # everything else is reserved from open inventory in one bulk write
+    session_holds = session.get('holds', {})
+    to_reserve = {}
+    from_holds = {}
+    for event_id, tickets in quantities.items():
+        hold_id = session_holds.get(event_id)
+        if hold_id:
+            converted = convert_hold(events_collection, holds_collection, hold_id, hold_session_id())
+            if converted and converted[0]['tickets'] == tickets:
+                from_holds[event_id] = tickets
+                continue
+            if converted:
+                # Hold was for a different quantity: give those tickets back
+                release_many(events_collection, {event_id: converted[0]['tickets']})
+        to_reserve[event_id] = tickets
+
+    reserved, sold_out = reserve_many(events_collection, to_reserve) if to_reserve else (True, [])
+    for event_id in cart:
+        invalidate_event(event_id)
+    if not reserved:
+        release_many(events_collection, from_holds)
+        session['holds'] = {}
+        session.modified = True
+        return _checkout_response({"error": "Not enough tickets available", "event_ids": sold_out}, 409,
+                                  'Some events in your cart are sold out.', 'danger')
+
+    bookings = [{
+        "user_id": user_id,
+        "event_id": event_id,
+        "tickets": tickets,
+        "amount": tickets * events[event_id]['price'],
+        "user_email": data['user_email']
+    } for event_id, tickets in quantities.items()]
+
+    try:
+        response = booking_http.post(f"{BOOKING_SERVICE_URL}/bookings/batch",
+                                     json={"bookings": bookings}, timeout=30)
+        booked = response.status_code == 201
+    except requests.RequestException as e:
+        response, booked = None, False
+        app.logger.error(f"Booking service error during checkout: {str(e)}")
+
+    if not booked:
+        release_many(events_collection, quantities)
+        for event_id in cart:
+            invalidate_event(event_id)
+        detail = {"error": "Booking service unavailable"}
+        if response is not None:
+            detail = {"error": "Booking failed", "booking_service": response.text}
+        return _checkout_response(detail, 502, 'Checkout failed, please try again.', 'danger')
+
+    session['cart'] = []
+    session['holds'] = {}
+    session.modified = True
+    result = response.json()
+    return _checkout_response({
+        "total_amount": sum(booking['amount'] for booking in bookings),
+        "total_tickets": sum(quantities.values()),
+        **result
+    }, 201, f"Checkout complete: {result['created']} bookings confirmed!", 'success')
 
 @app.route('/api/events')
 def api_events():
     search_query = request.args.get('search', '')
+    search_mode = request.args.get('mode', 'text')
     page = int(request.args.get('page', 1))
-    per_page = 6
-
-    query = {}
-    if search_query:
-        query['$or'] = [
-            {'name': {'$regex': search_query, '$options': 'i'}},
-            {'location': {'$regex': search_query, '$options': 'i'}},
-            {'description': {'$regex': search_query, '$options': 'i'}}
-        ]
-    
-    events = list(events_collection.find(query).skip((page-1)*per_page).limit(per_page))
+    per_page = parse_per_page(request.args.get('per_page'))
+    after = request.args.get('after')
+    fields = parse_fields(request.args.get('fields'))
+    try:
+        filters = build_filters(request.args)
+        sort_by = parse_sort(request.args.get('sort'))
+    except ValueError as e:
+        return jsonify({"error": f"Invalid filter: {str(e)}"}), 400
+
+    try:
+        query, events, next_cursor = find_events(search_query, search_mode, per_page, page, after,
+                                                 fields, filters, sort_by)
+    except ValueError:
+        return jsonify({"error": "Invalid 'after' cursor"}), 400
+    total_events = event_counter.count(query)
     
     # Convert MongoDB objects to JSON format
     for event in events:
-        event['_id'] = str(event['_id'])  # Convert ObjectId to string
-        # Keep date in raw format (YYYY-MM-DD)
-        # Remove format_date() call
+        serialize_event(event)
     
-    return {
+    meta = {
         'page': page,
-        'total_pages': (events_collection.count_documents(query) // per_page) + 1,
-        'events': events
+        'per_page': per_page,
+        'total': total_events,
+        'total_pages': total_pages_for(total_events, per_page),
+        'next_cursor': next_cursor
     }
+    envelope = request.args.get('envelope') != '0'
+    etag = listing_etag(events, meta, fields, envelope)
+    cached = not_modified(etag)
+    if cached:
+        return cached
+    if not envelope:
+        # Bare list with paging metadata in headers, so proxies can relay the bytes as-is
+        response = with_etag(app.json.response(events), etag)
+        response.headers['X-Page'] = str(page)
+        response.headers['X-Total-Count'] = str(total_events)
+        response.headers['X-Total-Pages'] = str(meta['total_pages'])
+        if next_cursor:
+            response.headers['X-Next-Cursor'] = next_cursor
+        return response
+    return with_etag(app.json.response({**meta, 'events': events}), etag)
 from bson import ObjectId
 
 from bson import ObjectId
@@ -200,16 +619,286 @@ from bson import ObjectId
 @app.route('/api/events/<event_id>')
 def api_event(event_id):
     try:
-        # Convert string to MongoDB ObjectId
-        event = events_collection.find_one({'_id': ObjectId(event_id)})
+        event = get_event(event_id)
         if not event:
             return jsonify({"error": "Event not found"}), 404
         
-        # Convert MongoDB data to JSON
-        event['_id'] = str(event['_id'])
-        return jsonify(event)
+        fields = parse_fields(request.args.get('fields'))
+        etag = event_etag(event) + (f"-{','.join(fields)}" if fields else '')
+        cached = not_modified(etag)
+        if cached:
+            return cached
+        if fields:
+            event = {field: event[field] for field in ['_id', *fields] if field in event}
+        return with_etag(jsonify(event), etag)
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+BATCH_MAX_IDS = int(os.getenv('EVENTS_BATCH_MAX_IDS', 500))
+
+@app.route('/api/events/batch', methods=['POST'])
+def api_events_batch():
+    """Look up many events by id in one query, returned in request order
+
+    Body: {"ids": [...], "fields": ["name", "price", ...]}. Unknown or invalid
+    ids come back as null in their position.
+    """
+    data = request.get_json(silent=True) or {}
+    ids = data.get('ids')
+    if not isinstance(ids, list):
+        return jsonify({"error": "'ids' must be a list"}), 400
+    if len(ids) > BATCH_MAX_IDS:
+        return jsonify({"error": f"At most {BATCH_MAX_IDS} ids per request"}), 400
+
+    fields = parse_fields(data.get('fields'))
+    projection = {field: 1 for field in fields} if fields else HIDDEN_FIELDS
+
+    object_ids = [ObjectId(eid) for eid in set(ids) if ObjectId.is_valid(eid)]
+    found = {}
+    for event in events_collection.find({'_id': {'$in': object_ids}}, projection):
+        serialize_event(event)
+        found[event['_id']] = event
+    return jsonify({'events': [found.get(eid) for eid in ids]})
+
+def _requested_tickets():
+    data = request.get_json(silent=True) or {}
+    tickets = int(data.get('tickets', 0))
+    if tickets <= 0:
+        raise ValueError("'tickets' must be a positive integer")
+    return tickets
+
+def _reservation_id():
+    reservation_id = (request.get_json(silent=True) or {}).get('reservation_id')
+    if reservation_id is not None and (not isinstance(reservation_id, str) or not 0 < len(reservation_id) <= 64):
+        raise ValueError("'reservation_id' must be a string of at most 64 characters")
+    return reservation_id
+
+@app.route('/api/events/<event_id>/reserve', methods=['POST'])
+def reserve_tickets(event_id):
+    """Atomically take tickets from inventory, only if enough remain
+
+    With a "reservation_id" the reserve is made at most once under that id
+    (a repeat gets the first reservation back), and /release with the same id
+    gives back exactly these tickets, even if it arrives first.
+    """
+    try:
+        tickets = _requested_tickets()
+        reservation_id = _reservation_id()
+        if reservation_id:
+            earlier = start_reservation(reservations_collection, reservation_id, str(ObjectId(event_id)), tickets)
+            if earlier and earlier['status'] == 'reserved' and earlier['event_id'] == str(ObjectId(event_id)):
+                event = events_collection.find_one({'_id': ObjectId(event_id)}, {'tickets_available': 1})
+                return jsonify({"event_id": event_id, "reserved": earlier['tickets'],
+                                "tickets_available": event['tickets_available']}), 200
+            if earlier:
+                return jsonify({"error": f"Reservation {reservation_id} was already used"}), 409
+        if reserve_coalescer:
+            remaining = reserve_coalescer.reserve(str(ObjectId(event_id)), tickets)
+        else:
+            event = events_collection.find_one_and_update(
+                {'_id': ObjectId(event_id), **available_filter(tickets)},
+                sell(tickets),
+                projection={'tickets_available': 1},
+                return_document=ReturnDocument.AFTER
+            )
+            remaining = event['tickets_available'] if event else None
+        if reservation_id:
+            finish_reservation(reservations_collection, reservation_id, remaining is not None)
+        invalidate_event(event_id)
+        if remaining is not None:
+            return jsonify({"event_id": event_id, "reserved": tickets,
+                            "tickets_available": remaining}), 200
+
+        # Distinguish a missing event from a sold-out one
+        if not events_collection.find_one({'_id': ObjectId(event_id)}, {'_id': 1}):
+            return jsonify({"error": "Event not found"}), 404
+        return jsonify({"error": "Not enough tickets available"}), 409
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+
+@app.route('/api/events/<event_id>/release', methods=['POST'])
+def release_tickets(event_id):
+    """Atomically return previously reserved tickets to inventory
+
+    With a "reservation_id" the tickets of that reservation are given back at
+    most once, so the call can be retried; "released" is 0 if they already
+    were, or the reserve never took any. Answers 409 while the reserve is
+    still running.
+    """
+    try:
+        reservation_id = _reservation_id()
+        if reservation_id:
+            tickets, event = release_reservation(events_collection, reservations_collection,
+                                                 str(ObjectId(event_id)), reservation_id)
+        else:
+            tickets = _requested_tickets()
+            event = events_collection.find_one_and_update(
+                {'_id': ObjectId(event_id)},
+                sell(-tickets),
+                projection={'tickets_available': 1},
+                return_document=ReturnDocument.AFTER
+            )
+        invalidate_event(event_id)
+        if not event:
+            return jsonify({"error": "Event not found"}), 404
+        return jsonify({"event_id": event_id, "released": tickets,
+                        "tickets_available": event['tickets_available']}), 200
+    except ReservationPending as e:
+        return jsonify({"error": str(e)}), 409
     except Exception as e:
         return jsonify({"error": str(e)}), 400
     
+@app.route('/api/events/<event_id>/holds', methods=['POST'])
+def create_event_hold(event_id):
+    """Hold tickets for HOLD_TTL_SECONDS (or `ttl`) for a session
+
+    Body: {"tickets": n, "session_id": optional owner id, "ttl": optional seconds}.
+    Answers 429 once the owner or client address has too many active holds.
+    """
+    try:
+        tickets = _requested_tickets()
+        data = request.get_json(silent=True) or {}
+        session_id = data.get('session_id') or hold_session_id()
+        ttl = min(int(data.get('ttl', HOLD_TTL)), HOLD_TTL)
+        hold = place_hold(event_id, session_id, tickets, ttl)
+    except HoldLimitReached as e:
+        return jsonify({"error": str(e)}), 429
+    except Exception as e:
+        return jsonify({"error": str(e)}), 400
+    if not hold:
+        if not events_collection.find_one({'_id': ObjectId(event_id)}, {'_id': 1}):
+            return jsonify({"error": "Event not found"}), 404
+        return jsonify({"error": "Not enough tickets available"}), 409
+    invalidate_event(event_id)
+    return jsonify({
+        "hold_id": str(hold['_id']),
+        "event_id": event_id,
+        "session_id": session_id,
+        "tickets": tickets,
+        "expires_at": hold['expires_at'].isoformat() + 'Z'
+    }), 201
+
+@app.route('/api/holds/<hold_id>', methods=['DELETE'])
+def delete_hold(hold_id):
+    """Release a hold; only its owner (body session_id or browser session) may"""
+    owner = hold_owner()
+    if not owner:
+        return jsonify({"error": "session_id is required"}), 400
+    hold = release_hold(events_collection, holds_collection, hold_id, owner)
+    if not hold:
+        return jsonify({"error": "Hold not found or no longer active"}), 404
+    invalidate_event(hold['event_id'])
+    return jsonify({"hold_id": hold_id, "released": hold['tickets']}), 200
+
+@app.route('/api/holds/<hold_id>/confirm', methods=['POST'])
+def confirm_hold(hold_id):
+    """Sell a held hold's tickets (no inventory re-check; the hold guarantees them)
+
+    Only the hold's owner (body session_id or browser session) may confirm it.
+    """
+    owner = hold_owner()
+    if not owner:
+        return jsonify({"error": "session_id is required"}), 400
+    converted = convert_hold(events_collection, holds_collection, hold_id, owner)
+    if not converted:
+        return jsonify({"error": "Hold not found, expired or already used"}), 410
+    hold, event = converted
+    invalidate_event(hold['event_id'])
+    return jsonify({
+        "hold_id": hold_id,
+        "event_id": hold['event_id'],
+        "reserved": hold['tickets'],
+        "tickets_available": event['tickets_available']
+    }), 200
+
+IMPORT_BATCH_SIZE = int(os.getenv('EVENTS_IMPORT_BATCH_SIZE', 1000))
+IMPORT_MAX_ERRORS = int(os.getenv('EVENTS_IMPORT_MAX_ERRORS', 1000))
+EXPORT_BATCH_SIZE = int(os.getenv('EVENTS_EXPORT_BATCH_SIZE', 1000))
+
+@app.route('/api/events/import', methods=['POST'])
+def import_events():
+    """Bulk-create events from an NDJSON body, one event object per line
+
+    The body is read line by line and written in unordered insert_many batches,
+    so uploads of any size use constant memory. Invalid lines are skipped and
+    reported by line number (up to EVENTS_IMPORT_MAX_ERRORS of them).
+    """
+    inserted = 0
+    failed = 0
+    errors = []
+    batch = []
+    batch_lines = []
+
+    def record_error(line_no, message):
+        nonlocal failed
+        failed += 1
+        if len(errors) < IMPORT_MAX_ERRORS:
+            errors.append({"line": line_no, "error": message})
+
+    def flush():
+        nonlocal inserted
+        if not batch:
+            return
+        try:
+            inserted += len(events_collection.insert_many(batch, ordered=False).inserted_ids)
+        except BulkWriteError as e:
+            inserted += e.details.get('nInserted', 0)
+            for write_error in e.details.get('writeErrors', []):
+                record_error(batch_lines[write_error['index']], write_error.get('errmsg', 'write failed'))
+        batch.clear()
+        batch_lines.clear()
+
+    for line_no, line in enumerate(request.stream, start=1):
+        line = line.strip()
+        if not line:
+            continue
+        try:
+            event_data = app.json.loads(line)
+            if not isinstance(event_data, dict):
+                raise ValueError("line is not a JSON object")
+            batch.append(build_event(event_data))
+            batch_lines.append(line_no)
+        except (ValueError, TypeError) as e:
+            record_error(line_no, str(e))
+            continue
+        if len(batch) >= IMPORT_BATCH_SIZE:
+            flush()
+    flush()
+
+    if inserted:
+        event_counter.adjust(inserted)
+        page_cache.bump()
+    return jsonify({"inserted": inserted, "failed": failed, "errors": errors}), 200 if not failed else 207
+
+@app.route('/api/events/export')
+def export_events():
+    """Stream every event as NDJSON, paging through the collection by _id"""
+    fields = parse_fields(request.args.get('fields'))
+    projection = {field: 1 for field in fields} if fields else HIDDEN_FIELDS
+
+    def generate():
+        last_id = None
+        while True:
+            query = {'_id': {'$gt': last_id}} if last_id else {}
+            events = list(events_collection.find(query, projection).sort('_id', 1).limit(EXPORT_BATCH_SIZE))
+            if not events:
+                break
+            last_id = events[-1]['_id']
+            chunk = []
+            for event in events:
+                chunk.append(app.json.dumps(serialize_event(event)))
+            yield '\n'.join(chunk) + '\n'
+
+    return Response(stream_with_context(generate()), mimetype='application/x-ndjson')
+
+@app.route('/api/cache/stats')
+def cache_stats():
+    return jsonify({
+        'events': event_cache.stats(),
+        'pages': page_cache.stats(),
+        'reserve_coalescing': reserve_coalescer.stats() if reserve_coalescer else None
+    })
+
 if __name__ == '__main__':
+    hold_sweeper.start()
     app.run(host="0.0.0.0", port=5000)
\ No newline at end of file
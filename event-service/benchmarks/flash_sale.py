@@ -0,0 +1,144 @@
+"""Flash sale: many buyers hold, confirm, release and buy one hot event at once
+
+Each buyer thread places a one-ticket hold and then confirms or releases it,
+or buys straight through /reserve, in a loop. Buyers come from --addresses
+client addresses (one each by default) and hold under the app's real
+per-session and per-client caps, so a shared address can get 429s.
+Afterwards the inventory must add up: nothing oversold, nothing left held,
+every ticket sold accounted for by a 200 response, and every cap counter
+back at zero.
+
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/flash_sale.py --buyers 50 --rounds 20 --stock 200
+
+That is 1,000 purchase attempts by 50 concurrent buyers on one event. The
+test suite runs 12 buyers x 9 rounds on mongomock, once from 12 addresses
+and once from 3 with a per-client cap of 2; that checks correctness, not
+throughput. The run creates its own event in event_db and deletes it, and
+its cap counters, afterwards.
+"""
+import argparse
+import os
+import re
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+ADDRESS_PREFIX = '10.99.'
+# Cap counters of the benchmark's sessions and addresses
+COUNTERS_QUERY = {'_id': {'$regex': f'^(session:flash-sale-buyer-|client:{re.escape(ADDRESS_PREFIX)})'}}
+
+
+def buyer_address(number, addresses):
+    number %= addresses
+    return f'{ADDRESS_PREFIX}{number // 256}.{number % 256}'
+
+
+def hold_counters(app_module):
+    return app_module.db[f'{app_module.holds_collection.name}_counters']
+
+
+def flash_sale(app_module, event_id, buyers, rounds, addresses):
+    """Run the sale; returns response counts per action and timing"""
+    counts = Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(buyers)
+
+    def buyer(number):
+        client = app_module.app.test_client()
+        client.environ_base['REMOTE_ADDR'] = buyer_address(number, addresses)
+        owner = {'session_id': f'flash-sale-buyer-{number}'}
+        local = Counter()
+        barrier.wait()
+        for turn in range(rounds):
+            action = ('confirm', 'release', 'reserve')[(number + turn) % 3]
+            if action == 'reserve':
+                status = client.post(f'/api/events/{event_id}/reserve', json={'tickets': 1}).status_code
+                local[f'reserve_{status}'] += 1
+                continue
+            held = client.post(f'/api/events/{event_id}/holds', json={'tickets': 1, **owner})
+            local[f'hold_{held.status_code}'] += 1
+            if held.status_code != 201:
+                continue
+            hold_id = held.get_json()['hold_id']
+            if action == 'confirm':
+                local[f'confirm_{client.post(f"/api/holds/{hold_id}/confirm", json=owner).status_code}'] += 1
+            else:
+                local[f'release_{client.delete(f"/api/holds/{hold_id}", json=owner).status_code}'] += 1
+        with lock:
+            counts.update(local)
+
+    threads = [threading.Thread(target=buyer, args=(number,)) for number in range(buyers)]
+    started = time.perf_counter()
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    total = sum(count for name, count in counts.items() if not name.startswith(('confirm', 'release')))
+    return {'counts': dict(counts), 'seconds': round(elapsed, 3),
+            'requests_per_sec': round(sum(counts.values()) / elapsed, 1) if elapsed else 0.0,
+            'purchase_attempts': total}
+
+
+def inventory_errors(app_module, event_id, stock, result):
+    """Differences between the stored inventory and what the responses promised"""
+    from bson.objectid import ObjectId
+
+    counts = result['counts']
+    event = app_module.events_collection.find_one({'_id': ObjectId(event_id)})
+    sold = counts.get('confirm_200', 0) + counts.get('reserve_200', 0)
+    errors = []
+    unexpected = {name: count for name, count in counts.items()
+                  if name not in ('hold_201', 'hold_409', 'hold_429', 'confirm_200', 'release_200',
+                                  'reserve_200', 'reserve_409')}
+    if unexpected:
+        errors.append(f'unexpected responses: {unexpected}')
+    if sold > stock:
+        errors.append(f'oversold: {sold} tickets sold from a stock of {stock}')
+    if event['tickets_available'] != stock - sold:
+        errors.append(f"tickets_available is {event['tickets_available']}, expected {stock - sold}")
+    if event.get('tickets_sold', 0) != sold:
+        errors.append(f"tickets_sold is {event.get('tickets_sold', 0)}, expected {sold}")
+    if event.get('tickets_held', 0) != 0:
+        errors.append(f"{event['tickets_held']} tickets still held")
+    for counter in hold_counters(app_module).find(COUNTERS_QUERY):
+        if counter['active'] != 0:
+            errors.append(f"{counter['_id']} still counts {counter['active']} active holds")
+    return errors
+
+
+
+def run(app_module, buyers, rounds, stock, addresses=None):
+    """Create an event with `stock` tickets, run the sale on it, and check it; returns (result, errors)"""
+    event = app_module.build_event({'name': 'Flash sale benchmark', 'tickets_available': stock})
+    event_id = str(app_module.events_collection.insert_one(event).inserted_id)
+    try:
+        result = flash_sale(app_module, event_id, buyers, rounds, addresses or buyers)
+        return result, inventory_errors(app_module, event_id, stock, result)
+    finally:
+        app_module.events_collection.delete_one({'_id': event['_id']})
+        hold_counters(app_module).delete_many(COUNTERS_QUERY)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--buyers', type=int, default=50)
+    parser.add_argument('--rounds', type=int, default=20, help='purchase attempts per buyer')
+    parser.add_argument('--stock', type=int, default=200)
+    parser.add_argument('--addresses', type=int, help='client addresses the buyers share (default: one each)')
+    args = parser.parse_args()
+
+    import app as app_module
+
+    result, errors = run(app_module, args.buyers, args.rounds, args.stock, args.addresses)
+    print(result)
+    for error in errors:
+        print(f'ERROR: {error}')
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
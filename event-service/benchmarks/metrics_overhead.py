@@ -0,0 +1,74 @@
+"""Cost of the Prometheus metrics: per-request recording and /metrics rendering
+
+Times, with timeit and a private registry so nothing global is touched:
+  - one request's bookkeeping (a histogram observe plus a counter increment)
+  - rendering a registry holding --series label sets per metric
+  - a Flask request to a trivial route with and without instrument_flask
+
+    python benchmarks/metrics_overhead.py --series 120
+"""
+import argparse
+import os
+import sys
+import timeit
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import metrics
+
+
+def best(stmt, number, repeat=5):
+    """Best per-call time in seconds over `repeat` timeit runs"""
+    return min(timeit.repeat(stmt, number=number, repeat=repeat)) / number
+
+
+def per_request(number=100000):
+    registry = metrics.Registry()
+    latency = registry.histogram("bench_duration_seconds", "bench", ("method", "route"))
+    requests = registry.counter("bench_requests_total", "bench", ("method", "route", "status"))
+
+    def record():
+        latency.observe(0.012, "GET", "/api/events/<event_id>")
+        requests.inc("GET", "/api/events/<event_id>", 200)
+    return best(record, number)
+
+
+def render(series, number=20):
+    registry = metrics.Registry()
+    latency = registry.histogram("bench_duration_seconds", "bench", ("method", "route"))
+    requests = registry.counter("bench_requests_total", "bench", ("method", "route", "status"))
+    for i in range(series):
+        latency.observe(0.01 * (i % 7), "GET", f"/route/{i}")
+        requests.inc("GET", f"/route/{i}", 200)
+    return best(registry.render, number)
+
+
+def flask_request(instrumented, number=5000):
+    from flask import Flask
+
+    app = Flask(__name__)
+    if instrumented:
+        metrics.instrument_flask(app)
+
+    @app.route("/ping")
+    def ping():
+        return "pong"
+
+    client = app.test_client()
+    return best(lambda: client.get("/ping"), number, repeat=9)
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--series", type=int, default=120, help="label sets per metric when rendering")
+    args = parser.parse_args()
+
+    print(f"observe + inc per request: {per_request() * 1e6:.2f} us")
+    print(f"render {args.series} series:       {render(args.series) * 1e3:.2f} ms")
+    bare, instrumented = flask_request(False), flask_request(True)
+    print(f"flask request bare:         {bare * 1e6:.1f} us")
+    print(f"flask request instrumented: {instrumented * 1e6:.1f} us (+{(instrumented - bare) * 1e6:.1f} us)")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,65 @@
+"""/reserve throughput with and without write coalescing at 1, 10 and 100 buyers
+
+Every buyer thread hammers one hot event; each level is run once with one
+conditional update per request and once with the ReserveCoalescer merging
+requests that arrive within --window-ms. Inventory is checked after each run.
+
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/reserve_coalescing.py --attempts 20 --window-ms 2
+
+The run creates its own events in event_db and deletes them afterwards.
+"""
+import argparse
+import os
+import sys
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.reserve_contention import hammer, inventory_errors
+
+
+def run_level(app_module, buyers, attempts, window):
+    """One level, per-request updates vs coalesced; returns {mode: result}"""
+    from coalescing import ReserveCoalescer
+
+    results = {}
+    original = app_module.reserve_coalescer
+    try:
+        for mode in ('per_request', 'coalesced'):
+            coalescer = ReserveCoalescer(app_module.events_collection, window) if mode == 'coalesced' else None
+            app_module.reserve_coalescer = coalescer
+            # Enough stock that nobody is turned away: measure the write path only
+            stock = buyers * attempts
+            event = app_module.build_event({'name': 'Coalescing benchmark', 'tickets_available': stock})
+            event_id = str(app_module.events_collection.insert_one(event).inserted_id)
+            try:
+                result = hammer(app_module, event_id, buyers, attempts)
+                result['errors'] = inventory_errors(app_module, event_id, stock, result)
+            finally:
+                app_module.events_collection.delete_one({'_id': event['_id']})
+            result['updates'] = coalescer.stats()['batches'] if coalescer else result['requests']
+            results[mode] = result
+    finally:
+        app_module.reserve_coalescer = original
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--levels', default='1,10,100', help='comma separated buyer counts')
+    parser.add_argument('--attempts', type=int, default=20, help='requests per buyer')
+    parser.add_argument('--window-ms', type=float, default=2.0)
+    args = parser.parse_args()
+
+    import app as app_module
+
+    failed = False
+    for buyers in (int(level) for level in args.levels.split(',')):
+        for mode, result in run_level(app_module, buyers, args.attempts, args.window_ms / 1000).items():
+            failed = failed or bool(result['errors'])
+            print(f"{buyers:>4} buyers {mode:>11}: {result['requests_per_sec']:>8} req/s, "
+                  f"{result['updates']} updates for {result['requests']} requests, errors: {result['errors']}")
+    sys.exit(1 if failed else 0)
+
+
+if __name__ == '__main__':
+    main()
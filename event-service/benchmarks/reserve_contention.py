@@ -0,0 +1,96 @@
+"""Hammer one hot event's /reserve endpoint from many threads
+
+Reports throughput and checks the final inventory is exact: every 200 took
+exactly `tickets` tickets and nothing was oversold.
+
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/reserve_contention.py --threads 50 --attempts 40
+
+The run creates its own event in event_db and deletes it afterwards.
+"""
+import argparse
+import os
+import sys
+import threading
+import time
+from collections import Counter
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+
+def hammer(app_module, event_id, threads, attempts, tickets=1, path='reserve'):
+    """Send `attempts` requests from each of `threads` threads; returns counts and timing"""
+    counts = Counter()
+    lock = threading.Lock()
+    barrier = threading.Barrier(threads)
+
+    def worker():
+        client = app_module.app.test_client()
+        local = Counter()
+        barrier.wait()
+        for _ in range(attempts):
+            local[client.post(f'/api/events/{event_id}/{path}', json={'tickets': tickets}).status_code] += 1
+        with lock:
+            counts.update(local)
+
+    workers = [threading.Thread(target=worker) for _ in range(threads)]
+    started = time.perf_counter()
+    for thread in workers:
+        thread.start()
+    for thread in workers:
+        thread.join()
+    elapsed = time.perf_counter() - started
+    total = sum(counts.values())
+    return {
+        'requests': total,
+        'reserved': counts[200],
+        'sold_out': counts[409],
+        'other': total - counts[200] - counts[409],
+        'seconds': round(elapsed, 3),
+        'requests_per_sec': round(total / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def inventory_errors(app_module, event_id, stock, result, tickets=1):
+    """Differences between the stored inventory and what the responses promised"""
+    from bson.objectid import ObjectId
+
+    event = app_module.events_collection.find_one({'_id': ObjectId(event_id)})
+    sold = result['reserved'] * tickets
+    errors = []
+    if result['other']:
+        errors.append(f"{result['other']} unexpected responses")
+    if sold > stock:
+        errors.append(f'oversold: {sold} tickets reserved from a stock of {stock}')
+    if event['tickets_available'] != stock - sold:
+        errors.append(f"tickets_available is {event['tickets_available']}, expected {stock - sold}")
+    if event.get('tickets_sold', 0) != sold:
+        errors.append(f"tickets_sold is {event.get('tickets_sold', 0)}, expected {sold}")
+    return errors
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--threads', type=int, default=50)
+    parser.add_argument('--attempts', type=int, default=40, help='requests per thread')
+    parser.add_argument('--stock', type=int, default=1000)
+    parser.add_argument('--tickets', type=int, default=1, help='tickets per request')
+    args = parser.parse_args()
+
+    import app as app_module
+
+    event = app_module.build_event({'name': 'Contention benchmark', 'tickets_available': args.stock})
+    event_id = str(app_module.events_collection.insert_one(event).inserted_id)
+    try:
+        result = hammer(app_module, event_id, args.threads, args.attempts, args.tickets)
+        errors = inventory_errors(app_module, event_id, args.stock, result, args.tickets)
+    finally:
+        app_module.events_collection.delete_one({'_id': event['_id']})
+
+    print(result)
+    for error in errors:
+        print(f'ERROR: {error}')
+    sys.exit(1 if errors else 0)
+
+
+if __name__ == '__main__':
+    main()
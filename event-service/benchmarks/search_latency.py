@@ -0,0 +1,81 @@
+"""Search latency of the text, prefix and regex modes at several collection sizes
+
+Seeds a scratch database (event_search_bench, dropped afterwards) with
+synthetic events, builds the same indexes as the app and times each mode of
+build_search() for a handful of queries.
+
+    MONGO_URI=mongodb://localhost:27017 python benchmarks/search_latency.py --sizes 10000 100000 1000000
+"""
+import argparse
+import os
+import random
+import statistics
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from pymongo import MongoClient
+from search import SEARCH_MODES, build_search, ensure_search_indexes, search_terms
+
+WORDS = ('music jazz rock festival concert theatre comedy night summer winter food street art '
+         'cricket match final league opera ballet orchestra expo tech startup book fair film').split()
+CITIES = ('Lahore', 'Karachi', 'Islamabad', 'Peshawar', 'Multan', 'Quetta', 'Faisalabad')
+QUERIES = ('jazz', 'rock festival', 'lahore', 'orch', 'cricket final')
+
+
+def seed(collection, size, batch_size=10000):
+    rng = random.Random(size)
+    collection.drop()
+    for start in range(0, size, batch_size):
+        batch = []
+        for i in range(start, min(start + batch_size, size)):
+            event = {
+                'name': ' '.join(rng.sample(WORDS, 3)).title() + f' {i}',
+                'location': rng.choice(CITIES),
+                'description': ' '.join(rng.choices(WORDS, k=20)),
+                'price': rng.randint(100, 5000),
+                'tickets_available': rng.randint(0, 500),
+            }
+            event['search_terms'] = search_terms(event)
+            batch.append(event)
+        collection.insert_many(batch, ordered=False)
+    ensure_search_indexes(collection)
+
+
+def time_query(collection, query, mode, repeat, limit=20):
+    filter_, projection, sort = build_search(query, mode)
+    samples = []
+    for _ in range(repeat):
+        started = time.perf_counter()
+        cursor = collection.find(filter_, projection)
+        if sort:
+            cursor = cursor.sort(sort)
+        list(cursor.limit(limit))
+        samples.append((time.perf_counter() - started) * 1000)
+    samples.sort()
+    return statistics.median(samples), samples[max(0, int(len(samples) * 0.95) - 1)]
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--sizes', type=int, nargs='+', default=[10000, 100000, 1000000])
+    parser.add_argument('--repeat', type=int, default=20)
+    args = parser.parse_args()
+
+    client = MongoClient(os.getenv('MONGO_URI', 'mongodb://localhost:27017'))
+    db = client['event_search_bench']
+    try:
+        print(f"{'events':>9} {'mode':>7} {'query':>14} {'p50 ms':>9} {'p95 ms':>9}")
+        for size in args.sizes:
+            seed(db.events, size)
+            for mode in SEARCH_MODES:
+                for query in QUERIES:
+                    p50, p95 = time_query(db.events, query, mode, args.repeat)
+                    print(f'{size:>9} {mode:>7} {query:>14} {p50:>9.2f} {p95:>9.2f}')
+    finally:
+        client.drop_database('event_search_bench')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,102 @@
+import threading
+import time
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument
+from inventory import available_filter, sell
+
+
+class _Batch:
+    def __init__(self):
+        self.tickets = []
+        self.results = []
+        self.error = None
+        self.done = threading.Event()
+
+
+class ReserveCoalescer:
+    """Merge concurrent reservations for the same event into one update
+
+    The first caller for an event opens a batch and waits `window` seconds;
+    callers arriving meanwhile join it. The batch total is then taken with one
+    conditional update. If that fails, the tickets still free are handed out
+    to the batch in arrival order and the rest are told the event is sold out.
+    """
+
+    def __init__(self, collection, window=0.005, max_attempts=3):
+        self.collection = collection
+        self.window = window
+        self.max_attempts = max_attempts
+        self._open = {}
+        self._lock = threading.Lock()
+        self.batches = 0
+        self.requests = 0
+
+    def reserve(self, event_id, tickets):
+        """tickets_available after the reservation, or None if it could not be made"""
+        with self._lock:
+            batch = self._open.get(event_id)
+            leader = batch is None
+            if leader:
+                batch = self._open[event_id] = _Batch()
+            index = len(batch.tickets)
+            batch.tickets.append(tickets)
+            batch.results.append(None)
+
+        if leader:
+            time.sleep(self.window)
+            with self._lock:
+                del self._open[event_id]
+                self.batches += 1
+                self.requests += len(batch.tickets)
+            try:
+                self._apply(event_id, batch)
+            except Exception as e:
+                batch.error = e
+            finally:
+                batch.done.set()
+        else:
+            batch.done.wait()
+
+        if batch.error is not None:
+            raise batch.error
+        return batch.results[index]
+
+    def _apply(self, event_id, batch):
+        pending = list(range(len(batch.tickets)))
+        for _ in range(self.max_attempts):
+            total = sum(batch.tickets[i] for i in pending)
+            if not total:
+                return
+            event = self.collection.find_one_and_update(
+                {'_id': ObjectId(event_id), **available_filter(total)},
+                sell(total),
+                projection={'tickets_available': 1},
+                return_document=ReturnDocument.AFTER
+            )
+            if event:
+                for i in pending:
+                    batch.results[i] = event['tickets_available']
+                return
+
+            # Not enough for everyone: keep the requests that still fit, first come first served
+            current = self.collection.find_one(
+                {'_id': ObjectId(event_id)}, {'tickets_available': 1, 'tickets_held': 1}
+            )
+            if not current:
+                return
+            free = current['tickets_available'] - current.get('tickets_held', 0)
+            fits = []
+            for i in pending:
+                if batch.tickets[i] <= free:
+                    fits.append(i)
+                    free -= batch.tickets[i]
+            pending = fits
+
+    def stats(self):
+        with self._lock:
+            return {
+                'window_ms': self.window * 1000,
+                'batches': self.batches,
+                'requests': self.requests,
+                'avg_batch_size': self.requests / self.batches if self.batches else 0,
+            }
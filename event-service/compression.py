@@ -0,0 +1,48 @@
+import gzip
+import os
+
+try:
+    import brotli
+except ImportError:  # optional: gzip only
+    brotli = None
+
+COMPRESS_MIN_SIZE = int(os.getenv('COMPRESS_MIN_SIZE', 1024))
+COMPRESS_LEVEL = int(os.getenv('COMPRESS_LEVEL', 5))
+COMPRESSIBLE_TYPES = ('application/json', 'text/html', 'text/css', 'text/plain', 'application/x-ndjson')
+
+
+def _accepted(header):
+    return {part.split(';')[0].strip().lower() for part in header.split(',') if part.strip()}
+
+
+def compress_response(response, accept_encoding):
+    """Compress a response body with brotli or gzip when the client accepts it
+
+    Streamed, already-encoded, small or non-text responses are left alone.
+    """
+    if (response.direct_passthrough or response.is_streamed
+            or response.status_code < 200 or response.status_code in (204, 304)
+            or 'Content-Encoding' in response.headers
+            or response.mimetype not in COMPRESSIBLE_TYPES):
+        return response
+
+    accepted = _accepted(accept_encoding or '')
+    if brotli is not None and 'br' in accepted:
+        encoding = 'br'
+    elif 'gzip' in accepted:
+        encoding = 'gzip'
+    else:
+        return response
+
+    body = response.get_data()
+    if len(body) < COMPRESS_MIN_SIZE:
+        return response
+    if encoding == 'br':
+        body = brotli.compress(body, quality=COMPRESS_LEVEL)
+    else:
+        body = gzip.compress(body, compresslevel=COMPRESS_LEVEL)
+
+    response.set_data(body)
+    response.headers['Content-Encoding'] = encoding
+    response.vary.add('Accept-Encoding')
+    return response
@@ -0,0 +1,135 @@
+import logging
+from datetime import datetime
+from pymongo import ASCENDING, DESCENDING, UpdateOne
+from inventory import available_filter
+
+DATE_FORMAT = '%Y-%m-%d'
+
+# Sort options for listings; _id is appended as the tie-breaker
+SORTS = {
+    'date': [('date', ASCENDING)],
+    '-date': [('date', DESCENDING)],
+    'price': [('price', ASCENDING)],
+    '-price': [('price', DESCENDING)],
+}
+
+
+def parse_date(value):
+    """'YYYY-MM-DD' (or a datetime) to a datetime at midnight; '' and None give None"""
+    if value is None or value == '':
+        return None
+    if isinstance(value, datetime):
+        return value
+    return datetime.strptime(value, DATE_FORMAT)
+
+
+def date_string(value):
+    """Stored event date back to the 'YYYY-MM-DD' string clients expect"""
+    if isinstance(value, datetime):
+        return value.strftime(DATE_FORMAT)
+    return value or ''
+
+
+def ensure_filter_indexes(collection):
+    """Compound indexes for the listing filters, ordered equality, sort, range
+
+    Listings sort by (key, _id), so every index has location (matched exactly)
+    first, then the sort key and _id, so pages come back in index order with no
+    in-memory SORT. The remaining filter fields trail, so date/price ranges and
+    availability are checked inside the index before documents are fetched.
+    Listings in plain _id order with available=1 use a partial index holding
+    only events with unsold tickets.
+    """
+    collection.create_index(
+        [('location', ASCENDING), ('date', ASCENDING), ('_id', ASCENDING),
+         ('price', ASCENDING), ('tickets_available', ASCENDING)],
+        name='events_location_date_id'
+    )
+    collection.create_index(
+        [('location', ASCENDING), ('price', ASCENDING), ('_id', ASCENDING),
+         ('date', ASCENDING), ('tickets_available', ASCENDING)],
+        name='events_location_price_id'
+    )
+    collection.create_index(
+        [('location', ASCENDING), ('_id', ASCENDING), ('date', ASCENDING),
+         ('price', ASCENDING), ('tickets_available', ASCENDING)],
+        name='events_location_id'
+    )
+    collection.create_index(
+        [('date', ASCENDING), ('_id', ASCENDING), ('price', ASCENDING), ('tickets_available', ASCENDING)],
+        name='events_date_id'
+    )
+    collection.create_index(
+        [('price', ASCENDING), ('_id', ASCENDING), ('date', ASCENDING), ('tickets_available', ASCENDING)],
+        name='events_price_id'
+    )
+    collection.create_index(
+        [('_id', ASCENDING), ('date', ASCENDING), ('price', ASCENDING)],
+        name='events_in_stock_id',
+        partialFilterExpression={'tickets_available': {'$gt': 0}}
+    )
+
+
+def migrate_dates(collection, batch_size=1000):
+    """Convert events whose date is still a 'YYYY-MM-DD' string to a BSON date
+
+    Dates that don't parse are left as they are and logged, so nothing is lost;
+    returns the ids of those events.
+    """
+    ops = []
+    unparseable = []
+    for event in collection.find({'date': {'$type': 'string'}}, {'date': 1}):
+        try:
+            value = parse_date(event['date'])
+        except ValueError:
+            logging.warning(f"Event {event['_id']} keeps unparseable date {event['date']!r}")
+            unparseable.append(event['_id'])
+            continue
+        ops.append(UpdateOne({'_id': event['_id']}, {'$set': {'date': value}}))
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+    return unparseable
+
+
+def build_filters(args):
+    """Mongo filter from listing query parameters; raises ValueError on bad input
+
+    date_from/date_to (inclusive days), price_min/price_max, location (exact)
+    and available=1 (only events with tickets left that aren't on hold).
+    """
+    query = {}
+    if args.get('location'):
+        query['location'] = args['location']
+
+    date_range = {}
+    if args.get('date_from'):
+        date_range['$gte'] = parse_date(args['date_from'])
+    if args.get('date_to'):
+        date_range['$lte'] = parse_date(args['date_to'])
+    if date_range:
+        query['date'] = date_range
+
+    price_range = {}
+    if args.get('price_min'):
+        price_range['$gte'] = float(args['price_min'])
+    if args.get('price_max'):
+        price_range['$lte'] = float(args['price_max'])
+    if price_range:
+        query['price'] = price_range
+
+    if args.get('available') in ('1', 'true'):
+        # The plain range can use an index; $expr then subtracts held tickets
+        query['tickets_available'] = {'$gt': 0}
+        query.update(available_filter(1))
+    return query
+
+
+def parse_sort(value):
+    if not value:
+        return None
+    if value not in SORTS:
+        raise ValueError(f"sort must be one of {', '.join(SORTS)}")
+    return SORTS[value]
@@ -0,0 +1,200 @@
+import logging
+import threading
+import uuid
+from collections import defaultdict
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from pymongo import ASCENDING, ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+from inventory import available_filter, sell
+
+# How long finished holds are kept (for inspection) before the TTL index drops them
+HOLD_RETENTION = timedelta(hours=1)
+
+
+class HoldLimitReached(Exception):
+    """The session or client already has as many active holds as it may"""
+
+
+def _counters(holds):
+    """Active hold count per session and per client, kept next to the holds collection"""
+    return holds.database[f'{holds.name}_counters']
+
+
+def ensure_hold_indexes(holds):
+    holds.create_index([('status', ASCENDING), ('expires_at', ASCENDING)], name='holds_status_expiry')
+    holds.create_index([('session_id', ASCENDING), ('event_id', ASCENDING)], name='holds_session_event')
+    holds.create_index('purge_at', expireAfterSeconds=0, name='holds_purge_ttl')
+    _counters(holds).create_index('purge_at', expireAfterSeconds=0, name='hold_counters_purge_ttl')
+
+
+def _claim(holds, key, limit, purge_at):
+    """Count one more active hold against `key` unless it already has `limit`
+
+    The check and the increment are one update: the filter only matches a
+    counter below the limit, and at the limit the upsert collides with the
+    existing counter instead of creating a second one.
+    """
+    try:
+        _counters(holds).update_one({'_id': key, 'active': {'$lt': limit}},
+                                    {'$inc': {'active': 1}, '$max': {'purge_at': purge_at}}, upsert=True)
+    except DuplicateKeyError:
+        return False
+    return True
+
+
+def _unclaim(holds, keys):
+    for key in keys:
+        _counters(holds).update_one({'_id': key}, {'$inc': {'active': -1}})
+
+
+def create_hold(events, holds, event_id, session_id, tickets, ttl,
+                client=None, max_per_session=None, max_per_client=None):
+    """Put `tickets` on hold for a session; returns the hold, or None if sold out
+
+    tickets_held on the event is raised atomically only if enough unsold,
+    unheld tickets remain, so held tickets can't be sold to anyone else.
+    Raises HoldLimitReached if the session, or the client, already has
+    max_per_session / max_per_client active holds; each cap is claimed
+    atomically on a counter, so concurrent requests can't overshoot it.
+    """
+    now = datetime.utcnow()
+    purge_at = now + timedelta(seconds=ttl) + HOLD_RETENTION
+    caps = [(f'session:{session_id}', max_per_session, 'session')]
+    if client:
+        caps.append((f'client:{client}', max_per_client, 'client'))
+    claimed = []
+    try:
+        for key, limit, owner in caps:
+            if not limit:
+                continue
+            if not _claim(holds, key, limit, purge_at):
+                raise HoldLimitReached(f"At most {limit} active holds per {owner}")
+            claimed.append(key)
+
+        event = events.find_one_and_update(
+            {'_id': ObjectId(event_id), **available_filter(tickets)},
+            {'$inc': {'tickets_held': tickets, 'version': 1}},
+            projection={'_id': 1}
+        )
+    except Exception:
+        _unclaim(holds, claimed)
+        raise
+    if not event:
+        _unclaim(holds, claimed)
+        return None
+
+    hold = {
+        'event_id': event_id,
+        'session_id': session_id,
+        'client': client,
+        'counters': claimed,
+        'tickets': tickets,
+        'status': 'active',
+        'created_at': now,
+        'expires_at': now + timedelta(seconds=ttl),
+        'purge_at': purge_at,
+    }
+    try:
+        holds.insert_one(hold)
+    except Exception:
+        events.update_one({'_id': ObjectId(event_id)}, {'$inc': {'tickets_held': -tickets, 'version': 1}})
+        _unclaim(holds, claimed)
+        raise
+    return hold
+
+
+def release_hold(events, holds, hold_id, session_id):
+    """Give back the tickets of an active hold owned by `session_id`; returns the hold or None"""
+    query = {'_id': ObjectId(hold_id), 'status': 'active', 'session_id': session_id}
+    hold = holds.find_one_and_update(query, {'$set': {'status': 'released'}})
+    if hold:
+        events.update_one({'_id': ObjectId(hold['event_id'])},
+                          {'$inc': {'tickets_held': -hold['tickets'], 'version': 1}})
+        _unclaim(holds, hold.get('counters', []))
+    return hold
+
+
+def convert_hold(events, holds, hold_id, session_id):
+    """Turn an unexpired hold owned by `session_id` into sold tickets without re-checking inventory
+
+    Returns (hold, event after the update) or None if the hold is gone.
+    """
+    query = {'_id': ObjectId(hold_id), 'status': 'active', 'session_id': session_id,
+             'expires_at': {'$gt': datetime.utcnow()}}
+    hold = holds.find_one_and_update(query, {'$set': {'status': 'converted'}})
+    if not hold:
+        return None
+    _unclaim(holds, hold.get('counters', []))
+    update = sell(hold['tickets'])
+    update['$inc']['tickets_held'] = -hold['tickets']
+    event = events.find_one_and_update(
+        {'_id': ObjectId(hold['event_id'])}, update,
+        projection={'tickets_available': 1, 'tickets_held': 1, 'tickets_sold': 1},
+        return_document=ReturnDocument.AFTER
+    )
+    return hold, event
+
+
+def sweep_expired(events, holds, batch_size=1000):
+    """Expire overdue holds and return their tickets; returns the number expired
+
+    Holds are claimed in batches with a sweep tag, so a hold released or
+    converted concurrently is never counted twice, and each event's
+    tickets_held, and each owner's active hold count, is corrected with one
+    update per batch.
+    """
+    expired = 0
+    while True:
+        ids = [hold['_id'] for hold in holds.find(
+            {'status': 'active', 'expires_at': {'$lte': datetime.utcnow()}}, {'_id': 1}
+        ).limit(batch_size)]
+        if not ids:
+            return expired
+
+        sweep_id = uuid.uuid4().hex
+        holds.update_many({'_id': {'$in': ids}, 'status': 'active'},
+                          {'$set': {'status': 'expired', 'sweep_id': sweep_id}})
+        released = defaultdict(int)
+        unclaimed = defaultdict(int)
+        for hold in holds.find({'sweep_id': sweep_id}, {'event_id': 1, 'tickets': 1, 'counters': 1}):
+            released[hold['event_id']] += hold['tickets']
+            for key in hold.get('counters', []):
+                unclaimed[key] += 1
+            expired += 1
+        if released:
+            events.bulk_write([
+                UpdateOne({'_id': ObjectId(event_id)}, {'$inc': {'tickets_held': -tickets, 'version': 1}})
+                for event_id, tickets in released.items()
+            ], ordered=False)
+        if unclaimed:
+            _counters(holds).bulk_write([
+                UpdateOne({'_id': key}, {'$inc': {'active': -count}}) for key, count in unclaimed.items()
+            ], ordered=False)
+        if len(ids) < batch_size:
+            return expired
+
+
+class HoldSweeper:
+    """Background thread running sweep_expired every `interval` seconds"""
+
+    def __init__(self, events, holds, interval=1.0, on_release=None):
+        self.events = events
+        self.holds = holds
+        self.interval = interval
+        self.on_release = on_release
+        self._stop = threading.Event()
+
+    def start(self):
+        threading.Thread(target=self._run, name='hold-sweeper', daemon=True).start()
+
+    def stop(self):
+        self._stop.set()
+
+    def _run(self):
+        while not self._stop.wait(self.interval):
+            try:
+                if sweep_expired(self.events, self.holds) and self.on_release:
+                    self.on_release()
+            except Exception as e:
+                logging.error(f"Hold sweep failed: {str(e)}")
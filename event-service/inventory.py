@@ -0,0 +1,124 @@
+import uuid
+from datetime import datetime, timedelta
+from bson.objectid import ObjectId
+from pymongo import ReturnDocument, UpdateOne
+from pymongo.errors import DuplicateKeyError
+
+# How long reservation ids are remembered; releases are retried well within this
+RESERVATION_RETENTION = timedelta(days=1)
+
+
+class ReservationPending(Exception):
+    """The reservation's reserve hasn't finished, so whether it took tickets is unknown"""
+
+
+def available_filter(tickets):
+    """Match events with at least `tickets` unsold tickets that aren't on hold"""
+    return {'$expr': {'$gte': [
+        {'$subtract': ['$tickets_available', {'$ifNull': ['$tickets_held', 0]}]},
+        tickets
+    ]}}
+
+
+def sell(tickets):
+    """Update moving `tickets` from inventory to sold (negative to give them back)"""
+    return {'$inc': {'tickets_available': -tickets, 'tickets_sold': tickets, 'version': 1}}
+
+
+def reserve_many(collection, quantities):
+    """Reserve tickets on several events at once, all or nothing
+
+    `quantities` maps event id -> tickets. Every conditional decrement goes out
+    in a single bulk write tagged with a checkout id, so a partial failure can
+    be found and rolled back without a round trip per event.
+    Returns (True, []) or (False, [event ids that could not be reserved]).
+    """
+    checkout_id = uuid.uuid4().hex
+    ops = [
+        UpdateOne(
+            {'_id': ObjectId(event_id), **available_filter(tickets)},
+            {**sell(tickets), '$push': {'pending_checkouts': checkout_id}}
+        )
+        for event_id, tickets in quantities.items()
+    ]
+    result = collection.bulk_write(ops, ordered=False)
+
+    if result.modified_count == len(ops):
+        _clear_tag(collection, quantities, checkout_id)
+        return True, []
+
+    reserved = {
+        str(doc['_id']) for doc in collection.find(
+            {'_id': {'$in': [ObjectId(eid) for eid in quantities]}, 'pending_checkouts': checkout_id},
+            {'_id': 1}
+        )
+    }
+    if reserved:
+        release_many(collection, {eid: quantities[eid] for eid in reserved}, checkout_id)
+    return False, [eid for eid in quantities if eid not in reserved]
+
+
+def release_many(collection, quantities, checkout_id=None):
+    """Give reserved tickets back in one bulk write"""
+    ops = []
+    for event_id, tickets in quantities.items():
+        update = sell(-tickets)
+        if checkout_id:
+            update['$pull'] = {'pending_checkouts': checkout_id}
+        ops.append(UpdateOne({'_id': ObjectId(event_id)}, update))
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+
+
+def _clear_tag(collection, quantities, checkout_id):
+    collection.update_many(
+        {'_id': {'$in': [ObjectId(eid) for eid in quantities]}},
+        {'$pull': {'pending_checkouts': checkout_id}}
+    )
+
+
+def ensure_reservation_indexes(reservations):
+    reservations.create_index('purge_at', expireAfterSeconds=0, name='reservations_purge_ttl')
+
+
+def start_reservation(reservations, reservation_id, event_id, tickets):
+    """Record a reserve about to run under `reservation_id`
+
+    Returns None if this request owns the id, or the record of the earlier
+    request (or release) that used it, which the caller must not reserve for.
+    """
+    try:
+        reservations.insert_one({'_id': reservation_id, 'event_id': event_id, 'tickets': tickets,
+                                 'status': 'pending', 'purge_at': datetime.utcnow() + RESERVATION_RETENTION})
+    except DuplicateKeyError:
+        return reservations.find_one({'_id': reservation_id})
+    return None
+
+
+def finish_reservation(reservations, reservation_id, reserved):
+    reservations.update_one({'_id': reservation_id, 'status': 'pending'},
+                            {'$set': {'status': 'reserved' if reserved else 'failed'}})
+
+
+def release_reservation(collection, reservations, event_id, reservation_id):
+    """Give back the tickets reserved under `reservation_id`, at most once
+
+    Returns (tickets released, event after the release). A release that
+    arrives before its reserve leaves a record that makes the reserve refuse,
+    so a compensating release can be sent for a reserve whose outcome is
+    unknown. Raises ReservationPending while the reserve is still running.
+    """
+    record = reservations.find_one_and_update({'_id': reservation_id, 'event_id': event_id, 'status': 'reserved'},
+                                              {'$set': {'status': 'released'}})
+    if record:
+        event = collection.find_one_and_update({'_id': ObjectId(event_id)}, sell(-record['tickets']),
+                                               projection={'tickets_available': 1},
+                                               return_document=ReturnDocument.AFTER)
+        return record['tickets'], event
+
+    existing = start_reservation(reservations, reservation_id, event_id, 0)
+    if existing is None:
+        finish_reservation(reservations, reservation_id, False)
+    elif existing['status'] == 'pending':
+        raise ReservationPending(f"Reservation {reservation_id} is still being made")
+    return 0, collection.find_one({'_id': ObjectId(event_id)}, {'tickets_available': 1})
@@ -0,0 +1,108 @@
+import re
+import threading
+import time
+from collections import OrderedDict
+from markupsafe import Markup
+
+
+class PageCache:
+    """Cache of rendered HTML fragments, invalidated as a whole by event writes
+
+    A write to what the pages show bumps a generation number, and entries
+    rendered under an older generation are rendered again at once. Entries
+    older than `ttl` are stale: for `stale_ttl` seconds past that they are
+    still served while one background render refreshes them
+    (stale-while-revalidate), after that they are rendered again inline.
+    """
+
+    def __init__(self, maxsize=256, ttl=60.0, stale_ttl=30.0):
+        self.maxsize = maxsize
+        self.ttl = ttl
+        self.stale_ttl = stale_ttl
+        self.generation = 0
+        self._data = OrderedDict()
+        self._refreshing = set()
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.stale_hits = 0
+        self.misses = 0
+
+    def bump(self):
+        with self._lock:
+            self.generation += 1
+
+    def get_or_render(self, key, render, refresh=None):
+        """Cached HTML for `key`, calling render() on a miss
+
+        `refresh` re-renders the entry on a background thread, so it can't rely
+        on the caller's request context; it is only used for
+        stale-while-revalidate.
+        """
+        now = time.monotonic()
+        with self._lock:
+            entry = self._data.get(key)
+            if entry is not None:
+                html, generation, rendered_at = entry
+                age = now - rendered_at
+                current = generation == self.generation
+                if current and age <= self.ttl:
+                    self._data.move_to_end(key)
+                    self.hits += 1
+                    return html
+                if current and refresh is not None and age <= self.ttl + self.stale_ttl:
+                    self.stale_hits += 1
+                    if key not in self._refreshing:
+                        self._refreshing.add(key)
+                        threading.Thread(target=self._refresh, args=(key, refresh), daemon=True).start()
+                    return html
+            self.misses += 1
+            generation = self.generation
+
+        html = render()
+        self._store(key, html, generation)
+        return html
+
+    def _refresh(self, key, refresh):
+        try:
+            with self._lock:
+                generation = self.generation
+            self._store(key, refresh(), generation)
+        finally:
+            with self._lock:
+                self._refreshing.discard(key)
+
+    def _store(self, key, html, generation):
+        with self._lock:
+            self._data[key] = (html, generation, time.monotonic())
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+
+    def stats(self):
+        with self._lock:
+            return {
+                'size': len(self._data),
+                'generation': self.generation,
+                'hits': self.hits,
+                'stale_hits': self.stale_hits,
+                'misses': self.misses,
+            }
+
+
+def slot(name, key):
+    """Placeholder rendered into a cached fragment for a value that changes too often to cache"""
+    return Markup(f'<!--slot:{name}:{key}-->')
+
+
+def fill_slots(html, name, lookup):
+    """Replace the `name` slots in cached HTML with fresh values
+
+    lookup(keys) returns {key: value} for all of them at once; keys it leaves
+    out are filled with an empty string.
+    """
+    pattern = re.compile(rf'<!--slot:{re.escape(name)}:([^>]*?)-->')
+    keys = set(pattern.findall(html))
+    if not keys:
+        return html
+    values = lookup(keys)
+    return Markup(pattern.sub(lambda match: Markup.escape(values.get(match.group(1), '')), html))
@@ -0,0 +1,128 @@
+import base64
+import json
+import os
+import threading
+import time
+from datetime import datetime
+from bson import json_util
+from bson.objectid import ObjectId
+from cache import TTLCache
+
+DEFAULT_PER_PAGE = int(os.getenv('EVENTS_PER_PAGE', 6))
+MAX_PER_PAGE = int(os.getenv('EVENTS_MAX_PER_PAGE', 100))
+COUNT_CACHE_TTL = float(os.getenv('EVENTS_COUNT_CACHE_TTL', 60))
+COUNT_CACHE_SIZE = int(os.getenv('EVENTS_COUNT_CACHE_SIZE', 1000))
+
+# Types a sort key value can have; anything else (e.g. a dict, which Mongo
+# would read as an operator) can't have come from encode_cursor
+CURSOR_VALUE_TYPES = (type(None), bool, int, float, str, ObjectId, datetime)
+
+
+def parse_per_page(value):
+    try:
+        per_page = int(value)
+    except (TypeError, ValueError):
+        return DEFAULT_PER_PAGE
+    return max(1, min(per_page, MAX_PER_PAGE))
+
+
+def encode_cursor(document, sort):
+    """Opaque token holding the sort key values of the last document on a page"""
+    values = [document.get(field) for field, _ in sort]
+    raw = json_util.dumps(values).encode()
+    return base64.urlsafe_b64encode(raw).decode().rstrip('=')
+
+
+def decode_cursor(token, sort):
+    """Sort key values from a cursor token; raises ValueError if it is malformed"""
+    padded = token + '=' * (-len(token) % 4)
+    values = json_util.loads(base64.urlsafe_b64decode(padded.encode()))
+    if not isinstance(values, list) or len(values) != len(sort):
+        raise ValueError('cursor does not match the sort order')
+    if not all(isinstance(value, CURSOR_VALUE_TYPES) for value in values):
+        raise ValueError('cursor holds an invalid value')
+    return values
+
+
+def with_tiebreaker(sort):
+    """`sort` plus _id as a unique tie-breaker
+
+    _id takes the direction of the last sort key, so a descending sort is the
+    reverse of an ascending (key, _id) index and needs no in-memory sort.
+    """
+    return list(sort) + [('_id', sort[-1][1] if sort else 1)]
+
+
+def _after(field, direction, value):
+    """Clause matching `field` strictly after `value`, or None if nothing can be
+
+    Mongo sorts null (and missing) before every other value, and comparison
+    operators never match null, so nulls need their own terms.
+    """
+    if value is None:
+        return {field: {'$ne': None}} if direction == 1 else None
+    clause = {field: {'$gt' if direction == 1 else '$lt': value}}
+    if direction == -1 and field != '_id':
+        return {'$or': [clause, {field: None}]}
+    return clause
+
+
+def keyset_filter(sort, values):
+    """Filter selecting documents strictly after `values` in `sort` order
+
+    For [(a, 1), (_id, 1)] this is  a > va OR (a == va AND _id > vid).
+    """
+    clauses = []
+    for i, (field, direction) in enumerate(sort):
+        after = _after(field, direction, values[i])
+        if after is None:
+            continue
+        clause = {prev: values[j] for j, (prev, _) in enumerate(sort[:i])}
+        clause.update(after)
+        clauses.append(clause)
+    return clauses[0] if len(clauses) == 1 else {'$or': clauses}
+
+
+class EventCounter:
+    """Cached event totals so listing pages don't count the collection per request
+
+    The unfiltered total starts from estimated_document_count() and is adjusted
+    in place on create/delete. Filtered totals are cached per query (at most
+    `maxsize` of them, LRU) for a short TTL and dropped on any write.
+    Everything is re-synced after the TTL.
+    """
+
+    def __init__(self, collection, ttl=COUNT_CACHE_TTL, maxsize=COUNT_CACHE_SIZE):
+        self.collection = collection
+        self.ttl = ttl
+        self._lock = threading.Lock()
+        self._total = None
+        self._total_at = 0.0
+        self._filtered = TTLCache(maxsize=maxsize, ttl=ttl)
+
+    def count(self, query):
+        now = time.monotonic()
+        if not query:
+            with self._lock:
+                if self._total is None or now - self._total_at > self.ttl:
+                    self._total = self.collection.estimated_document_count()
+                    self._total_at = now
+                return self._total
+
+        key = json.dumps(json.loads(json_util.dumps(query)), sort_keys=True)
+        total = self._filtered.get(key)
+        if total is None:
+            total = self.collection.count_documents(query)
+            self._filtered.set(key, total)
+        return total
+
+    def adjust(self, delta):
+        """Apply a create (+n) or delete (-n) to the cached totals"""
+        with self._lock:
+            if self._total is not None:
+                self._total = max(0, self._total + delta)
+        self._filtered.clear()
+
+    def invalidate(self):
+        """Drop filtered totals after an edit that may change search matches"""
+        self._filtered.clear()
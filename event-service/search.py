@@ -0,0 +1,70 @@
+import re
+from pymongo import ASCENDING, TEXT, UpdateOne
+
+# Fields that are searchable, with their text index weights
+SEARCH_FIELDS = {'name': 10, 'location': 5, 'description': 1}
+SEARCH_MODES = ('text', 'prefix', 'regex')
+TOKEN_RE = re.compile(r'\w+', re.UNICODE)
+# Internal bookkeeping fields, never returned to clients
+HIDDEN_FIELDS = {'search_terms': 0, 'pending_checkouts': 0}
+
+
+def tokenize(text):
+    return TOKEN_RE.findall((text or '').lower())
+
+
+def search_terms(event):
+    """Distinct lowercase tokens of an event's searchable fields"""
+    terms = set()
+    for field in SEARCH_FIELDS:
+        terms.update(tokenize(event.get(field)))
+    return sorted(terms)
+
+
+def ensure_search_indexes(collection, batch_size=1000):
+    """Create the search indexes and backfill search_terms on older documents"""
+    collection.create_index(
+        [(field, TEXT) for field in SEARCH_FIELDS],
+        weights=SEARCH_FIELDS,
+        name='events_text'
+    )
+    collection.create_index([('search_terms', ASCENDING)], name='events_search_terms')
+
+    fields = {field: 1 for field in SEARCH_FIELDS}
+    ops = []
+    for event in collection.find({'search_terms': {'$exists': False}}, fields):
+        ops.append(UpdateOne({'_id': event['_id']}, {'$set': {'search_terms': search_terms(event)}}))
+        if len(ops) >= batch_size:
+            collection.bulk_write(ops, ordered=False)
+            ops = []
+    if ops:
+        collection.bulk_write(ops, ordered=False)
+
+
+def build_search(search_query, mode='text'):
+    """Translate a search box query into (filter, projection, sort) for find()
+
+    text   - ranked whole-word search on the text index (default)
+    prefix - type-ahead: every token must match, the last one as a prefix
+    regex  - the old unanchored regex scan, kept for comparison
+    """
+    if not search_query:
+        return {}, HIDDEN_FIELDS, None
+
+    if mode == 'prefix':
+        tokens = tokenize(search_query)
+        if not tokens:
+            return {}, HIDDEN_FIELDS, None
+        *complete, partial = tokens
+        clauses = [{'search_terms': term} for term in complete]
+        clauses.append({'search_terms': {'$regex': '^' + re.escape(partial)}})
+        query = clauses[0] if len(clauses) == 1 else {'$and': clauses}
+        return query, HIDDEN_FIELDS, [('name', ASCENDING)]
+
+    if mode == 'regex':
+        return {'$or': [
+            {field: {'$regex': search_query, '$options': 'i'}} for field in SEARCH_FIELDS
+        ]}, HIDDEN_FIELDS, None
+
+    score = {**HIDDEN_FIELDS, 'score': {'$meta': 'textScore'}}
+    return {'$text': {'$search': search_query}}, score, [('score', {'$meta': 'textScore'})]
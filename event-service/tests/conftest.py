@@ -0,0 +1,88 @@
+"""Event Service test setup
+
+Tests run against a real MongoDB when TEST_MONGO_URI is set (the app's
+event_db database on that server is wiped between tests). Otherwise they use
+mongomock. mongomock doesn't apply concurrent writes atomically, so its
+collection methods are serialized with one lock. That stands in for MongoDB's
+single-document atomicity in the concurrency tests. Tests that depend on
+real server behaviour (query plans) are marked `real_mongo` and skipped.
+"""
+import os
+import sys
+import threading
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+TEST_MONGO_URI = os.getenv('TEST_MONGO_URI')
+os.environ.setdefault('SECRET_KEY', 'test')
+
+if TEST_MONGO_URI:
+    os.environ['MONGO_URI'] = TEST_MONGO_URI
+else:
+    import mongomock
+    import pymongo
+
+    _mongo_lock = threading.RLock()
+
+    def _serialized(method):
+        def wrapper(*args, **kwargs):
+            with _mongo_lock:
+                result = method(*args, **kwargs)
+                # Cursors read lazily; materialize them while holding the lock
+                if isinstance(result, mongomock.collection.Cursor):
+                    result = iter(list(result))
+                return result
+        return wrapper
+
+    for _name in ('find_one', 'find_one_and_update', 'find_one_and_delete', 'insert_one', 'insert_many',
+                  'update_one', 'update_many', 'delete_one', 'delete_many', 'bulk_write',
+                  'count_documents', 'aggregate'):
+        setattr(mongomock.collection.Collection, _name, _serialized(getattr(mongomock.collection.Collection, _name)))
+    # pymongo 4.11+ passes sort= to bulk updates and replaces, which mongomock's builder doesn't take
+    def _ignoring_sort(method):
+        def wrapper(*args, sort=None, **kwargs):
+            if sort is not None:
+                raise NotImplementedError('mongomock bulk writes do not support sort')
+            return method(*args, **kwargs)
+        return wrapper
+
+    for _name in ('add_update', 'add_replace'):
+        setattr(mongomock.collection.BulkOperationBuilder, _name,
+                _ignoring_sort(getattr(mongomock.collection.BulkOperationBuilder, _name)))
+    pymongo.MongoClient = mongomock.MongoClient
+    os.environ['MONGO_URI'] = 'mongodb://localhost:27017'
+
+real_mongo = pytest.mark.skipif(not TEST_MONGO_URI, reason='needs a MongoDB server (set TEST_MONGO_URI)')
+
+
+@pytest.fixture
+def app_module():
+    import app
+    app.events_collection.delete_many({})
+    app.holds_collection.delete_many({})
+    app.db['holds_counters'].delete_many({})
+    app.reservations_collection.delete_many({})
+    app.event_cache.clear()
+    app.page_cache.bump()
+    # Totals cached by an earlier test would be off by its events
+    app.event_counter = app.EventCounter(app.events_collection)
+    app.app.config['TESTING'] = True
+    return app
+
+
+@pytest.fixture
+def client(app_module):
+    return app_module.app.test_client()
+
+
+@pytest.fixture
+def make_event(app_module):
+    """Insert an event built the way /events/create builds it; returns its id"""
+    def make(**fields):
+        data = {'name': 'Concert', 'location': 'Lahore', 'date': '2030-01-01',
+                'price': 100, 'tickets_available': 10, **fields}
+        event = app_module.build_event(data)
+        return str(app_module.events_collection.insert_one(event).inserted_id)
+    return make
@@ -0,0 +1,135 @@
+import pytest
+import requests
+from bson.objectid import ObjectId
+
+
+class FakeBookingService:
+    """Stands in for booking_http: records batch posts and answers with `status`"""
+
+    def __init__(self, status=201, error=None):
+        self.status = status
+        self.error = error
+        self.posted = []
+
+    def post(self, url, json=None, timeout=None):
+        self.posted.append((url, json))
+        if self.error:
+            raise self.error
+        results = [{"index": i, "status": "created", "booking": {"id": i + 1, **item}}
+                   for i, item in enumerate(json["bookings"])]
+        return FakeResponse(self.status, {"created": len(results), "results": results})
+
+
+class FakeResponse:
+    def __init__(self, status_code, body):
+        self.status_code = status_code
+        self.body = body
+        self.text = "booking service error" if status_code >= 400 else ""
+
+    def json(self):
+        return self.body
+
+
+@pytest.fixture
+def booking_service(app_module, monkeypatch):
+    fake = FakeBookingService()
+    monkeypatch.setattr(app_module, 'booking_http', fake)
+    return fake
+
+
+def fill_cart(client, *event_ids):
+    with client.session_transaction() as browser:
+        browser['cart'] = list(event_ids)
+
+
+def checkout(client, **quantities):
+    return client.post('/cart/checkout', json={'user_id': 7, 'user_email': 'buyer@example.com',
+                                               'quantities': quantities})
+
+
+def stock(app_module, event_id):
+    event = app_module.events_collection.find_one({'_id': ObjectId(event_id)})
+    return event['tickets_available'], event.get('tickets_sold', 0)
+
+
+def test_checkout_reserves_and_books_the_whole_cart(app_module, client, make_event, booking_service):
+    gig = make_event(name='Gig', price=20, tickets_available=5)
+    play = make_event(name='Play', price=50, tickets_available=5)
+    fill_cart(client, gig, play)
+
+    response = checkout(client, **{gig: 3})
+
+    assert response.status_code == 201
+    body = response.get_json()
+    assert (body['created'], body['total_tickets'], body['total_amount']) == (2, 4, 110)
+    [(url, payload)] = booking_service.posted
+    assert url.endswith('/bookings/batch')
+    assert [(b['event_id'], b['tickets'], b['amount']) for b in payload['bookings']] == [(gig, 3, 60), (play, 1, 50)]
+    assert stock(app_module, gig) == (2, 3) and stock(app_module, play) == (4, 1)
+    with client.session_transaction() as browser:
+        assert browser['cart'] == []
+
+
+def test_a_sold_out_item_rolls_back_the_others(app_module, client, make_event, booking_service):
+    gig = make_event(name='Gig', tickets_available=5)
+    play = make_event(name='Play', tickets_available=1)
+    fill_cart(client, gig, play)
+
+    response = checkout(client, **{gig: 2, play: 2})
+
+    assert response.status_code == 409
+    assert response.get_json()['event_ids'] == [play]
+    assert stock(app_module, gig) == (5, 0) and stock(app_module, play) == (1, 0)
+    assert app_module.events_collection.count_documents({'pending_checkouts.0': {'$exists': True}}) == 0
+    assert booking_service.posted == []
+
+
+@pytest.mark.parametrize('failure', [{'status': 500}, {'error': requests.ConnectionError('refused')}])
+def test_a_booking_service_failure_gives_the_tickets_back(app_module, client, make_event, monkeypatch, failure):
+    booking_service = FakeBookingService(**failure)
+    monkeypatch.setattr(app_module, 'booking_http', booking_service)
+    gig = make_event(name='Gig', tickets_available=5)
+    play = make_event(name='Play', tickets_available=5)
+    fill_cart(client, gig, play)
+
+    response = checkout(client, **{gig: 2})
+
+    assert response.status_code == 502
+    assert len(booking_service.posted) == 1
+    assert stock(app_module, gig) == (5, 0) and stock(app_module, play) == (5, 0)
+    with client.session_transaction() as browser:
+        assert browser['cart'] == [gig, play]
+
+
+def test_held_items_are_sold_from_their_hold(app_module, client, make_event, booking_service, monkeypatch):
+    monkeypatch.setattr(app_module, 'CART_HOLDS_ENABLED', True)
+    gig = make_event(name='Gig', tickets_available=5)
+    client.post(f'/add-to-cart/{gig}')
+
+    response = checkout(client)
+
+    assert response.status_code == 201
+    event = app_module.events_collection.find_one({'_id': ObjectId(gig)})
+    assert (event['tickets_available'], event['tickets_held'], event['tickets_sold']) == (4, 0, 1)
+    assert app_module.holds_collection.find_one()['status'] == 'converted'
+
+
+def test_invalid_cart_entries_are_rejected_and_dropped(app_module, client, make_event, booking_service):
+    gig = make_event(name='Gig', tickets_available=5)
+    fill_cart(client, gig, 'not-an-id')
+
+    response = checkout(client)
+
+    assert response.status_code == 400
+    assert response.get_json()['event_ids'] == ['not-an-id']
+    assert booking_service.posted == []
+    with client.session_transaction() as browser:
+        assert browser['cart'] == [gig]
+    assert checkout(client).status_code == 201
+
+
+def test_invalid_event_ids_are_not_added_to_the_cart(client):
+    client.post('/add-to-cart/not-an-id')
+
+    with client.session_transaction() as browser:
+        assert 'not-an-id' not in browser.get('cart', [])
@@ -0,0 +1,84 @@
+import threading
+import time
+import pytest
+from bson.objectid import ObjectId
+from benchmarks.reserve_coalescing import run_level
+from coalescing import ReserveCoalescer
+
+
+def reserve_in_order(coalescer, event_id, requests, gap=0.01):
+    """Start one reserve() per request `gap` seconds apart; returns their results"""
+    results = [None] * len(requests)
+
+    def reserve(index, tickets):
+        results[index] = coalescer.reserve(event_id, tickets)
+
+    threads = []
+    for index, tickets in enumerate(requests):
+        threads.append(threading.Thread(target=reserve, args=(index, tickets)))
+        threads[-1].start()
+        time.sleep(gap)
+    for thread in threads:
+        thread.join()
+    return results
+
+
+def test_requests_within_the_window_share_one_update(app_module, make_event):
+    event_id = make_event(tickets_available=10)
+    coalescer = ReserveCoalescer(app_module.events_collection, window=0.2)
+
+    assert reserve_in_order(coalescer, event_id, [1, 2, 3]) == [4, 4, 4]
+    assert coalescer.stats()['batches'] == 1
+    assert coalescer.stats()['requests'] == 3
+
+
+def test_batch_that_does_not_fit_is_served_first_come_first_served(app_module, make_event):
+    event_id = make_event(tickets_available=5)
+    coalescer = ReserveCoalescer(app_module.events_collection, window=0.2)
+
+    assert reserve_in_order(coalescer, event_id, [3, 3, 2]) == [0, None, 0]
+    event = app_module.events_collection.find_one({'_id': ObjectId(event_id)})
+    assert (event['tickets_available'], event['tickets_sold']) == (0, 5)
+
+
+def test_held_tickets_are_not_handed_out(app_module, client, make_event):
+    event_id = make_event(tickets_available=4)
+    client.post(f'/api/events/{event_id}/holds', json={'tickets': 3, 'session_id': 'alice'})
+    coalescer = ReserveCoalescer(app_module.events_collection, window=0.2)
+
+    assert reserve_in_order(coalescer, event_id, [1, 1]) == [3, None]
+
+
+class BrokenCollection:
+    def find_one_and_update(self, *args, **kwargs):
+        raise RuntimeError('primary stepped down')
+
+
+def test_a_failed_update_reaches_every_caller_in_the_batch():
+    coalescer = ReserveCoalescer(BrokenCollection(), window=0.1)
+    event_id = str(ObjectId())
+    errors = []
+
+    def reserve():
+        try:
+            coalescer.reserve(event_id, 1)
+        except RuntimeError as e:
+            errors.append(str(e))
+
+    threads = [threading.Thread(target=reserve) for _ in range(3)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert errors == ['primary stepped down'] * 3
+    assert coalescer.stats()['batches'] == 1
+
+
+@pytest.mark.parametrize('buyers', [1, 10])
+def test_coalesced_reserves_keep_inventory_exact(app_module, buyers):
+    results = run_level(app_module, buyers, attempts=5, window=0.005)
+
+    for mode, result in results.items():
+        assert result['errors'] == [], mode
+        assert result['reserved'] == buyers * 5
+    assert results['coalesced']['updates'] <= results['per_request']['updates']
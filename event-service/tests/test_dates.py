@@ -0,0 +1,34 @@
+from datetime import datetime
+from bson.objectid import ObjectId
+from conftest import real_mongo
+from filters import migrate_dates
+
+
+def test_create_with_a_bad_date_is_a_client_error(app_module, client):
+    response = client.post('/events/create', json={'name': 'Gig', 'date': '01/02/2030'})
+
+    assert response.status_code == 400
+    assert app_module.events_collection.count_documents({}) == 0
+
+
+def test_edit_with_a_bad_date_leaves_the_event_alone(app_module, client, make_event):
+    event_id = make_event()
+    response = client.put(f'/api/events/{event_id}/edit', json={'name': 'Gig', 'date': 'next friday'})
+
+    assert response.status_code == 400
+    event = app_module.events_collection.find_one({'_id': ObjectId(event_id)})
+    assert (event['name'], event['date']) == ('Concert', datetime(2030, 1, 1))
+
+
+# mongomock's bulk_write doesn't accept the UpdateOne of current pymongo
+@real_mongo
+def test_migration_keeps_dates_it_cannot_parse(app_module):
+    events = app_module.events_collection
+    good, empty, bad = events.insert_many([
+        {'name': 'a', 'date': '2030-05-01'}, {'name': 'b', 'date': ''}, {'name': 'c', 'date': '1st of May'},
+    ]).inserted_ids
+
+    assert migrate_dates(events) == [bad]
+    assert events.find_one({'_id': good})['date'] == datetime(2030, 5, 1)
+    assert events.find_one({'_id': empty})['date'] is None
+    assert events.find_one({'_id': bad})['date'] == '1st of May'
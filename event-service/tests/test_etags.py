@@ -0,0 +1,88 @@
+def etag_of(response):
+    etag, weak = response.get_etag()
+    assert weak
+    return etag
+
+
+def test_event_etag_is_weak_and_built_from_the_version(client, make_event):
+    event_id = make_event()
+
+    response = client.get(f'/api/events/{event_id}')
+
+    assert response.headers['ETag'] == f'W/"{event_id}-1"'
+
+
+def test_matching_if_none_match_gets_304(client, make_event):
+    event_id = make_event()
+    etag = etag_of(client.get(f'/api/events/{event_id}'))
+
+    cached = client.get(f'/api/events/{event_id}', headers={'If-None-Match': f'W/"{etag}"'})
+    strong = client.get(f'/api/events/{event_id}', headers={'If-None-Match': f'"other", "{etag}"'})
+    stale = client.get(f'/api/events/{event_id}', headers={'If-None-Match': 'W/"other"'})
+
+    assert cached.status_code == 304 and cached.data == b''
+    assert etag_of(cached) == etag
+    # Weak comparison: a strong tag in a list matches too
+    assert strong.status_code == 304
+    assert stale.status_code == 200
+
+
+def test_event_etag_changes_after_a_write(client, make_event):
+    event_id = make_event()
+    before = etag_of(client.get(f'/api/events/{event_id}'))
+
+    client.post(f'/api/events/{event_id}/reserve', json={'tickets': 1})
+    after_reserve = client.get(f'/api/events/{event_id}', headers={'If-None-Match': f'W/"{before}"'})
+    client.put(f'/api/events/{event_id}/edit', json={'name': 'Renamed', 'price': 5, 'tickets_available': 3})
+    after_edit = client.get(f'/api/events/{event_id}', headers={'If-None-Match': f'W/"{etag_of(after_reserve)}"'})
+
+    assert after_reserve.status_code == after_edit.status_code == 200
+    assert len({before, etag_of(after_reserve), etag_of(after_edit)}) == 3
+    assert after_edit.get_json()['name'] == 'Renamed'
+
+
+def test_projected_event_has_its_own_etag(client, make_event):
+    event_id = make_event()
+    full = etag_of(client.get(f'/api/events/{event_id}'))
+
+    projected = client.get(f'/api/events/{event_id}?fields=name', headers={'If-None-Match': f'W/"{full}"'})
+
+    assert projected.status_code == 200
+    assert etag_of(projected) != full
+
+
+def test_listing_gets_304_until_an_event_on_the_page_changes(client, make_event):
+    first = make_event(name='First')
+    make_event(name='Second')
+    etag = etag_of(client.get('/api/events'))
+
+    unchanged = client.get('/api/events', headers={'If-None-Match': f'W/"{etag}"'})
+    client.post(f'/api/events/{first}/reserve', json={'tickets': 1})
+    changed = client.get('/api/events', headers={'If-None-Match': f'W/"{etag}"'})
+
+    assert unchanged.status_code == 304
+    assert changed.status_code == 200
+    assert etag_of(changed) != etag
+
+
+def test_listing_etag_depends_on_the_page_and_its_shape(client, make_event):
+    for i in range(3):
+        make_event(name=f'Event {i}')
+
+    etags = {etag_of(client.get(path)) for path in (
+        '/api/events', '/api/events?per_page=2', '/api/events?fields=name', '/api/events?envelope=0')}
+
+    assert len(etags) == 4
+
+
+def test_created_and_deleted_events_change_the_listing_etag(client, make_event):
+    make_event(name='First')
+    etag = etag_of(client.get('/api/events'))
+
+    created = client.post('/events/create', json={'name': 'Second', 'date': '2030-02-01', 'tickets_available': 5})
+    after_create = client.get('/api/events', headers={'If-None-Match': f'W/"{etag}"'})
+    client.post(f"/events/{created.get_json()['event_id']}/delete")
+    after_delete = client.get('/api/events', headers={'If-None-Match': f'W/"{etag_of(after_create)}"'})
+
+    assert after_create.status_code == after_delete.status_code == 200
+    assert etag_of(after_delete) == etag
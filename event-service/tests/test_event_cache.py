@@ -0,0 +1,56 @@
+import threading
+from bson.objectid import ObjectId
+from cache import TTLCache
+
+
+def test_set_after_invalidate_is_dropped():
+    cache = TTLCache(maxsize=10, ttl=60)
+    generation = cache.generation()
+    cache.invalidate('a')
+    cache.set('a', 'stale', generation)
+    assert cache.get('a') is None
+    cache.set('a', 'fresh', cache.generation())
+    assert cache.get('a') == 'fresh'
+
+
+def test_other_keys_are_unaffected():
+    cache = TTLCache(maxsize=10, ttl=60)
+    generation = cache.generation()
+    cache.invalidate('b')
+    cache.set('a', 'value', generation)
+    assert cache.get('a') == 'value'
+
+
+def test_forgotten_invalidations_still_block_older_sets():
+    cache = TTLCache(maxsize=2, ttl=60)
+    generation = cache.generation()
+    for key in ('a', 'b', 'c'):
+        cache.invalidate(key)
+    cache.set('a', 'stale', generation)
+    assert cache.get('a') is None
+
+
+def test_reader_racing_a_write_does_not_cache_the_old_version(app_module, client, make_event, monkeypatch):
+    event_id = make_event(name='Before')
+    collection = app_module.events_collection
+    read_done, write_done = threading.Event(), threading.Event()
+    original_find_one = type(collection).find_one
+
+    def slow_find_one(self, *args, **kwargs):
+        # The reader loads the old document, then the edit lands before it caches it
+        document = original_find_one(self, *args, **kwargs)
+        if threading.current_thread().name == 'reader':
+            read_done.set()
+            write_done.wait(5)
+        return document
+
+    monkeypatch.setattr(type(collection), 'find_one', slow_find_one)
+    reader = threading.Thread(target=app_module.get_event, args=(event_id,), name='reader')
+    reader.start()
+    read_done.wait(5)
+    collection.update_one({'_id': ObjectId(event_id)}, {'$set': {'name': 'After'}, '$inc': {'version': 1}})
+    app_module.invalidate_event(event_id)
+    write_done.set()
+    reader.join()
+
+    assert client.get(f'/api/events/{event_id}').get_json()['name'] == 'After'
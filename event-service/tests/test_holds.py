@@ -0,0 +1,152 @@
+import threading
+from datetime import datetime
+from bson.objectid import ObjectId
+from werkzeug.middleware.proxy_fix import ProxyFix
+from benchmarks.flash_sale import run
+from holds import sweep_expired
+
+
+def hold(client, event_id, session_id='alice', tickets=1):
+    return client.post(f'/api/events/{event_id}/holds', json={'tickets': tickets, 'session_id': session_id})
+
+
+def stock(app_module, event_id):
+    event = app_module.events_collection.find_one({'_id': ObjectId(event_id)})
+    return event['tickets_available'], event.get('tickets_held', 0), event.get('tickets_sold', 0)
+
+
+def test_adding_to_cart_needs_a_post(client, make_event):
+    event_id = make_event()
+    assert client.get(f'/add-to-cart/{event_id}').status_code == 405
+
+
+def test_cart_holds_are_capped_per_session(app_module, client, make_event, monkeypatch):
+    monkeypatch.setattr(app_module, 'CART_HOLDS_ENABLED', True)
+    monkeypatch.setattr(app_module, 'HOLDS_MAX_PER_SESSION', 2)
+    events = [make_event(name=f'Event {i}') for i in range(3)]
+
+    for event_id in events:
+        client.post(f'/add-to-cart/{event_id}')
+
+    assert [stock(app_module, event_id)[1] for event_id in events] == [1, 1, 0]
+    with client.session_transaction() as browser:
+        assert browser['cart'] == events[:2]
+
+
+def test_api_holds_are_capped_per_client_address(app_module, client, make_event, monkeypatch):
+    monkeypatch.setattr(app_module, 'HOLDS_MAX_PER_CLIENT', 2)
+    event_id = make_event()
+
+    statuses = [hold(client, event_id, session_id=f'session-{i}').status_code for i in range(3)]
+
+    assert statuses == [201, 201, 429]
+    assert stock(app_module, event_id) == (10, 2, 0)
+
+
+def test_releasing_a_hold_requires_its_owner(app_module, client, make_event):
+    event_id = make_event()
+    hold_id = hold(client, event_id, session_id='alice').get_json()['hold_id']
+
+    assert client.delete(f'/api/holds/{hold_id}').status_code == 400
+    assert client.delete(f'/api/holds/{hold_id}', json={'session_id': 'mallory'}).status_code == 404
+    assert stock(app_module, event_id) == (10, 1, 0)
+    assert client.delete(f'/api/holds/{hold_id}', json={'session_id': 'alice'}).status_code == 200
+    assert stock(app_module, event_id) == (10, 0, 0)
+
+
+def test_confirming_a_hold_requires_its_owner(app_module, client, make_event):
+    event_id = make_event()
+    hold_id = hold(client, event_id, session_id='alice', tickets=3).get_json()['hold_id']
+
+    assert client.post(f'/api/holds/{hold_id}/confirm').status_code == 400
+    assert client.post(f'/api/holds/{hold_id}/confirm', json={'session_id': 'mallory'}).status_code == 410
+    response = client.post(f'/api/holds/{hold_id}/confirm', json={'session_id': 'alice'})
+    assert response.status_code == 200
+    assert stock(app_module, event_id) == (7, 0, 3)
+
+
+def test_available_filter_leaves_out_fully_held_events(client, make_event):
+    held_out = make_event(name='Held out', tickets_available=2)
+    open_event = make_event(name='Still open', tickets_available=2)
+    hold(client, held_out, tickets=2)
+    hold(client, open_event, tickets=1)
+
+    events = client.get('/api/events?available=1').get_json()['events']
+
+    assert [event['_id'] for event in events] == [open_event]
+
+
+def test_grid_shows_tickets_that_are_not_on_hold(client, make_event):
+    event_id = make_event(name='Hot gig', tickets_available=10)
+    hold(client, event_id, tickets=4)
+
+    assert b'6 tickets left' in client.get('/').data
+
+
+def test_flash_sale_never_oversells(app_module):
+    result, errors = run(app_module, buyers=12, rounds=9, stock=30)
+
+    assert errors == []
+    assert 'hold_429' not in result['counts']
+    # Demand (12 buyers x 6 purchases) outstrips the stock, so it sells out
+    assert result['counts'].get('confirm_200', 0) + result['counts'].get('reserve_200', 0) == 30
+
+
+def test_flash_sale_from_shared_addresses_keeps_to_the_cap(app_module, monkeypatch):
+    monkeypatch.setattr(app_module, 'HOLDS_MAX_PER_CLIENT', 2)
+    result, errors = run(app_module, buyers=12, rounds=9, stock=30, addresses=3)
+
+    assert errors == []
+    holds = sum(count for name, count in result['counts'].items() if name.startswith('hold_'))
+    assert holds == 12 * 6
+
+
+def test_concurrent_holds_cannot_overshoot_the_cap(app_module, make_event, monkeypatch):
+    monkeypatch.setattr(app_module, 'HOLDS_MAX_PER_CLIENT', 3)
+    event_id = make_event(tickets_available=50)
+    barrier = threading.Barrier(10)
+    statuses = []
+
+    def place(number):
+        client = app_module.app.test_client()
+        barrier.wait()
+        statuses.append(hold(client, event_id, session_id=f'session-{number}').status_code)
+
+    threads = [threading.Thread(target=place, args=(number,)) for number in range(10)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert sorted(statuses) == [201] * 3 + [429] * 7
+    assert stock(app_module, event_id) == (50, 3, 0)
+
+
+def test_released_confirmed_and_expired_holds_free_the_cap(app_module, client, make_event, monkeypatch):
+    monkeypatch.setattr(app_module, 'HOLDS_MAX_PER_CLIENT', 1)
+    event_id = make_event()
+
+    released = hold(client, event_id).get_json()['hold_id']
+    assert hold(client, event_id).status_code == 429
+    client.delete(f'/api/holds/{released}', json={'session_id': 'alice'})
+    confirmed = hold(client, event_id).get_json()['hold_id']
+    client.post(f'/api/holds/{confirmed}/confirm', json={'session_id': 'alice'})
+    expired = hold(client, event_id).get_json()['hold_id']
+    app_module.holds_collection.update_one({'_id': ObjectId(expired)}, {'$set': {'expires_at': datetime.utcnow()}})
+    assert sweep_expired(app_module.events_collection, app_module.holds_collection) == 1
+
+    assert hold(client, event_id).status_code == 201
+    assert stock(app_module, event_id) == (9, 1, 1)
+
+
+def test_proxied_clients_are_capped_by_their_forwarded_address(app_module, client, make_event, monkeypatch):
+    monkeypatch.setattr(app_module, 'HOLDS_MAX_PER_CLIENT', 1)
+    monkeypatch.setattr(app_module.app, 'wsgi_app', ProxyFix(app_module.app.wsgi_app, x_for=1))
+    event_id = make_event()
+
+    def hold_from(address, session_id):
+        return client.post(f'/api/events/{event_id}/holds', json={'tickets': 1, 'session_id': session_id},
+                           headers={'X-Forwarded-For': address}).status_code
+
+    assert [hold_from('203.0.113.1', 'a'), hold_from('203.0.113.2', 'b'), hold_from('203.0.113.1', 'c')] == \
+        [201, 201, 429]
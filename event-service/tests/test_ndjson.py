@@ -0,0 +1,93 @@
+import json
+
+
+def ndjson(*lines):
+    return '\n'.join(line if isinstance(line, str) else json.dumps(line) for line in lines).encode() + b'\n'
+
+
+def import_events(client, body):
+    return client.post('/api/events/import', data=body, content_type='application/x-ndjson')
+
+
+def export_events(client, query=''):
+    response = client.get(f'/api/events/export{query}')
+    assert response.status_code == 200
+    assert response.mimetype == 'application/x-ndjson'
+    return [json.loads(line) for line in response.data.decode().splitlines()]
+
+
+def event(name, **fields):
+    return {'name': name, 'location': 'Lahore', 'date': '2030-01-01', 'price': 10, 'tickets_available': 5, **fields}
+
+
+def test_clean_import_inserts_every_line(app_module, client):
+    response = import_events(client, ndjson(event('A'), '', event('B', price='12.5'), event('C')))
+
+    assert response.status_code == 200
+    assert response.get_json() == {'inserted': 3, 'failed': 0, 'errors': []}
+    assert client.get('/api/events').get_json()['total'] == 3
+    b = app_module.events_collection.find_one({'name': 'B'})
+    assert (b['price'], b['version'], b['date_display']) == (12.5, 1, 'January 01, 2030')
+
+
+def test_mixed_lines_import_the_valid_ones_and_report_the_rest(app_module, client):
+    body = ndjson(event('A'), '{not json', '[1, 2]', {'location': 'Karachi'}, event('B', price='free'),
+                  event('C', date='01/02/2030'), event('D'))
+
+    response = import_events(client, body)
+
+    assert response.status_code == 207
+    result = response.get_json()
+    assert (result['inserted'], result['failed']) == (2, 5)
+    assert [error['line'] for error in result['errors']] == [2, 3, 4, 5, 6]
+    assert result['errors'][2]['error'] == "Missing 'name' field"
+    assert sorted(doc['name'] for doc in app_module.events_collection.find()) == ['A', 'D']
+
+
+def test_write_errors_are_reported_by_line(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'IMPORT_BATCH_SIZE', 2)
+    app_module.events_collection.create_index('name', unique=True, name='test_unique_name')
+    try:
+        response = import_events(client, ndjson(event('A'), event('B'), event('A'), event('C'), event('B')))
+    finally:
+        app_module.events_collection.drop_index('test_unique_name')
+
+    assert response.status_code == 207
+    result = response.get_json()
+    assert (result['inserted'], result['failed']) == (3, 2)
+    assert [error['line'] for error in result['errors']] == [3, 5]
+
+
+def test_error_list_is_capped_but_every_failure_counted(app_module, client, monkeypatch):
+    monkeypatch.setattr(app_module, 'IMPORT_MAX_ERRORS', 2)
+
+    result = import_events(client, ndjson(*['{bad'] * 5, event('A'))).get_json()
+
+    assert (result['inserted'], result['failed'], len(result['errors'])) == (1, 5, 2)
+
+
+def test_export_pages_through_every_event(app_module, client, make_event, monkeypatch):
+    monkeypatch.setattr(app_module, 'EXPORT_BATCH_SIZE', 2)
+    ids = [make_event(name=f'Event {i}') for i in range(5)]
+
+    exported = export_events(client, '?fields=name')
+
+    assert [doc['_id'] for doc in exported] == sorted(ids)
+    assert all(set(doc) == {'_id', 'name'} for doc in exported)
+
+
+def test_export_round_trips_through_import(app_module, client):
+    originals = [event('A', date='2030-03-04', description='Open air'), event('B', price=99.5, location='Karachi')]
+    import_events(client, ndjson(*originals))
+    exported = export_events(client)
+    assert all('search_terms' not in doc for doc in exported)
+
+    app_module.events_collection.delete_many({})
+    app_module.event_counter.invalidate()
+    response = import_events(client, ndjson(*exported))
+    reimported = export_events(client)
+
+    assert response.get_json() == {'inserted': 2, 'failed': 0, 'errors': []}
+    fields = ('name', 'location', 'date', 'price', 'tickets_available', 'description', 'picture', 'date_display')
+    assert [{f: doc[f] for f in fields} for doc in reimported] == [{f: doc[f] for f in fields} for doc in exported]
+    assert [doc['date'] for doc in reimported] == ['2030-03-04', '2030-01-01']
@@ -0,0 +1,139 @@
+import threading
+import time
+from page_cache import PageCache, fill_slots, slot
+
+
+class Renderer:
+    """Numbered renders; a refresh signals `refreshed` when it has run"""
+
+    def __init__(self):
+        self.renders = 0
+        self.refreshed = threading.Event()
+
+    def render(self):
+        self.renders += 1
+        return f'page {self.renders}'
+
+    def refresh(self):
+        html = self.render()
+        self.refreshed.set()
+        return html
+
+
+def wait_for_refresh(cache, renderer):
+    assert renderer.refreshed.wait(2)
+    deadline = time.monotonic() + 2
+    while cache._refreshing and time.monotonic() < deadline:
+        time.sleep(0.005)
+
+
+def test_fresh_entries_are_hits():
+    cache, renderer = PageCache(ttl=60), Renderer()
+
+    assert cache.get_or_render('k', renderer.render) == 'page 1'
+    assert cache.get_or_render('k', renderer.render) == 'page 1'
+    assert cache.get_or_render('other', renderer.render) == 'page 2'
+    assert (cache.stats()['hits'], cache.stats()['misses']) == (1, 2)
+
+
+def test_expired_entry_is_served_stale_while_one_refresh_runs():
+    cache, renderer = PageCache(ttl=0.05, stale_ttl=60), Renderer()
+    cache.get_or_render('k', renderer.render, renderer.refresh)
+    time.sleep(0.06)
+
+    # The stale window starts at expiry, so it applies even though stale_ttl > ttl
+    stale = [cache.get_or_render('k', renderer.render, renderer.refresh) for _ in range(3)]
+    wait_for_refresh(cache, renderer)
+
+    assert stale == ['page 1'] * 3
+    assert renderer.renders == 2
+    assert cache.get_or_render('k', renderer.render, renderer.refresh) == 'page 2'
+    assert cache.stats()['stale_hits'] == 3
+
+
+def test_stale_window_is_measured_past_expiry():
+    cache, renderer = PageCache(ttl=0.2, stale_ttl=0.1), Renderer()
+    cache.get_or_render('k', renderer.render, renderer.refresh)
+    time.sleep(0.22)
+
+    assert cache.get_or_render('k', renderer.render, renderer.refresh) == 'page 1'
+    wait_for_refresh(cache, renderer)
+
+
+def test_entries_past_the_stale_window_are_rendered_inline():
+    cache, renderer = PageCache(ttl=0.02, stale_ttl=0.02), Renderer()
+    cache.get_or_render('k', renderer.render, renderer.refresh)
+    time.sleep(0.05)
+
+    assert cache.get_or_render('k', renderer.render, renderer.refresh) == 'page 2'
+    assert not renderer.refreshed.is_set()
+
+
+def test_bump_rerenders_every_entry_at_once():
+    cache, renderer = PageCache(ttl=60, stale_ttl=60), Renderer()
+    cache.get_or_render('k', renderer.render, renderer.refresh)
+    cache.get_or_render('other', renderer.render, renderer.refresh)
+    cache.bump()
+
+    assert cache.get_or_render('k', renderer.render, renderer.refresh) == 'page 3'
+    assert cache.get_or_render('other', renderer.render, renderer.refresh) == 'page 4'
+    assert cache.get_or_render('k', renderer.render, renderer.refresh) == 'page 3'
+    assert not renderer.refreshed.is_set()
+
+
+def test_slots_are_filled_with_one_lookup():
+    html = f"<b>{slot('left', 'a')}</b><i>{slot('left', 'b')}</i>{slot('left', 'a')}"
+    lookups = []
+
+    def lookup(keys):
+        lookups.append(sorted(keys))
+        return {'a': 3, 'b': '<script>'}
+
+    assert fill_slots(html, 'left', lookup) == '<b>3</b><i>&lt;script&gt;</i>3'
+    assert lookups == [['a', 'b']]
+    assert fill_slots('<p>no slots</p>', 'left', lookup) == '<p>no slots</p>'
+
+
+def test_ticket_sales_keep_the_grid_cached_but_show_fresh_counts(app_module, client, make_event):
+    event_id = make_event(name='Hot gig', tickets_available=10)
+    assert b'10 tickets left' in client.get('/').data
+    misses = app_module.page_cache.stats()['misses']
+
+    client.post(f'/api/events/{event_id}/reserve', json={'tickets': 3})
+    client.post(f'/api/events/{event_id}/holds', json={'tickets': 2, 'session_id': 'alice'})
+    page = client.get('/').data
+
+    assert b'5 tickets left' in page
+    assert app_module.page_cache.stats()['misses'] == misses
+
+
+def test_edits_and_deletes_rerender_the_grid(app_module, client, make_event):
+    event_id = make_event(name='Old name')
+    client.get('/')
+    generation = app_module.page_cache.stats()['generation']
+
+    client.put(f'/api/events/{event_id}/edit', json={'name': 'New name', 'price': 5, 'tickets_available': 3})
+    edited = app_module.page_cache.stats()['generation']
+    assert b'New name' in client.get('/').data
+    client.post(f'/events/{event_id}/delete')
+
+    assert edited == generation + 1
+    assert app_module.page_cache.stats()['generation'] == generation + 2
+    assert b'New name' not in client.get('/').data
+
+
+def test_stale_grid_is_refreshed_in_the_background(app_module, client, make_event, monkeypatch):
+    monkeypatch.setattr(app_module.page_cache, 'ttl', 0.05)
+    make_event(name='First')
+    assert b'First' in client.get('/').data
+    make_event(name='Second')  # inserted directly, so nothing bumps the cache
+    time.sleep(0.06)
+
+    stale = client.get('/').data
+    deadline = time.monotonic() + 2
+    while b'Second' not in client.get('/').data and time.monotonic() < deadline:
+        time.sleep(0.01)
+
+    assert b'Second' not in stale
+    assert b'Second' in client.get('/').data
+    assert app_module.page_cache.stats()['stale_hits'] >= 1
@@ -0,0 +1,93 @@
+import base64
+from datetime import datetime
+import pytest
+from bson import json_util
+from bson.objectid import ObjectId
+from pagination import EventCounter, decode_cursor, encode_cursor, keyset_filter
+
+SORT = [('name', 1), ('_id', 1)]
+
+
+def token(values):
+    return base64.urlsafe_b64encode(json_util.dumps(values).encode()).decode()
+
+
+def test_cursor_round_trip():
+    document = {'name': 'Jazz', '_id': ObjectId()}
+    assert decode_cursor(encode_cursor(document, SORT), SORT) == ['Jazz', document['_id']]
+
+
+@pytest.mark.parametrize('values', [
+    [{'$ne': None}, str(ObjectId())],
+    ['Jazz', {'$regex': '.*'}],
+    [['a'], ObjectId()],
+    ['only one value'],
+])
+def test_cursor_rejects_operators_and_wrong_shapes(values):
+    with pytest.raises(ValueError):
+        decode_cursor(token(values), SORT)
+
+
+def test_listing_rejects_a_crafted_cursor(client, make_event):
+    make_event()
+    response = client.get('/api/events?after=' + token([{'$gt': ''}, {'$ne': None}]))
+    assert response.status_code == 400
+
+
+def test_keyset_filter_is_strictly_after_the_cursor():
+    oid = ObjectId()
+    assert keyset_filter(SORT, ['Jazz', oid]) == {'$or': [
+        {'name': {'$gt': 'Jazz'}},
+        {'name': 'Jazz', '_id': {'$gt': oid}},
+    ]}
+
+
+def test_keyset_pages_cover_every_event_once(client, make_event):
+    ids = {make_event(name=f'Event {i % 3}') for i in range(7)}
+    seen, after = [], None
+    while True:
+        url = '/api/events?per_page=3' + (f'&after={after}' if after else '&after=')
+        body = client.get(url).get_json()
+        seen += [event['_id'] for event in body['events']]
+        after = body['next_cursor']
+        if not after:
+            break
+    assert sorted(seen) == sorted(ids)
+
+
+def test_filtered_counts_are_bounded(app_module, make_event):
+    make_event()
+    counter = EventCounter(app_module.events_collection, maxsize=2)
+    for location in ('a', 'b', 'c', 'd'):
+        counter.count({'location': location})
+    assert counter._filtered.stats()['size'] == 2
+
+
+def test_keyset_filter_handles_null_sort_values():
+    oid = ObjectId()
+    date_sort = [('date', 1), ('_id', 1)]
+    # Nulls sort first: after a null date come the other nulls and every dated event
+    assert keyset_filter(date_sort, [None, oid]) == {'$or': [
+        {'date': {'$ne': None}},
+        {'date': None, '_id': {'$gt': oid}},
+    ]}
+    # Descending, nulls come last: after a dated event come earlier dates and the nulls
+    when = datetime(2025, 5, 1)
+    assert keyset_filter([('date', -1), ('_id', -1)], [when, oid]) == {'$or': [
+        {'$or': [{'date': {'$lt': when}}, {'date': None}]},
+        {'date': when, '_id': {'$lt': oid}},
+    ]}
+
+
+@pytest.mark.parametrize('sort', ['date', '-date'])
+def test_keyset_pages_reach_events_after_null_dates(client, make_event, sort):
+    ids = {make_event(name=f'Undated {i}', date='') for i in range(3)}
+    ids |= {make_event(name=f'Dated {i}', date=f'2025-0{i + 1}-01') for i in range(4)}
+    seen, after = [], ''
+    while True:
+        body = client.get(f'/api/events?per_page=2&sort={sort}&after={after}').get_json()
+        seen += [event['_id'] for event in body['events']]
+        after = body['next_cursor']
+        if not after:
+            break
+    assert sorted(seen) == sorted(ids)
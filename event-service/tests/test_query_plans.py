@@ -0,0 +1,52 @@
+import pytest
+from conftest import real_mongo
+from filters import build_filters, parse_sort
+from pagination import with_tiebreaker
+
+pytestmark = real_mongo
+
+LISTINGS = [
+    {'sort': 'date'},
+    {'sort': '-date'},
+    {'sort': 'price'},
+    {'sort': '-price'},
+    {'location': 'Lahore'},
+    {'location': 'Lahore', 'sort': 'date'},
+    {'location': 'Lahore', 'sort': '-price', 'date_from': '2030-03-01'},
+    {'date_from': '2030-02-01', 'date_to': '2030-06-30', 'sort': 'price'},
+    {'price_min': '50', 'sort': '-date', 'available': '1'},
+    {'available': '1'},
+    {'available': '1', 'sort': 'date'},
+]
+
+
+def stages(plan):
+    """Every stage name in an explain() plan tree"""
+    found = []
+    if isinstance(plan, dict):
+        if 'stage' in plan:
+            found.append(plan['stage'])
+        for value in plan.values():
+            found += stages(value)
+    elif isinstance(plan, list):
+        for value in plan:
+            found += stages(value)
+    return found
+
+
+@pytest.fixture
+def catalogue(make_event):
+    for i in range(300):
+        make_event(name=f'Event {i}', location=('Lahore', 'Karachi', 'Islamabad')[i % 3],
+                   date=f'2030-{i % 12 + 1:02d}-{i % 28 + 1:02d}' if i % 10 else '',
+                   price=10 * (i % 20), tickets_available=i % 4)
+
+
+@pytest.mark.parametrize('args', LISTINGS, ids=lambda args: '&'.join(f'{k}={v}' for k, v in args.items()))
+def test_listing_is_served_in_index_order(app_module, catalogue, args):
+    query = build_filters(args)
+    sort = with_tiebreaker(parse_sort(args.get('sort')) or [])
+    plan = app_module.events_collection.find(query).sort(sort).limit(7).explain()['queryPlanner']['winningPlan']
+
+    assert 'COLLSCAN' not in stages(plan)
+    assert 'SORT' not in stages(plan)
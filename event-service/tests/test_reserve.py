@@ -0,0 +1,90 @@
+from bson.objectid import ObjectId
+from benchmarks.reserve_contention import hammer, inventory_errors
+from inventory import start_reservation
+
+
+def test_reserve_takes_tickets_and_returns_remaining(client, make_event):
+    event_id = make_event(tickets_available=5)
+    response = client.post(f'/api/events/{event_id}/reserve', json={'tickets': 3})
+    assert response.status_code == 200
+    assert response.get_json() == {'event_id': event_id, 'reserved': 3, 'tickets_available': 2}
+
+
+def test_reserve_refuses_more_than_remaining(client, make_event, app_module):
+    event_id = make_event(tickets_available=2)
+    assert client.post(f'/api/events/{event_id}/reserve', json={'tickets': 3}).status_code == 409
+    event = app_module.events_collection.find_one({'_id': ObjectId(event_id)})
+    assert event['tickets_available'] == 2
+
+
+def test_reserve_errors(client, make_event):
+    event_id = make_event()
+    assert client.post(f'/api/events/{ObjectId()}/reserve', json={'tickets': 1}).status_code == 404
+    assert client.post(f'/api/events/{event_id}/reserve', json={'tickets': 0}).status_code == 400
+    assert client.post('/api/events/not-an-id/reserve', json={'tickets': 1}).status_code == 400
+
+
+def test_release_gives_tickets_back(client, make_event):
+    event_id = make_event(tickets_available=5)
+    client.post(f'/api/events/{event_id}/reserve', json={'tickets': 4})
+    response = client.post(f'/api/events/{event_id}/release', json={'tickets': 4})
+    assert response.status_code == 200
+    assert response.get_json()['tickets_available'] == 5
+
+
+def reserve(client, event_id, tickets, reservation_id):
+    return client.post(f'/api/events/{event_id}/reserve', json={'tickets': tickets, 'reservation_id': reservation_id})
+
+
+def release(client, event_id, reservation_id):
+    return client.post(f'/api/events/{event_id}/release', json={'reservation_id': reservation_id})
+
+
+def test_reservation_is_made_and_released_at_most_once(client, make_event):
+    event_id = make_event(tickets_available=5)
+
+    assert reserve(client, event_id, 3, 'r1').get_json()['tickets_available'] == 2
+    repeat = reserve(client, event_id, 3, 'r1')
+    first_release = release(client, event_id, 'r1')
+    second_release = release(client, event_id, 'r1')
+
+    assert repeat.status_code == 200 and repeat.get_json()['tickets_available'] == 2
+    assert first_release.get_json() == {'event_id': event_id, 'released': 3, 'tickets_available': 5}
+    assert second_release.status_code == 200 and second_release.get_json()['released'] == 0
+    assert reserve(client, event_id, 3, 'r1').status_code == 409
+
+
+def test_release_before_its_reserve_cancels_it(client, make_event):
+    event_id = make_event(tickets_available=5)
+
+    early = release(client, event_id, 'late')
+    late = reserve(client, event_id, 2, 'late')
+
+    assert early.status_code == 200 and early.get_json()['released'] == 0
+    assert late.status_code == 409
+    assert client.get(f'/api/events/{event_id}').get_json()['tickets_available'] == 5
+
+
+def test_failed_reservation_releases_nothing(client, make_event):
+    event_id = make_event(tickets_available=1)
+
+    assert reserve(client, event_id, 2, 'too-many').status_code == 409
+    assert release(client, event_id, 'too-many').get_json()['released'] == 0
+    assert client.get(f'/api/events/{event_id}').get_json()['tickets_available'] == 1
+
+
+def test_release_waits_for_a_reserve_still_running(app_module, client, make_event):
+    event_id = make_event()
+    start_reservation(app_module.reservations_collection, 'running', event_id, 2)
+
+    assert release(client, event_id, 'running').status_code == 409
+    assert reserve(client, event_id, 1, '').status_code == 400
+    assert reserve(client, event_id, 1, 'x' * 65).status_code == 400
+
+
+def test_concurrent_reserves_never_oversell(app_module, make_event):
+    event_id = make_event(tickets_available=50)
+    result = hammer(app_module, event_id, threads=16, attempts=10)
+    assert result['reserved'] == 50
+    assert result['sold_out'] == 16 * 10 - 50
+    assert inventory_errors(app_module, event_id, 50, result) == []
@@ -0,0 +1,37 @@
+from conftest import real_mongo
+from search import build_search, search_terms, tokenize
+
+
+def test_tokenize_lowercases_and_splits_words():
+    assert tokenize('Rock-Festival, LAHORE 2030') == ['rock', 'festival', 'lahore', '2030']
+    assert tokenize(None) == []
+
+
+def test_search_terms_cover_every_searchable_field():
+    event = {'name': 'Jazz Night', 'location': 'Lahore', 'description': 'jazz and food', 'price': 10}
+    assert search_terms(event) == ['and', 'food', 'jazz', 'lahore', 'night']
+
+
+def test_prefix_mode_matches_whole_tokens_then_a_prefix():
+    query, _, _ = build_search('jazz ni', 'prefix')
+    assert query == {'$and': [{'search_terms': 'jazz'}, {'search_terms': {'$regex': '^ni'}}]}
+
+
+def test_prefix_mode_escapes_regex_characters():
+    query, _, _ = build_search('a.*', 'prefix')
+    assert query == {'search_terms': {'$regex': '^a'}}
+
+
+def test_prefix_search_finds_type_ahead_matches(client, make_event):
+    make_event(name='Jazz Night')
+    make_event(name='Rock Night')
+    response = client.get('/api/events?search=jazz%20ni&mode=prefix')
+    assert [event['name'] for event in response.get_json()['events']] == ['Jazz Night']
+
+
+@real_mongo
+def test_text_search_ranks_name_matches_first(client, make_event):
+    make_event(name='Food Fair', description='jazz in the evening')
+    make_event(name='Jazz Night', description='music')
+    response = client.get('/api/events?search=jazz')
+    assert [event['name'] for event in response.get_json()['events']] == ['Jazz Night', 'Food Fair']
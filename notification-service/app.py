@@ -1,14 +1,24 @@
 import pika
 import json
+import time
+import functools
+import multiprocessing
+from concurrent.futures import ThreadPoolExecutor
 from flask import Flask, request, jsonify
 from flask_mail import Mail, Message
 from pymongo import MongoClient
 import os
 from dotenv import load_dotenv
+from smtp_pool import SMTPConnectionPool
+from notification_log import BufferedNotificationWriter, ensure_notification_indexes
+from datetime import datetime
+from metrics import REGISTRY, instrument_flask, mongo_listener
+from retries import declare_retry_queues, dead_letter_queue, parse_booking_message, reroute
 
 load_dotenv()
 
 app = Flask(__name__)
+instrument_flask(app)
 
 # Configure Flask-Mail for email notifications
 app.config['MAIL_SERVER'] = os.getenv("MAIL_SERVER")
@@ -18,18 +28,46 @@ app.config['MAIL_PASSWORD'] = os.getenv("MAIL_PASSWORD")
 app.config['MAIL_USE_TLS'] = True
 mail = Mail(app)
 
+# Long-lived SMTP sessions shared by all senders (Flask-Mail only builds messages)
+smtp_pool = SMTPConnectionPool(
+    host=app.config['MAIL_SERVER'],
+    port=app.config['MAIL_PORT'],
+    username=app.config['MAIL_USERNAME'],
+    password=app.config['MAIL_PASSWORD'],
+    use_tls=app.config['MAIL_USE_TLS'],
+    size=int(os.getenv("SMTP_POOL_SIZE", os.getenv("CONSUMER_WORKERS", 8))),
+    max_messages=int(os.getenv("SMTP_MAX_MESSAGES_PER_CONNECTION", 100)),
+    timeout=float(os.getenv("SMTP_TIMEOUT", 30))
+)
+
 
 def get_mongo_client():
     mongo_url = os.getenv("MONGO_URL")
     mongo_port = int(os.getenv("MONGO_PORT"))
-    return MongoClient(host=mongo_url, port=mongo_port)
+    return MongoClient(host=mongo_url, port=mongo_port, event_listeners=[mongo_listener()])
 
 # MongoDB setup
 mongo_client = get_mongo_client()
 db = mongo_client[os.getenv("MONGO_DB")]
 notifications_collection = db.notifications
+ensure_notification_indexes(notifications_collection)
+
+# Notification records are batched off the send path
+notification_writer = BufferedNotificationWriter(
+    notifications_collection,
+    max_batch=int(os.getenv("NOTIFICATION_LOG_BATCH_SIZE", 500)),
+    max_delay=float(os.getenv("NOTIFICATION_LOG_FLUSH_INTERVAL", 1.0))
+)
+
 
 
+def confirmation_body(booking_id):
+    # Batched bookings arrive as one message carrying a list of ids
+    if isinstance(booking_id, list):
+        ids = ", ".join(str(bid) for bid in booking_id)
+        return f"Dear User,\n\nYour bookings {ids} are confirmed!\n\nBest Regards,\nYour Company"
+    return f"Dear User,\n\nYour booking {booking_id} is confirmed!\n\nBest Regards,\nYour Company"
+
 
 def send_confirmation_email(booking_data):
     """Send email using Flask-Mail with proper app context"""
@@ -39,22 +77,26 @@ def send_confirmation_email(booking_data):
                 subject="Booking Confirmation",
                 sender=os.getenv("MAIL_USERNAME"),
                 recipients=[booking_data["user_email"]],
-                body=f"Dear User,\n\nYour booking {booking_data['booking_id']} is confirmed!\n\nBest Regards,\nYour Company"
+                body=confirmation_body(booking_data["booking_id"])
             )
-            mail.send(msg)
+            smtp_pool.send(msg.sender, msg.send_to, msg.as_bytes())
             
             # Log notification in MongoDB
-            notifications_collection.insert_one({
+            notification_writer.write({
                 "booking_id": booking_data["booking_id"],
                 "user_email": booking_data["user_email"],
                 "status": "sent",
-                "message": "Confirmation email sent successfully"
+                "message": "Confirmation email sent successfully",
+                "created_at": datetime.utcnow()
             })
             return {"success": True, "message": "Email sent successfully"}
         except Exception as e:
-            notifications_collection.insert_one({
+            notification_writer.write({
+                "booking_id": booking_data.get("booking_id"),
+                "user_email": booking_data.get("user_email"),
                 "status": "failed",
-                "error": str(e)
+                "error": str(e),
+                "created_at": datetime.utcnow()
             })
             return {"success": False, "message": str(e)}
 
@@ -71,32 +113,171 @@ def send_email_api():
     except Exception as e:
         return jsonify({"error": str(e)}), 500
 
+@app.route("/notifications/<booking_id>", methods=["GET"])
+def notification_history(booking_id):
+    """Notification history of a booking, oldest first"""
+    # Booking ids are integers from the Booking Service
+    key = int(booking_id) if booking_id.isdigit() else booking_id
+    records = notifications_collection.find(
+        {"booking_id": key}, {"_id": 0}
+    ).sort("created_at", 1)
+    return jsonify({
+        "booking_id": key,
+        "notifications": [
+            {**record, "created_at": record["created_at"].isoformat() if record.get("created_at") else None}
+            for record in records
+        ]
+    })
+
+@app.route("/notifications/stats", methods=["GET"])
+def notification_log_stats():
+    return jsonify(notification_writer.stats())
+
+@app.route("/smtp/stats", methods=["GET"])
+def smtp_stats():
+    return jsonify(smtp_pool.stats())
+
 @app.route("/test", methods=["GET"])
 def test():
     return jsonify({"message": "API is running"})
 
-def consume_booking_events():
-    """RabbitMQ Consumer for booking confirmations"""
-    try:
-        connection = pika.BlockingConnection(
-            pika.ConnectionParameters(
-                host=os.getenv("RABBITMQ_HOST"),
-                port=int(os.getenv("RABBITMQ_PORT"))
-            )
+# Consumer settings
+BOOKING_QUEUE = 'booking_confirmed'
+CONSUMER_PREFETCH = int(os.getenv("CONSUMER_PREFETCH", 32))
+CONSUMER_WORKERS = int(os.getenv("CONSUMER_WORKERS", 8))
+CONSUMER_PROCESSES = int(os.getenv("CONSUMER_PROCESSES", 1))
+CONSUMER_LAG_INTERVAL = float(os.getenv("CONSUMER_LAG_INTERVAL", 5))
+
+
+class ConsumerMetrics:
+    """Message counters shared by every consumer process"""
+
+    def __init__(self, ctx=multiprocessing):
+        self.processed = ctx.Value('q', 0)
+        self.failed = ctx.Value('q', 0)
+        # Queue depths as last seen by a consumer (lag_at == 0: not polled yet)
+        self.messages_ready = ctx.Value('q', 0)
+        self.consumers = ctx.Value('q', 0)
+        self.dead_lettered = ctx.Value('q', 0)
+        self.lag_at = ctx.Value('d', 0.0)
+        self.started_at = time.time()
+        self._last = (self.started_at, 0)
+
+    def record(self, success):
+        counter = self.processed if success else self.failed
+        with counter.get_lock():
+            counter.value += 1
+
+    def record_lag(self, messages_ready, consumers, dead_lettered):
+        with self.lag_at.get_lock():
+            self.messages_ready.value = messages_ready
+            self.consumers.value = consumers
+            self.dead_lettered.value = dead_lettered
+            self.lag_at.value = time.time()
+
+    def lag(self):
+        with self.lag_at.get_lock():
+            if not self.lag_at.value:
+                return {"error": "queue depths not polled yet"}
+            return {
+                "messages_ready": self.messages_ready.value,
+                "consumers": self.consumers.value,
+                "dead_lettered": self.dead_lettered.value,
+                "age_seconds": round(time.time() - self.lag_at.value, 1),
+            }
+
+    def snapshot(self):
+        now = time.time()
+        processed = self.processed.value
+        last_at, last_processed = self._last
+        self._last = (now, processed)
+        return {
+            "processed": processed,
+            "failed": self.failed.value,
+            "messages_per_sec": round(processed / max(now - self.started_at, 1e-9), 2),
+            "recent_messages_per_sec": round((processed - last_processed) / max(now - last_at, 1e-9), 2),
+            "queue": self.lag(),
+        }
+
+
+def rabbitmq_connection():
+    return pika.BlockingConnection(
+        pika.ConnectionParameters(
+            host=os.getenv("RABBITMQ_HOST"),
+            port=int(os.getenv("RABBITMQ_PORT"))
         )
+    )
+
+
+def consume_booking_events(metrics=None):
+    """RabbitMQ Consumer for booking confirmations
+
+    Up to CONSUMER_PREFETCH unacked messages are handed to a pool of
+    CONSUMER_WORKERS threads. A message is acked only after its email was
+    sent, or after a failed one was republished to a delay queue for a later
+    retry (NOTIFY_RETRY_DELAYS). Messages that still fail after the last
+    retry, and malformed ones that never could succeed, are parked in the
+    dead-letter queue. Every CONSUMER_LAG_INTERVAL seconds the queue depths are
+    recorded in `metrics` for /consumer/stats.
+    """
+    try:
+        connection = rabbitmq_connection()
         channel = connection.channel()
         
-        channel.queue_declare(queue='booking_confirmed')
-        
+        channel.queue_declare(queue=BOOKING_QUEUE)
+        declare_retry_queues(channel, BOOKING_QUEUE)
+        # Republished retries must reach the broker before the original is acked
+        channel.confirm_delivery()
+        channel.basic_qos(prefetch_count=CONSUMER_PREFETCH)
+        executor = ThreadPoolExecutor(max_workers=CONSUMER_WORKERS)
+
+        def settle(delivery_tag, outcome, body, properties):
+            # pika channels aren't thread-safe: this runs on the connection thread
+            try:
+                if outcome != "sent":
+                    target = reroute(channel, BOOKING_QUEUE, body, properties, dead=outcome == "invalid")
+                    print(f"↪️ Notification moved to {target}")
+                channel.basic_ack(delivery_tag=delivery_tag)
+            except Exception as e:
+                print(f"❌ Failed to reroute message: {str(e)}")
+                channel.basic_nack(delivery_tag=delivery_tag, requeue=True)
+
+        def handle(delivery_tag, body, properties):
+            outcome = "failed"
+            try:
+                booking_data = parse_booking_message(body)
+                print(f"📩 Received booking confirmation: {booking_data}")
+                if send_confirmation_email(booking_data)["success"]:
+                    outcome = "sent"
+            except ValueError as e:
+                print(f"❌ Malformed message: {str(e)}")
+                outcome = "invalid"
+            except Exception as e:
+                print(f"❌ Failed to process message: {str(e)}")
+            if metrics is not None:
+                metrics.record(outcome == "sent")
+            connection.add_callback_threadsafe(
+                functools.partial(settle, delivery_tag, outcome, body, properties)
+            )
+
         def callback(ch, method, properties, body):
-            booking_data = json.loads(body)
-            print(f"📩 Received booking confirmation: {booking_data}")
-            send_confirmation_email(booking_data)
+            executor.submit(handle, method.delivery_tag, body, properties)
+
+        def poll_lag():
+            # Passive declares on the consumer's own channel, so /consumer/stats never connects
+            try:
+                metrics.record_lag(**queue_lag(channel))
+            except Exception as e:
+                print(f"❌ Failed to read queue depths: {str(e)}")
+            connection.call_later(CONSUMER_LAG_INTERVAL, poll_lag)
+
+        if metrics is not None:
+            poll_lag()
         
         channel.basic_consume(
-            queue='booking_confirmed',
+            queue=BOOKING_QUEUE,
             on_message_callback=callback,
-            auto_ack=True
+            auto_ack=False
         )
         
         print("🚀 Waiting for booking confirmations...")
@@ -105,10 +286,57 @@ def consume_booking_events():
     except Exception as e:
         print(f"❌ RabbitMQ connection error: {str(e)}")
 
+
+def queue_lag(channel):
+    """Messages waiting in the booking queue, consumers on it, and dead-lettered messages"""
+    declared = channel.queue_declare(queue=BOOKING_QUEUE, passive=True)
+    dead = channel.queue_declare(queue=dead_letter_queue(BOOKING_QUEUE), passive=True)
+    return {
+        "messages_ready": declared.method.message_count,
+        "consumers": declared.method.consumer_count,
+        "dead_lettered": dead.method.message_count,
+    }
+
+
+consumer_metrics = None
+
+
+def consumed_counts():
+    # Read from the counters shared with the consumer processes at scrape time
+    if consumer_metrics is None:
+        return {}
+    return {
+        (BOOKING_QUEUE, "processed"): consumer_metrics.processed.value,
+        (BOOKING_QUEUE, "failed"): consumer_metrics.failed.value,
+    }
+
+
+REGISTRY.counter_callback("rabbitmq_messages_consumed_total", "Booking messages consumed, by outcome",
+                          consumed_counts, ("queue", "outcome"))
+
+
+@app.route("/consumer/stats", methods=["GET"])
+def consumer_stats():
+    """Throughput of the booking consumers and the queue lag they last saw"""
+    stats = {
+        "processes": CONSUMER_PROCESSES,
+        "workers_per_process": CONSUMER_WORKERS,
+        "prefetch": CONSUMER_PREFETCH,
+    }
+    if consumer_metrics is not None:
+        stats.update(consumer_metrics.snapshot())
+    return jsonify(stats)
+
 if __name__ == "__main__":
-    # Start RabbitMQ consumer in a separate thread
+    # Start RabbitMQ consumers: a thread in this process, or N spawned processes
     import threading
-    threading.Thread(target=consume_booking_events, daemon=True).start()
+    ctx = multiprocessing.get_context("spawn")
+    consumer_metrics = ConsumerMetrics(ctx)
+    if CONSUMER_PROCESSES > 1:
+        for _ in range(CONSUMER_PROCESSES):
+            ctx.Process(target=consume_booking_events, args=(consumer_metrics,), daemon=True).start()
+    else:
+        threading.Thread(target=consume_booking_events, args=(consumer_metrics,), daemon=True).start()
     
     # Start Flask app
     app.run(host="0.0.0.0", port=5004)
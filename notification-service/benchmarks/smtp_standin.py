@@ -0,0 +1,53 @@
+"""Local stand-in SMTP server for tests and benchmarks
+
+Accepts every message, counts sessions and messages, and can add a delay to
+each EHLO to stand in for the TLS/auth handshake of a real provider.
+"""
+import asyncio
+import socket
+import threading
+from aiosmtpd.controller import Controller
+
+
+class CountingHandler:
+    def __init__(self, handshake_delay=0.0):
+        self.handshake_delay = handshake_delay
+        self.sessions = 0
+        self.messages = []
+        self._lock = threading.Lock()
+
+    async def handle_EHLO(self, server, session, envelope, hostname, responses):
+        if self.handshake_delay:
+            await asyncio.sleep(self.handshake_delay)
+        with self._lock:
+            self.sessions += 1
+        session.host_name = hostname
+        return responses
+
+    async def handle_DATA(self, server, session, envelope):
+        with self._lock:
+            self.messages.append((envelope.mail_from, list(envelope.rcpt_tos), envelope.content))
+        return '250 Message accepted for delivery'
+
+
+def free_port():
+    with socket.socket() as sock:
+        sock.bind(('127.0.0.1', 0))
+        return sock.getsockname()[1]
+
+
+class StandInSMTPServer:
+    """Run with `with StandInSMTPServer() as server:`; connect to server.host:server.port"""
+
+    def __init__(self, handshake_delay=0.0):
+        self.handler = CountingHandler(handshake_delay)
+        self.host = '127.0.0.1'
+        self.port = free_port()
+        self.controller = Controller(self.handler, hostname=self.host, port=self.port)
+
+    def __enter__(self):
+        self.controller.start()
+        return self
+
+    def __exit__(self, *exc):
+        self.controller.stop()
@@ -0,0 +1,88 @@
+"""Compare pooled SMTP sends with a new connection per message
+
+Runs against a local stand-in server whose EHLO is delayed by --handshake-ms
+to stand in for the TLS/auth round trips of a real provider.
+
+    python benchmarks/smtp_throughput.py --messages 500 --workers 8 --handshake-ms 50
+"""
+import argparse
+import os
+import smtplib
+import sys
+import time
+from concurrent.futures import ThreadPoolExecutor
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.smtp_standin import StandInSMTPServer
+from smtp_pool import SMTPConnectionPool
+
+SENDER = 'bookings@example.com'
+MESSAGE = b'Subject: Booking Confirmation\r\n\r\nYour booking is confirmed!\r\n'
+
+
+def send_unpooled(server):
+    """What Flask-Mail's mail.send() did: connect, send one message, quit"""
+    def send(recipient):
+        client = smtplib.SMTP(server.host, server.port, timeout=30)
+        try:
+            client.sendmail(SENDER, [recipient], MESSAGE)
+        finally:
+            client.quit()
+    return send
+
+
+def send_pooled(pool):
+    def send(recipient):
+        pool.send(SENDER, [recipient], MESSAGE)
+    return send
+
+
+def run(send, messages, workers):
+    """Send `messages` messages from `workers` threads; returns timing"""
+    recipients = [f'user{i}@example.com' for i in range(messages)]
+    started = time.perf_counter()
+    with ThreadPoolExecutor(max_workers=workers) as executor:
+        list(executor.map(send, recipients))
+    elapsed = time.perf_counter() - started
+    return {
+        'messages': messages,
+        'seconds': round(elapsed, 3),
+        'messages_per_sec': round(messages / elapsed, 1) if elapsed else 0.0,
+    }
+
+
+def compare(messages, workers, handshake_delay, max_messages=100):
+    """Throughput and connection counts of both strategies against a fresh stand-in server each"""
+    results = {}
+    with StandInSMTPServer(handshake_delay) as server:
+        results['unpooled'] = run(send_unpooled(server), messages, workers)
+        results['unpooled']['connections'] = server.handler.sessions
+    with StandInSMTPServer(handshake_delay) as server:
+        pool = SMTPConnectionPool(server.host, server.port, use_tls=False,
+                                  size=workers, max_messages=max_messages)
+        try:
+            results['pooled'] = run(send_pooled(pool), messages, workers)
+        finally:
+            pool.close()
+        results['pooled']['connections'] = server.handler.sessions
+    return results
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument('--messages', type=int, default=500)
+    parser.add_argument('--workers', type=int, default=8)
+    parser.add_argument('--handshake-ms', type=float, default=50)
+    parser.add_argument('--max-messages', type=int, default=100, help='messages per pooled connection')
+    args = parser.parse_args()
+
+    results = compare(args.messages, args.workers, args.handshake_ms / 1000, args.max_messages)
+    for name, result in results.items():
+        print(f'{name:>9}: {result}')
+    speedup = results['pooled']['messages_per_sec'] / max(results['unpooled']['messages_per_sec'], 1e-9)
+    print(f'speedup: {speedup:.1f}x')
+
+
+if __name__ == '__main__':
+    main()
@@ -0,0 +1,78 @@
+import atexit
+import threading
+import time
+from pymongo import ASCENDING
+from pymongo.errors import BulkWriteError
+
+
+class BufferedNotificationWriter:
+    """Accumulates notification records and writes them with insert_many
+
+    A batch is flushed when it reaches `max_batch` records or when the oldest
+    record has waited `max_delay` seconds, and once more at interpreter exit.
+    """
+
+    def __init__(self, collection, max_batch=500, max_delay=1.0):
+        self.collection = collection
+        self.max_batch = max_batch
+        self.max_delay = max_delay
+        self._buffer = []
+        self._lock = threading.Lock()
+        self._flush_lock = threading.Lock()
+        self._has_data = threading.Event()
+        self._closed = False
+        self.written = 0
+        self.failed = 0
+        self._thread = threading.Thread(target=self._run, name="notification-writer", daemon=True)
+        self._thread.start()
+        atexit.register(self.close)
+
+    def write(self, record):
+        with self._lock:
+            self._buffer.append(record)
+            full = len(self._buffer) >= self.max_batch
+        self._has_data.set()
+        if full:
+            self.flush()
+
+    def flush(self):
+        with self._flush_lock:
+            with self._lock:
+                batch, self._buffer = self._buffer, []
+            if not batch:
+                return 0
+            try:
+                # Unordered so one bad record doesn't stop the rest of the batch
+                self.collection.insert_many(batch, ordered=False)
+                self.written += len(batch)
+            except BulkWriteError as e:
+                inserted = e.details.get("nInserted", 0)
+                self.written += inserted
+                self.failed += len(batch) - inserted
+            except Exception as e:
+                self.failed += len(batch)
+                print(f"❌ Failed to write notification log batch: {str(e)}")
+            return len(batch)
+
+    def _run(self):
+        while not self._closed:
+            self._has_data.wait()
+            self._has_data.clear()
+            # Let a batch build up for max_delay before writing it
+            time.sleep(self.max_delay)
+            self.flush()
+
+    def close(self):
+        self._closed = True
+        self._has_data.set()
+        self.flush()
+
+    def stats(self):
+        with self._lock:
+            pending = len(self._buffer)
+        return {"pending": pending, "written": self.written, "failed": self.failed}
+
+
+def ensure_notification_indexes(collection):
+    collection.create_index([("booking_id", ASCENDING), ("created_at", ASCENDING)])
+    collection.create_index([("status", ASCENDING)])
@@ -0,0 +1,74 @@
+import json
+import os
+import pika
+
+# Delay (seconds) before each redelivery of a failed message; after the last one it is dead-lettered
+RETRY_DELAYS = [int(delay) for delay in os.getenv("NOTIFY_RETRY_DELAYS", "5,30,120,600").split(",")]
+ATTEMPTS_HEADER = "x-attempts"
+
+
+def retry_queue(queue, delay):
+    return f"{queue}.retry.{delay}s"
+
+
+def dead_letter_queue(queue):
+    return f"{queue}.dead"
+
+
+def declare_retry_queues(channel, queue, delays=RETRY_DELAYS):
+    """Declare one delay queue per retry step, plus the dead-letter queue
+
+    A delay queue holds messages for its TTL and then dead-letters them back
+    onto `queue`. One queue per delay keeps every message in a queue the same
+    age, so none waits behind a longer-delayed one.
+    """
+    for delay in delays:
+        channel.queue_declare(queue=retry_queue(queue, delay), durable=True, arguments={
+            "x-message-ttl": delay * 1000,
+            "x-dead-letter-exchange": "",
+            "x-dead-letter-routing-key": queue,
+        })
+    channel.queue_declare(queue=dead_letter_queue(queue), durable=True)
+
+
+def parse_booking_message(body):
+    """Decode a booking confirmation, or raise ValueError if it can never be sent
+
+    Such messages (unparseable, or missing the recipient or booking id) go
+    straight to the dead-letter queue instead of cycling through the retries.
+    """
+    booking_data = json.loads(body)
+    if not isinstance(booking_data, dict):
+        raise ValueError("message is not a JSON object")
+    missing = [field for field in ("booking_id", "user_email") if not booking_data.get(field)]
+    if missing:
+        raise ValueError(f"message is missing {', '.join(missing)}")
+    return booking_data
+
+
+def attempts(properties):
+    """How many times a message has already failed"""
+    return int(((properties and properties.headers) or {}).get(ATTEMPTS_HEADER, 0))
+
+
+def next_queue(queue, failed_attempts, delays=RETRY_DELAYS):
+    """Where a message goes after its `failed_attempts`-th failure"""
+    if failed_attempts <= len(delays):
+        return retry_queue(queue, delays[failed_attempts - 1])
+    return dead_letter_queue(queue)
+
+
+def reroute(channel, queue, body, properties, delays=RETRY_DELAYS, dead=False):
+    """Republish a failed message to its next delay queue (or the dead-letter queue)
+
+    Returns the queue it went to. The caller acks the original only after
+    this returns, so a crash in between redelivers rather than loses it.
+    """
+    failed = attempts(properties) + 1
+    target = dead_letter_queue(queue) if dead else next_queue(queue, failed, delays)
+    headers = dict((properties and properties.headers) or {})
+    headers[ATTEMPTS_HEADER] = failed
+    channel.basic_publish(exchange="", routing_key=target, body=body, properties=pika.BasicProperties(
+        content_type="application/json", delivery_mode=2, headers=headers
+    ))
+    return target
@@ -0,0 +1,106 @@
+import queue
+import smtplib
+import threading
+
+
+class SMTPConnectionPool:
+    """Pool of long-lived, authenticated SMTP sessions
+
+    Each connection is reused for up to `max_messages` messages before it is
+    recycled. A send that fails on a dropped session reconnects and retries once.
+    """
+
+    def __init__(self, host, port, username=None, password=None, use_tls=True,
+                 size=4, max_messages=100, timeout=30):
+        self.host = host
+        self.port = port
+        self.username = username
+        self.password = password
+        self.use_tls = use_tls
+        self.size = size
+        self.max_messages = max_messages
+        self.timeout = timeout
+        self._idle = queue.LifoQueue()
+        self._slots = threading.BoundedSemaphore(size)
+        self._lock = threading.Lock()
+        self.connects = 0
+        self.reconnects = 0
+        self.sent = 0
+
+    def _connect(self):
+        server = smtplib.SMTP(self.host, self.port, timeout=self.timeout)
+        if self.use_tls:
+            server.starttls()
+        if self.username:
+            server.login(self.username, self.password)
+        with self._lock:
+            self.connects += 1
+        return [server, 0]
+
+    def _acquire(self):
+        self._slots.acquire()
+        try:
+            return self._idle.get_nowait()
+        except queue.Empty:
+            try:
+                return self._connect()
+            except Exception:
+                self._slots.release()
+                raise
+
+    def _release(self, conn):
+        if conn is not None and conn[1] < self.max_messages:
+            self._idle.put(conn)
+        else:
+            self._quit(conn)
+        self._slots.release()
+
+    @staticmethod
+    def _quit(conn):
+        if conn is None:
+            return
+        try:
+            conn[0].quit()
+        except Exception:
+            conn[0].close()
+
+    def send(self, sender, recipients, message):
+        """Send one message (bytes or str) over a pooled session"""
+        conn = self._acquire()
+        try:
+            try:
+                conn[0].sendmail(sender, recipients, message)
+            except (smtplib.SMTPServerDisconnected, ConnectionError):
+                # Idle session timed out server-side; reconnect and retry once
+                conn[0].close()
+                conn = None
+                conn = self._connect()
+                with self._lock:
+                    self.reconnects += 1
+                conn[0].sendmail(sender, recipients, message)
+            conn[1] += 1
+            with self._lock:
+                self.sent += 1
+        except Exception:
+            self._quit(conn)
+            conn = None
+            raise
+        finally:
+            self._release(conn)
+
+    def close(self):
+        while True:
+            try:
+                self._quit(self._idle.get_nowait())
+            except queue.Empty:
+                break
+
+    def stats(self):
+        return {
+            "size": self.size,
+            "idle": self._idle.qsize(),
+            "max_messages_per_connection": self.max_messages,
+            "connects": self.connects,
+            "reconnects": self.reconnects,
+            "sent": self.sent,
+        }
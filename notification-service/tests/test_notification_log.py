@@ -0,0 +1,80 @@
+import threading
+import time
+from pymongo.errors import BulkWriteError
+from notification_log import BufferedNotificationWriter
+
+
+class FakeCollection:
+    def __init__(self, error=None):
+        self.batches = []
+        self.error = error
+        self.inserted = threading.Event()
+
+    def insert_many(self, documents, ordered=True):
+        assert not ordered
+        self.batches.append(list(documents))
+        self.inserted.set()
+        if self.error:
+            raise self.error
+
+
+def records(count):
+    return [{"booking_id": i, "status": "sent"} for i in range(count)]
+
+
+def test_a_full_batch_is_written_at_once():
+    collection = FakeCollection()
+    writer = BufferedNotificationWriter(collection, max_batch=3, max_delay=60)
+    for record in records(4):
+        writer.write(record)
+
+    assert collection.batches == [records(3)]
+    assert writer.stats() == {"pending": 1, "written": 3, "failed": 0}
+
+
+def test_a_partial_batch_is_written_after_max_delay():
+    collection = FakeCollection()
+    writer = BufferedNotificationWriter(collection, max_batch=100, max_delay=0.05)
+    started = time.monotonic()
+    for record in records(2):
+        writer.write(record)
+
+    assert collection.inserted.wait(2)
+    assert time.monotonic() - started >= 0.05
+    assert collection.batches == [records(2)]
+    assert writer.stats()["written"] == 2
+
+
+def test_close_writes_what_is_still_buffered():
+    collection = FakeCollection()
+    writer = BufferedNotificationWriter(collection, max_batch=100, max_delay=60)
+    for record in records(5):
+        writer.write(record)
+    assert collection.batches == []
+
+    writer.close()
+
+    assert collection.batches == [records(5)]
+    assert writer.stats() == {"pending": 0, "written": 5, "failed": 0}
+
+
+def test_records_rejected_in_a_bulk_write_are_counted_as_failed():
+    error = BulkWriteError({"nInserted": 2, "writeErrors": [{"index": 2, "errmsg": "duplicate"}]})
+    writer = BufferedNotificationWriter(FakeCollection(error), max_batch=3, max_delay=60)
+    for record in records(3):
+        writer.write(record)
+
+    assert writer.stats() == {"pending": 0, "written": 2, "failed": 1}
+
+
+def test_a_failed_batch_is_dropped_without_stopping_the_writer():
+    collection = FakeCollection(ConnectionError("mongo down"))
+    writer = BufferedNotificationWriter(collection, max_batch=2, max_delay=60)
+    for record in records(2):
+        writer.write(record)
+    collection.error = None
+    for record in records(2):
+        writer.write(record)
+
+    assert len(collection.batches) == 2
+    assert writer.stats() == {"pending": 0, "written": 2, "failed": 2}
@@ -0,0 +1,69 @@
+import pika
+import pytest
+from retries import (attempts, dead_letter_queue, declare_retry_queues, next_queue, parse_booking_message,
+                     reroute, retry_queue)
+
+DELAYS = [5, 30]
+
+
+class FakeChannel:
+    def __init__(self):
+        self.declared = {}
+        self.published = []
+
+    def queue_declare(self, queue, durable=False, arguments=None):
+        self.declared[queue] = arguments
+
+    def basic_publish(self, exchange, routing_key, body, properties):
+        self.published.append((routing_key, body, properties))
+
+
+def test_delay_queues_dead_letter_back_to_the_main_queue():
+    channel = FakeChannel()
+    declare_retry_queues(channel, "booking_confirmed", DELAYS)
+    assert channel.declared["booking_confirmed.retry.30s"] == {
+        "x-message-ttl": 30000,
+        "x-dead-letter-exchange": "",
+        "x-dead-letter-routing-key": "booking_confirmed",
+    }
+    assert "booking_confirmed.dead" in channel.declared
+
+
+def test_failures_step_through_the_delays_then_dead_letter():
+    assert [next_queue("q", failed, DELAYS) for failed in (1, 2, 3)] == [
+        retry_queue("q", 5), retry_queue("q", 30), dead_letter_queue("q")
+    ]
+
+
+def test_reroute_counts_attempts_in_a_header():
+    channel = FakeChannel()
+    properties = None
+    for expected in ("q.retry.5s", "q.retry.30s", "q.dead"):
+        target = reroute(channel, "q", b"{}", properties, DELAYS)
+        assert target == expected
+        properties = channel.published[-1][2]
+    assert attempts(properties) == 3
+    assert properties.delivery_mode == 2
+
+
+def test_unreadable_messages_go_straight_to_the_dead_letter_queue():
+    channel = FakeChannel()
+    assert reroute(channel, "q", b"not json", pika.BasicProperties(), DELAYS, dead=True) == "q.dead"
+
+
+@pytest.mark.parametrize("body", [
+    b"not json",
+    b"[1, 2]",
+    b'{"booking_id": 7}',
+    b'{"booking_id": 7, "user_email": ""}',
+    b'{"user_email": "a@example.com"}',
+])
+def test_messages_that_can_never_be_sent_are_malformed(body):
+    with pytest.raises(ValueError):
+        parse_booking_message(body)
+
+
+def test_booking_messages_parse():
+    assert parse_booking_message(b'{"booking_id": [1, 2], "user_email": "a@example.com"}') == {
+        "booking_id": [1, 2], "user_email": "a@example.com"
+    }
@@ -0,0 +1,61 @@
+import socket
+import pytest
+from benchmarks.smtp_standin import StandInSMTPServer
+from benchmarks.smtp_throughput import compare
+from smtp_pool import SMTPConnectionPool
+
+MESSAGE = b'Subject: Booking Confirmation\r\n\r\nConfirmed\r\n'
+
+
+@pytest.fixture
+def server():
+    with StandInSMTPServer() as server:
+        yield server
+
+
+def make_pool(server, **options):
+    return SMTPConnectionPool(server.host, server.port, use_tls=False, **options)
+
+
+def test_sends_reuse_one_session(server):
+    pool = make_pool(server, size=2)
+    for i in range(20):
+        pool.send('bookings@example.com', [f'user{i}@example.com'], MESSAGE)
+    pool.close()
+
+    assert len(server.handler.messages) == 20
+    assert server.handler.sessions == 1
+    assert pool.stats()['connects'] == 1
+    assert pool.stats()['sent'] == 20
+
+
+def test_session_is_recycled_after_max_messages(server):
+    pool = make_pool(server, size=1, max_messages=5)
+    for i in range(12):
+        pool.send('bookings@example.com', [f'user{i}@example.com'], MESSAGE)
+    pool.close()
+
+    assert len(server.handler.messages) == 12
+    assert pool.stats()['connects'] == 3
+    assert server.handler.sessions == 3
+
+
+def test_dropped_session_reconnects_and_retries(server):
+    pool = make_pool(server, size=1)
+    pool.send('bookings@example.com', ['first@example.com'], MESSAGE)
+    # Simulate the server timing out the idle session
+    pool._idle.queue[0][0].sock.shutdown(socket.SHUT_RDWR)
+
+    pool.send('bookings@example.com', ['second@example.com'], MESSAGE)
+    pool.close()
+
+    assert [rcpts for _, rcpts, _ in server.handler.messages] == [['first@example.com'], ['second@example.com']]
+    assert pool.stats()['reconnects'] == 1
+    assert pool.stats()['connects'] == 2
+
+
+def test_pool_never_opens_more_sessions_than_its_size():
+    result = compare(messages=60, workers=4, handshake_delay=0.01)
+
+    assert result['unpooled']['connections'] == 60
+    assert result['pooled']['connections'] <= 4
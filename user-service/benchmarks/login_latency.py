@@ -0,0 +1,101 @@
+"""/events latency with and without concurrent logins
+
+Runs the gateway in-process against a stub Event Service and a real
+PostgreSQL database. /events is measured on its own, then again while
+--logins clients log in back to back. With bcrypt offloaded its p99 should
+barely move; --inline runs bcrypt on the event loop for comparison.
+
+    USER_DB_URL=postgresql://localhost/user_test SECRET_KEY=x python benchmarks/login_latency.py --logins 8
+"""
+import argparse
+import asyncio
+import os
+import sys
+import time
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.stub_services import StubService, gateway_client
+
+EMAIL = "login-benchmark@example.com"
+PASSWORD = "benchmark-password"
+
+
+def percentiles(samples):
+    ordered = sorted(samples)
+    pick = lambda q: ordered[min(len(ordered) - 1, int(q * len(ordered)))]
+    return {"requests": len(ordered), "p50_ms": round(pick(0.50) * 1000, 2),
+            "p99_ms": round(pick(0.99) * 1000, 2), "max_ms": round(ordered[-1] * 1000, 2)}
+
+
+async def _events(client, requests, concurrency):
+    latencies = []
+
+    async def worker(count):
+        for _ in range(count):
+            started = time.perf_counter()
+            response = await client.get("/events")
+            latencies.append(time.perf_counter() - started)
+            assert response.status_code == 200, response.text
+
+    await asyncio.gather(*(worker(requests // concurrency) for _ in range(concurrency)))
+    return latencies
+
+
+async def _logins(client, stop, counter):
+    while not stop.is_set():
+        response = await client.post("/login", json={"username": EMAIL, "password": PASSWORD})
+        assert response.status_code == 200, response.text
+        counter.append(1)
+
+
+async def _measure(main, event_url, requests, concurrency, logins):
+    async with main.engine.begin() as conn:
+        await conn.run_sync(main.Base.metadata.create_all)
+    async with gateway_client(main, event_url, event_url) as client:
+        await client.post("/register", json={"email": EMAIL, "password": PASSWORD, "name": "Benchmark"})
+        idle = await _events(client, requests, concurrency)
+
+        stop = asyncio.Event()
+        done = []
+        login_tasks = [asyncio.create_task(_logins(client, stop, done)) for _ in range(logins)]
+        # Let the logins get going before measuring
+        await asyncio.sleep(0.2)
+        busy = await _events(client, requests, concurrency)
+        stop.set()
+        await asyncio.gather(*login_tasks)
+    return {"idle": percentiles(idle), "during_logins": {**percentiles(busy), "logins": len(done)}}
+
+
+def measure(main, requests=200, concurrency=4, logins=8, inline=False):
+    """p50/p99 of /events alone and during `logins` concurrent login loops"""
+    import auth
+    original = main.verify_password_async
+    if inline:
+        async def verify_on_loop(plain, hashed):
+            return auth.verify_password(plain, hashed)
+        main.verify_password_async = verify_on_loop
+    try:
+        stub = StubService({("GET", "/api/events"): lambda req: (200, [], {})})
+        with stub:
+            return asyncio.run(_measure(main, stub.url, requests, concurrency, logins))
+    finally:
+        main.verify_password_async = original
+
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--requests", type=int, default=400, help="/events requests per phase")
+    parser.add_argument("--concurrency", type=int, default=4)
+    parser.add_argument("--logins", type=int, default=8, help="concurrent login clients")
+    parser.add_argument("--inline", action="store_true", help="run bcrypt on the event loop (old behaviour)")
+    args = parser.parse_args()
+
+    import main as gateway
+    result = measure(gateway, args.requests, args.concurrency, args.logins, args.inline)
+    for phase, stats in result.items():
+        print(f"{phase:>13}: {stats}")
+
+
+if __name__ == "__main__":
+    main()
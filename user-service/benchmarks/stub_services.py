@@ -0,0 +1,147 @@
+"""In-process stand-ins for the Event and Booking services
+
+A StubService is a threaded HTTP server answering from a route table, so the
+gateway's pooled clients, timeouts and circuit breakers run against a real
+socket. Each route is a function of the recorded request returning
+(status, body, headers); body may be a dict/list (sent as JSON) or bytes.
+
+    with StubService({("GET", "/api/events"): lambda req: (200, [], {})}) as stub:
+        downstream.EVENT_SERVICE_BASE_URL = stub.url
+"""
+import json
+import socket
+import threading
+import time
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from urllib.parse import parse_qs, urlsplit
+
+
+class StubRequest:
+    def __init__(self, method, path, query, headers, body):
+        self.method = method
+        self.path = path
+        self.query = query
+        self.headers = headers
+        self.body = body
+
+    def json(self):
+        return json.loads(self.body) if self.body else None
+
+
+class StubService:
+    """Threaded HTTP server; `delay` seconds are slept before every answer"""
+
+    def __init__(self, routes=None, delay=0.0):
+        self.routes = dict(routes or {})
+        self.delay = delay
+        self.requests = []
+        self._lock = threading.Lock()
+        self._server = ThreadingHTTPServer(("127.0.0.1", 0), self._handler())
+        self._server.daemon_threads = True
+        self._thread = None
+
+    @property
+    def url(self):
+        host, port = self._server.server_address
+        return f"http://{host}:{port}"
+
+    def route(self, method, path, handler):
+        self.routes[(method, path)] = handler
+
+    def calls(self, method=None, path=None):
+        with self._lock:
+            return [req for req in self.requests
+                    if (method is None or req.method == method) and (path is None or req.path == path)]
+
+    def _answer(self, method, path):
+        for (route_method, route_path), handler in self.routes.items():
+            if route_method == method and (route_path == path or
+                                           route_path.endswith("/") and path.startswith(route_path)):
+                return handler
+        return None
+
+    def _handler(self):
+        stub = self
+
+        class Handler(BaseHTTPRequestHandler):
+            protocol_version = "HTTP/1.1"
+            disable_nagle_algorithm = True
+
+            def log_message(self, *args):
+                pass
+
+            def _serve(self):
+                url = urlsplit(self.path)
+                length = int(self.headers.get("Content-Length") or 0)
+                req = StubRequest(self.command, url.path, parse_qs(url.query),
+                                  dict(self.headers), self.rfile.read(length) if length else b"")
+                with stub._lock:
+                    stub.requests.append(req)
+                if stub.delay:
+                    time.sleep(stub.delay)
+                handler = stub._answer(self.command, url.path)
+                if handler is None:
+                    status, body, headers = 404, {"error": "not found"}, {}
+                else:
+                    answer = handler(req)
+                    if answer is None:
+                        # Drop the connection without answering
+                        self.connection.shutdown(socket.SHUT_RDWR)
+                        self.close_connection = True
+                        return
+                    status, body, headers = answer
+                if not isinstance(body, bytes):
+                    body = json.dumps(body).encode()
+                    headers = {"Content-Type": "application/json", **headers}
+                self.send_response(status)
+                for name, value in headers.items():
+                    self.send_header(name, value)
+                self.send_header("Content-Length", str(len(body)))
+                self.end_headers()
+                self.wfile.write(body)
+
+            do_GET = do_POST = do_PUT = do_DELETE = _serve
+
+        return Handler
+
+    def __enter__(self):
+        self._thread = threading.Thread(target=self._server.serve_forever, daemon=True)
+        self._thread.start()
+        return self
+
+    def __exit__(self, *exc):
+        self._server.shutdown()
+        self._server.server_close()
+
+
+class gateway_client:
+    """Async context manager: an httpx client calling the gateway app in-process
+
+    Points the downstream clients at the given stubs and opens them the way the
+    app's lifespan would; on exit closes them and the database pool (which is
+    bound to the running event loop).
+
+        async with gateway_client(main, event_stub.url, booking_stub.url) as client:
+            await client.get("/events")
+    """
+
+    def __init__(self, main, event_url, booking_url):
+        self.main = main
+        self.event_url = event_url
+        self.booking_url = booking_url
+        self.client = None
+
+    async def __aenter__(self):
+        import httpx
+        downstream = self.main.downstream
+        downstream.EVENT_SERVICE_BASE_URL = self.event_url
+        downstream.BOOKING_SERVICE_BASE_URL = self.booking_url
+        await downstream.start_clients()
+        self.client = httpx.AsyncClient(transport=httpx.ASGITransport(app=self.main.app),
+                                        base_url="http://gateway")
+        return self.client
+
+    async def __aexit__(self, *exc):
+        await self.client.aclose()
+        await self.main.downstream.close_clients()
+        await self.main.engine.dispose()
@@ -0,0 +1,122 @@
+import asyncio
+import logging
+import os
+from datetime import timedelta
+from sqlalchemy import delete, func, or_, select, update
+import downstream
+from database import SessionLocal
+from models import PendingRelease
+
+# Releases refused by the Event Service, or by reservation id with an unknown
+# outcome, are retried every interval until they succeed or have failed this many times
+RELEASE_RETRY_INTERVAL = float(os.getenv("RELEASE_RETRY_INTERVAL", 5.0))
+RELEASE_RETRY_BATCH = int(os.getenv("RELEASE_RETRY_BATCH", 50))
+RELEASE_MAX_ATTEMPTS = int(os.getenv("RELEASE_MAX_ATTEMPTS", 50))
+# How long a claimed batch is left to one retrier; must cover sending the whole batch
+RELEASE_CLAIM_SECONDS = float(os.getenv("RELEASE_CLAIM_SECONDS", 300))
+
+# Outcomes of one release attempt
+RELEASED = "released"
+RETRY = "retry"      # safe to send again: not applied, or idempotent by reservation id
+DROPPED = "dropped"  # won't be retried (a count that may have been applied, or the event is gone)
+
+
+async def queue_release(event_id, tickets, reservation_id=None):
+    """Store a release to be retried by the ReleaseRetrier"""
+    async with SessionLocal() as db:
+        db.add(PendingRelease(event_id=event_id, tickets=tickets, reservation_id=reservation_id))
+        await db.commit()
+    logging.warning(f"Queued release of {tickets} tickets for event {event_id}")
+
+
+async def claim_pending(batch_size):
+    """Claim a batch of queued releases for this process; returns them detached
+
+    Rows are picked with SKIP LOCKED and marked claimed in one short
+    transaction, so other gateway processes skip them, and no row lock is
+    held while the releases are sent.
+    """
+    async with SessionLocal() as db:
+        rows = (await db.execute(
+            select(PendingRelease)
+            .where(or_(PendingRelease.claimed_until.is_(None), PendingRelease.claimed_until < func.now()))
+            .order_by(PendingRelease.id).limit(batch_size).with_for_update(skip_locked=True)
+        )).scalars().all()
+        if rows:
+            await db.execute(
+                update(PendingRelease)
+                .where(PendingRelease.id.in_([row.id for row in rows]))
+                .values(claimed_until=func.now() + timedelta(seconds=RELEASE_CLAIM_SECONDS))
+            )
+        await db.commit()
+    return rows
+
+
+async def retry_pending(send, batch_size=RELEASE_RETRY_BATCH):
+    """Send one batch of queued releases with `send(event_id, tickets, reservation_id)`; returns how many were released
+
+    Nothing is sent while the Event Service circuit is open. Releases still
+    to retry are unclaimed afterwards, so the next pass picks them up.
+    """
+    if downstream.breaker_open("event"):
+        return 0
+    rows = await claim_pending(batch_size)
+    released = 0
+    done, retry = [], []
+    try:
+        for row in rows:
+            if downstream.breaker_open("event"):
+                break
+            outcome = await send(row.event_id, row.tickets, row.reservation_id)
+            if outcome != RETRY:
+                done.append(row.id)
+            elif row.attempts + 1 >= RELEASE_MAX_ATTEMPTS:
+                logging.error(f"Giving up releasing {row.tickets} tickets for event {row.event_id} "
+                              f"after {row.attempts + 1} attempts")
+                done.append(row.id)
+            else:
+                retry.append(row.id)
+            released += outcome == RELEASED
+    finally:
+        unsent = [row.id for row in rows if row.id not in done and row.id not in retry]
+        async with SessionLocal() as db:
+            if done:
+                await db.execute(delete(PendingRelease).where(PendingRelease.id.in_(done)))
+            if retry:
+                await db.execute(update(PendingRelease).where(PendingRelease.id.in_(retry))
+                                 .values(attempts=PendingRelease.attempts + 1, claimed_until=None))
+            if unsent:
+                await db.execute(update(PendingRelease).where(PendingRelease.id.in_(unsent))
+                                 .values(claimed_until=None))
+            await db.commit()
+    return released
+
+
+class ReleaseRetrier:
+    """Background task running retry_pending every `interval` seconds"""
+
+    def __init__(self, send, interval=RELEASE_RETRY_INTERVAL):
+        self.send = send
+        self.interval = interval
+        self._task = None
+
+    def start(self):
+        self._task = asyncio.create_task(self._run())
+
+    async def stop(self):
+        if self._task is not None:
+            self._task.cancel()
+            try:
+                await self._task
+            except asyncio.CancelledError:
+                pass
+
+    async def _run(self):
+        while True:
+            await asyncio.sleep(self.interval)
+            try:
+                released = await retry_pending(self.send)
+                if released:
+                    logging.info(f"Released {released} queued ticket reservations")
+            except Exception as e:
+                logging.error(f"Release retry failed: {str(e)}")
@@ -0,0 +1,256 @@
+import logging
+import os
+import time
+import httpx
+from metrics import observe_outbound
+
+# Downstream services reached through the gateway
+EVENT_SERVICE_BASE_URL = os.getenv("EVENT_SERVICE_BASE_URL", "http://event-service:5000")
+BOOKING_SERVICE_BASE_URL = os.getenv("BOOKING_SERVICE_BASE_URL", "http://booking-service:5003")
+
+# Connection pool settings (applied per downstream host)
+HTTP_MAX_CONNECTIONS = int(os.getenv("HTTP_MAX_CONNECTIONS", 100))
+HTTP_MAX_KEEPALIVE_CONNECTIONS = int(os.getenv("HTTP_MAX_KEEPALIVE_CONNECTIONS", 20))
+HTTP_KEEPALIVE_EXPIRY = float(os.getenv("HTTP_KEEPALIVE_EXPIRY", 30.0))
+HTTP2_ENABLED = os.getenv("HTTP2_ENABLED", "false").lower() == "true"
+HTTP_CONNECT_TIMEOUT = float(os.getenv("HTTP_CONNECT_TIMEOUT", 2.0))
+
+# Per-endpoint read timeouts in seconds
+ENDPOINT_TIMEOUTS = {
+    "fetch_event": float(os.getenv("TIMEOUT_FETCH_EVENT", 5.0)),
+    "edit_event": float(os.getenv("TIMEOUT_EDIT_EVENT", 5.0)),
+    "reserve_tickets": float(os.getenv("TIMEOUT_RESERVE_TICKETS", 5.0)),
+    "release_tickets": float(os.getenv("TIMEOUT_RELEASE_TICKETS", 5.0)),
+    "list_events": float(os.getenv("TIMEOUT_LIST_EVENTS", 10.0)),
+    "batch_events": float(os.getenv("TIMEOUT_BATCH_EVENTS", 5.0)),
+    "list_bookings": float(os.getenv("TIMEOUT_LIST_BOOKINGS", 5.0)),
+    "create_event": float(os.getenv("TIMEOUT_CREATE_EVENT", 10.0)),
+    "create_booking": float(os.getenv("TIMEOUT_CREATE_BOOKING", 10.0)),
+}
+
+# Load shedding: requests beyond this many in flight per downstream get a 503 at once
+DOWNSTREAM_MAX_IN_FLIGHT = int(os.getenv("DOWNSTREAM_MAX_IN_FLIGHT", 64))
+
+# Circuit breaker: open after this many consecutive failures, probe again after the reset timeout
+BREAKER_FAILURE_THRESHOLD = int(os.getenv("BREAKER_FAILURE_THRESHOLD", 5))
+BREAKER_RESET_TIMEOUT = float(os.getenv("BREAKER_RESET_TIMEOUT", 10.0))
+BREAKER_HALF_OPEN_PROBES = int(os.getenv("BREAKER_HALF_OPEN_PROBES", 1))
+
+_clients = {}
+_stats = {}
+_breakers = {}
+
+
+class DownstreamUnavailable(Exception):
+    """A call was refused locally because the downstream is failing or saturated"""
+
+    def __init__(self, service, reason):
+        super().__init__(f"{service} service unavailable ({reason})")
+        self.service = service
+        self.reason = reason
+
+
+class CircuitBreaker:
+    """Closed -> open after `threshold` consecutive failures -> half-open after `reset_timeout`
+
+    While half-open only `probes` calls at a time are let through; one success
+    closes the breaker again, one failure re-opens it.
+    """
+
+    def __init__(self, name, threshold, reset_timeout, probes=1):
+        self.name = name
+        self.threshold = threshold
+        self.reset_timeout = reset_timeout
+        self.probes = probes
+        self.state = "closed"
+        self.failures = 0
+        self.opened_at = 0.0
+        self.probing = 0
+        self.rejected = 0
+        self.trips = 0
+
+    def allow(self):
+        """Whether a call may go out; returns True if it is a half-open probe"""
+        if self.state == "open":
+            if time.monotonic() - self.opened_at < self.reset_timeout:
+                self.rejected += 1
+                raise DownstreamUnavailable(self.name, "circuit open")
+            self.state = "half_open"
+            self.probing = 0
+        if self.state == "half_open":
+            if self.probing >= self.probes:
+                self.rejected += 1
+                raise DownstreamUnavailable(self.name, "circuit half-open")
+            self.probing += 1
+            return True
+        return False
+
+    def record(self, ok, probe):
+        """Outcome of a call; ok=None (e.g. cancelled) counts neither way"""
+        if probe:
+            self.probing -= 1
+        if ok is None:
+            return
+        if ok:
+            self.failures = 0
+            if self.state != "closed":
+                logging.info(f"Circuit for {self.name} service closed")
+            self.state = "closed"
+            return
+        self.failures += 1
+        if self.state == "half_open" or self.failures >= self.threshold:
+            if self.state != "open":
+                self.trips += 1
+                logging.warning(f"Circuit for {self.name} service opened after {self.failures} failures")
+            self.state = "open"
+            self.opened_at = time.monotonic()
+
+    def stats(self):
+        return {"state": self.state, "consecutive_failures": self.failures,
+                "rejected": self.rejected, "trips": self.trips}
+
+
+def _new_client(base_url):
+    limits = httpx.Limits(
+        max_connections=HTTP_MAX_CONNECTIONS,
+        max_keepalive_connections=HTTP_MAX_KEEPALIVE_CONNECTIONS,
+        keepalive_expiry=HTTP_KEEPALIVE_EXPIRY,
+    )
+    return httpx.AsyncClient(
+        base_url=base_url,
+        limits=limits,
+        http2=HTTP2_ENABLED,
+        timeout=httpx.Timeout(10.0, connect=HTTP_CONNECT_TIMEOUT),
+    )
+
+
+async def start_clients():
+    """Create one pooled client per downstream host (called at app startup)"""
+    _clients["event"] = _new_client(EVENT_SERVICE_BASE_URL)
+    _clients["booking"] = _new_client(BOOKING_SERVICE_BASE_URL)
+    for name in _clients:
+        _stats[name] = {"requests": 0, "in_flight": 0, "errors": 0, "shed": 0}
+        _breakers[name] = CircuitBreaker(name, BREAKER_FAILURE_THRESHOLD, BREAKER_RESET_TIMEOUT,
+                                         BREAKER_HALF_OPEN_PROBES)
+
+
+async def close_clients():
+    """Close all pooled clients (called at app shutdown)"""
+    for client in _clients.values():
+        await client.aclose()
+    _clients.clear()
+
+
+def endpoint_timeout(endpoint):
+    return httpx.Timeout(ENDPOINT_TIMEOUTS[endpoint], connect=HTTP_CONNECT_TIMEOUT)
+
+
+def breaker_open(service):
+    """True while calls to `service` are refused outright (open and not yet due a probe)"""
+    breaker = _breakers[service]
+    return breaker.state == "open" and time.monotonic() - breaker.opened_at < breaker.reset_timeout
+
+
+def _admit(service):
+    """Shed load or refuse the call before it is sent; returns the probe flag"""
+    stats = _stats[service]
+    if stats["in_flight"] >= DOWNSTREAM_MAX_IN_FLIGHT:
+        stats["shed"] += 1
+        raise DownstreamUnavailable(service, "too many requests in flight")
+    probe = _breakers[service].allow()
+    stats["requests"] += 1
+    stats["in_flight"] += 1
+    return probe
+
+
+def _finish(service, probe, ok, method, status, started):
+    observe_outbound(service, method, status, time.perf_counter() - started)
+    _stats[service]["in_flight"] -= 1
+    if ok is False:
+        _stats[service]["errors"] += 1
+    _breakers[service].record(ok, probe)
+
+
+async def request(service, endpoint, method, path, **kwargs):
+    """Send a request to a downstream service over its shared connection pool
+
+    Raises DownstreamUnavailable without sending anything when the service is
+    saturated or its circuit is open. Transport errors and 5xx responses count
+    as breaker failures.
+    """
+    client = _clients[service]
+    kwargs.setdefault("timeout", endpoint_timeout(endpoint))
+    probe = _admit(service)
+    ok = None
+    status = "error"
+    started = time.perf_counter()
+    try:
+        response = await client.request(method, path, **kwargs)
+        status = response.status_code
+        ok = status < 500
+        return response
+    except httpx.HTTPError:
+        ok = False
+        raise
+    finally:
+        _finish(service, probe, ok, method, status, started)
+
+
+async def request_raw(service, endpoint, method, path, **kwargs):
+    """Like request(), but returns (response, body) with the body still encoded
+
+    The body is read with aiter_raw(), so a gzip/br payload can be relayed to
+    the caller without decompressing and re-compressing it.
+    """
+    client = _clients[service]
+    kwargs.setdefault("timeout", endpoint_timeout(endpoint))
+    probe = _admit(service)
+    ok = None
+    status = "error"
+    started = time.perf_counter()
+    try:
+        response = await client.send(client.build_request(method, path, **kwargs), stream=True)
+        try:
+            body = b"".join([chunk async for chunk in response.aiter_raw()])
+        finally:
+            await response.aclose()
+        status = response.status_code
+        ok = status < 500
+        return response, body
+    except httpx.HTTPError:
+        ok = False
+        raise
+    finally:
+        _finish(service, probe, ok, method, status, started)
+
+
+def _pool_connections(client):
+    """The httpcore connections currently held by a client's pool
+
+    httpx has no public API for this, so it reads AsyncHTTPTransport._pool
+    (an httpcore.AsyncConnectionPool). tests/test_http_pool.py pins that
+    contract: it fails, instead of the stats quietly reporting zero, when an
+    httpx upgrade moves it.
+    """
+    return list(client._transport._pool.connections)
+
+
+def pool_stats():
+    """Report connection pool usage for every downstream client"""
+    report = {}
+    for name, client in _clients.items():
+        connections = _pool_connections(client)
+        idle = sum(1 for conn in connections if conn.is_idle())
+        report[name] = {
+            "base_url": str(client.base_url),
+            "http2": HTTP2_ENABLED,
+            "max_connections": HTTP_MAX_CONNECTIONS,
+            "max_keepalive_connections": HTTP_MAX_KEEPALIVE_CONNECTIONS,
+            "open_connections": len(connections),
+            "idle_connections": idle,
+            "active_connections": len(connections) - idle,
+            "max_in_flight": DOWNSTREAM_MAX_IN_FLIGHT,
+            **_stats[name],
+            "circuit": _breakers[name].stats(),
+        }
+    return report
@@ -1,22 +1,59 @@
-from fastapi import FastAPI, Depends, HTTPException, status
+from fastapi import FastAPI, Depends, Header, HTTPException, Query, Request, Response, status
 from fastapi.security import OAuth2PasswordBearer
-from sqlalchemy.orm import Session
+from sqlalchemy import select
+from sqlalchemy.ext.asyncio import AsyncSession
 from database import SessionLocal, engine
 from models import User
-from auth import get_password_hash, verify_password, create_access_token
+from auth import get_password_hash_async, verify_password_async, create_access_token
 import logging
+import os
+import asyncio
+import uuid
 from database import SessionLocal, engine, Base 
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import JSONResponse
 from pydantic import BaseModel, Field
 from typing import Optional, List
 import httpx
 from fastapi import HTTPException, status
+from contextlib import asynccontextmanager
+import downstream
+import compensation
+from cache import TTLCache
+from metrics import instrument_fastapi, instrument_sqlalchemy_pool
 
-# Add configuration
-EVENT_SERVICE_URL = "http://event-service:5000/events" 
-BOOKING_SERVICE_URL = "http://booking-service:5003/bookings"
+# Add configuration (paths relative to the pooled downstream clients)
+EVENT_SERVICE_URL = "/events"
+EVENT_API_URL = "/api/events"
 
-app = FastAPI()
+# Short-lived client-side cache of event lookups (0 disables it)
+EVENT_CLIENT_CACHE_TTL = float(os.getenv("EVENT_CLIENT_CACHE_TTL", 2.0))
+event_cache = TTLCache(maxsize=int(os.getenv("EVENT_CLIENT_CACHE_SIZE", 1000)), ttl=EVENT_CLIENT_CACHE_TTL)
+# Last known copy of each event, served while the Event Service circuit is open (0 disables it)
+EVENT_STALE_TTL = float(os.getenv("EVENT_STALE_TTL", 300.0))
+stale_event_cache = TTLCache(maxsize=int(os.getenv("EVENT_CLIENT_CACHE_SIZE", 1000)), ttl=EVENT_STALE_TTL)
+BOOKING_SERVICE_URL = "/bookings"
+# Bookings per dashboard page; older ones are reached through next_cursor
+DASHBOARD_BOOKINGS_LIMIT = int(os.getenv("DASHBOARD_BOOKINGS_LIMIT", 50))
+# Extra attempts at the Booking Service on timeouts; safe because every attempt carries the same Idempotency-Key
+BOOKING_CREATE_RETRIES = int(os.getenv("BOOKING_CREATE_RETRIES", 2))
+
+@asynccontextmanager
+async def lifespan(app: FastAPI):
+    # Initialize database
+    async with engine.begin() as conn:
+        await conn.run_sync(Base.metadata.create_all)
+    # One pooled HTTP client per downstream host for the whole process
+    await downstream.start_clients()
+    release_retrier.start()
+    yield
+    await release_retrier.stop()
+    await downstream.close_clients()
+    await engine.dispose()
+
+app = FastAPI(lifespan=lifespan)
+instrument_fastapi(app)
+instrument_sqlalchemy_pool(engine, "user")
 
 # Enable CORS
 app.add_middleware(
@@ -30,6 +67,15 @@ app.add_middleware(
 # Configure logging
 logging.basicConfig(level=logging.INFO)
 
+# Calls refused by a circuit breaker or load shedding fail fast instead of queueing
+@app.exception_handler(downstream.DownstreamUnavailable)
+async def downstream_unavailable(request: Request, exc: downstream.DownstreamUnavailable):
+    return JSONResponse(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        content={"detail": str(exc)},
+        headers={"Retry-After": str(int(downstream.BREAKER_RESET_TIMEOUT))}
+    )
+
 # ========== Pydantic Models ==========
 class UserRegister(BaseModel):
     email: str
@@ -49,28 +95,26 @@ class Token(BaseModel):
 
 
 
-# Initialize database
-Base.metadata.create_all(bind=engine)
-
 # Dependency to get DB session
-def get_db():
-    db = SessionLocal()
-    try:
+async def get_db():
+    async with SessionLocal() as db:
         yield db
-    finally:
-        db.close()
+
+async def get_user_by(db: AsyncSession, *criteria):
+    result = await db.execute(select(User).where(*criteria))
+    return result.scalars().first()
 
 # Registration endpoint - Updated to use Pydantic model
 @app.post("/register", response_model=dict)
-async def register_user(user: UserRegister, db: Session = Depends(get_db)):
-    existing_user = db.query(User).filter(User.email == user.email).first()
+async def register_user(user: UserRegister, db: AsyncSession = Depends(get_db)):
+    existing_user = await get_user_by(db, User.email == user.email)
     if existing_user:
         raise HTTPException(
             status_code=status.HTTP_409_CONFLICT,
             detail="Email already registered"
         )
     
-    hashed_password = get_password_hash(user.password)
+    hashed_password = await get_password_hash_async(user.password)
     new_user = User(
         email=user.email,
         password_hash=hashed_password,
@@ -78,16 +122,16 @@ async def register_user(user: UserRegister, db: Session = Depends(get_db)):
     )
     
     db.add(new_user)
-    db.commit()
+    await db.commit()
     logging.info(f"New user registered: {user.email}")
     return {"message": "User registered successfully"}
 
 # Login endpoint - Updated to use Pydantic model
 @app.post("/login", response_model=Token)
-async def login(user: UserLogin, db: Session = Depends(get_db)):
-    db_user = db.query(User).filter(User.email == user.username).first()
+async def login(user: UserLogin, db: AsyncSession = Depends(get_db)):
+    db_user = await get_user_by(db, User.email == user.username)
     
-    if not db_user or not verify_password(user.password, db_user.password_hash):
+    if not db_user or not await verify_password_async(user.password, db_user.password_hash):
         raise HTTPException(
             status_code=status.HTTP_401_UNAUTHORIZED,
             detail="Invalid credentials",
@@ -108,8 +152,8 @@ async def login(user: UserLogin, db: Session = Depends(get_db)):
 
 # Profile management endpoint
 @app.get("/users/{user_id}", response_model=dict)
-async def get_user(user_id: int, db: Session = Depends(get_db)):
-    user = db.query(User).filter(User.id == user_id).first()
+async def get_user(user_id: int, db: AsyncSession = Depends(get_db)):
+    user = await get_user_by(db, User.id == user_id)
     if not user:
         raise HTTPException(
             status_code=status.HTTP_404_NOT_FOUND,
@@ -126,14 +170,79 @@ async def get_user(user_id: int, db: Session = Depends(get_db)):
 
 # Define fetch_event function
 async def fetch_event(event_id: str):
-    async with httpx.AsyncClient() as client:
-        response = await client.get(f"{EVENT_SERVICE_URL}/{event_id}")
-        return response.json() if response.status_code == 200 else None 
+    if EVENT_CLIENT_CACHE_TTL > 0:
+        cached = event_cache.get(event_id)
+        if cached is not None:
+            return cached
+    generation = event_cache.generation()
+    try:
+        response = await downstream.request("event", "fetch_event", "GET", f"{EVENT_SERVICE_URL}/{event_id}")
+    except (httpx.HTTPError, downstream.DownstreamUnavailable):
+        # Fall back to the last known copy while the Event Service is down
+        stale = stale_event_cache.get(event_id) if EVENT_STALE_TTL > 0 else None
+        if stale is None:
+            raise
+        logging.warning(f"Serving stale copy of event {event_id}")
+        return stale
+    if response.status_code != 200:
+        return None
+    event = response.json()
+    if EVENT_CLIENT_CACHE_TTL > 0:
+        event_cache.set(event_id, event, generation)
+    if EVENT_STALE_TTL > 0:
+        stale_event_cache.set(event_id, event)
+    return event
 
 async def edit_event(event_id: str, data: dict):
-    async with httpx.AsyncClient() as client:
-        response = await client.put(f"{EVENT_SERVICE_URL}/{event_id}/edit", json=data)
-        return response.json() if response.status_code == 200 else None
+    response = await downstream.request("event", "edit_event", "PUT", f"{EVENT_SERVICE_URL}/{event_id}/edit", json=data)
+    event_cache.invalidate(event_id)
+    return response.json() if response.status_code == 200 else None
+
+def error_detail(response, default):
+    """The "error" of a downstream error response, or `default` if its body isn't one"""
+    try:
+        body = response.json()
+    except ValueError:
+        return default
+    return (body.get("error") or default) if isinstance(body, dict) else default
+
+async def reserve_tickets(event_id: str, tickets: int, reservation_id: str):
+    """Atomically reserve tickets in the Event Service under `reservation_id`; returns the response"""
+    event_cache.invalidate(event_id)
+    return await downstream.request("event", "reserve_tickets", "POST", f"{EVENT_API_URL}/{event_id}/reserve",
+                                    json={"tickets": tickets, "reservation_id": reservation_id})
+
+async def send_release(event_id: str, tickets: int, reservation_id: Optional[str] = None):
+    """One attempt at giving reserved tickets back; returns a compensation outcome
+
+    With a reservation_id the Event Service releases that reservation at most
+    once, and only if it took tickets, so a release with an unknown outcome is
+    retried; without one it is dropped.
+    """
+    event_cache.invalidate(event_id)
+    body = {"tickets": tickets, "reservation_id": reservation_id} if reservation_id else {"tickets": tickets}
+    try:
+        response = await downstream.request("event", "release_tickets", "POST", f"{EVENT_API_URL}/{event_id}/release", json=body)
+    except (downstream.DownstreamUnavailable, httpx.ConnectError, httpx.ConnectTimeout) as e:
+        logging.warning(f"Release of {tickets} tickets for event {event_id} not sent: {str(e)}")
+        return compensation.RETRY
+    except httpx.HTTPError as e:
+        # It may have been applied: a release by reservation id is safe to send
+        # again, but a bare count could give the tickets back twice
+        logging.error(f"Release of {tickets} tickets for event {event_id} may not have been applied: {str(e)}")
+        return compensation.RETRY if reservation_id else compensation.DROPPED
+    if response.status_code == 200:
+        return compensation.RELEASED
+    logging.error(f"Failed to release {tickets} tickets for event {event_id}: {response.text}")
+    return compensation.DROPPED if response.status_code == 404 else compensation.RETRY
+
+async def release_tickets(event_id: str, tickets: int, reservation_id: Optional[str] = None):
+    """Give reserved tickets back, queueing the release for retry if the Event Service refused it"""
+    if await send_release(event_id, tickets, reservation_id) == compensation.RETRY:
+        await compensation.queue_release(event_id, tickets, reservation_id)
+
+# Retries queued releases once the Event Service accepts calls again (started in lifespan)
+release_retrier = compensation.ReleaseRetrier(send_release)
 
 from fastapi import HTTPException, status
 
@@ -147,12 +256,21 @@ class BookingCreate(BaseModel):
 @app.post("/bookings", response_model=dict)
 async def create_booking(
     booking: BookingCreate,  # Your existing Pydantic model
-    db: Session = Depends(get_db)
+    db: AsyncSession = Depends(get_db),
+    idempotency_key: Optional[str] = Header(None)
 ):
+    """Create a booking; retries with the same Idempotency-Key get the first result
+
+    Answers 504 with the Idempotency-Key it used when the Booking Service may
+    have made the booking without confirming it; retrying with that key is safe.
+    Answers 503, or 504 if the reserve timed out, when tickets can't be reserved.
+    """
     # Fetch user details (including email) from the User Service database
-    user = db.query(User).filter(User.id == booking.user_id).first()
+    user = await get_user_by(db, User.id == booking.user_id)
     if not user:
         raise HTTPException(status_code=404, detail="User not found")
+    # Return the DB connection to the pool before the downstream calls
+    await db.close()
 
     # Calculate amount using Event Service
     event = await fetch_event(booking.event_id)
@@ -160,67 +278,125 @@ async def create_booking(
         raise HTTPException(status_code=404, detail="Event not found") 
     amount = booking.tickets * event["price"]
 
+    # Take the tickets atomically first so concurrent bookings can't oversell.
+    # The reservation id lets them be released exactly once, and tells a
+    # booking replay apart from the booking these tickets pay for.
+    reservation_id = uuid.uuid4().hex
+    try:
+        reservation = await reserve_tickets(booking.event_id, booking.tickets, reservation_id)
+    except (downstream.DownstreamUnavailable, httpx.ConnectError, httpx.ConnectTimeout):
+        # Never sent, so nothing was reserved
+        raise HTTPException(status_code=503, detail="Event service unavailable")
+    except httpx.HTTPError as e:
+        # The reserve may have been applied; releasing by id is a no-op if it wasn't
+        logging.warning(f"Reserve {reservation_id} for event {booking.event_id} timed out: {str(e)}")
+        await compensation.queue_release(booking.event_id, booking.tickets, reservation_id)
+        raise HTTPException(status_code=504, detail="Ticket reservation timed out")
+    if reservation.status_code == 409:
+        raise HTTPException(status_code=409, detail="Not enough tickets available")
+    if reservation.status_code >= 500:
+        await compensation.queue_release(booking.event_id, booking.tickets, reservation_id)
+        raise HTTPException(status_code=503, detail="Event service unavailable")
+    if reservation.status_code != 200:
+        raise HTTPException(status_code=reservation.status_code,
+                            detail=error_detail(reservation, "Ticket reservation failed"))
+
     # Call Booking Service with user_email
     booking_data = {
         "user_id": booking.user_id,
         "event_id": booking.event_id,
         "tickets": booking.tickets,
         "amount": amount,
-        "user_email": user.email  # ✅ Critical addition
+        "user_email": user.email,  # ✅ Critical addition
+        "reservation_id": reservation_id
     }
 
-    async with httpx.AsyncClient() as client:
-        response = await client.post(BOOKING_SERVICE_URL, json=booking_data, timeout=30.0)
-        # if response is ok mean booking confirmed then edit the event tickets
-        if response.status_code == 201:
-            # Update event tickets
-            new_tickets_available = event["tickets_available"] - booking.tickets
-            edit_data = {
-                         "name": event["name"],
-                         "location": event["location"],
-                            "date": event["date"],
-                            "price": event["price"],
-                            "tickets_available": new_tickets_available,
-                            "description": event["description"],
-                            "picture": event["picture"]
-                        }
-            await edit_event(booking.event_id, edit_data)
-    return response.json()
+    # Our own retries below reuse one key even when the client didn't send one
+    key = idempotency_key or uuid.uuid4().hex
+    headers = {"Idempotency-Key": key}
+    # Set once an attempt may have reached the Booking Service (e.g. timed out
+    # waiting for the answer): from then on the booking may exist
+    maybe_sent = False
+    for attempt in range(BOOKING_CREATE_RETRIES + 1):
+        try:
+            response = await downstream.request("booking", "create_booking", "POST", BOOKING_SERVICE_URL,
+                                                json=booking_data, headers=headers)
+            break
+        except (httpx.HTTPError, downstream.DownstreamUnavailable) as e:
+            # Refused locally or never connected: that attempt sent nothing
+            maybe_sent = maybe_sent or not isinstance(e, (downstream.DownstreamUnavailable, httpx.ConnectError,
+                                                          httpx.ConnectTimeout))
+            if isinstance(e, httpx.TransportError) and attempt < BOOKING_CREATE_RETRIES:
+                continue
+            if maybe_sent:
+                # The booking may have committed with our reservation: keep it, and
+                # let the client find out by retrying with the same key
+                logging.warning(f"Booking outcome unknown for Idempotency-Key {key}: {str(e)}")
+                raise HTTPException(status_code=504, headers={"Idempotency-Key": key},
+                                    detail="Booking outcome unknown; retry with the same Idempotency-Key")
+            await release_tickets(booking.event_id, booking.tickets, reservation_id)
+            raise HTTPException(status_code=503, detail="Booking service unavailable")
+    if response.status_code != 201:
+        await release_tickets(booking.event_id, booking.tickets, reservation_id)
+        raise HTTPException(status_code=response.status_code if response.status_code in (400, 422) else 502,
+                            detail=error_detail(response, "Booking failed"))
+    # A replay names the reservation its booking used: the one an earlier
+    # attempt of ours sent, or that of an earlier client request
+    created = response.json()
+    if response.headers.get("idempotent-replayed") == "true" and created.get("reservation_id") != reservation_id:
+        await release_tickets(booking.event_id, booking.tickets, reservation_id)
+    return created
 
 # ... (previous imports)
 from bson import ObjectId  # Add this import
 
-# ========== Updated Pydantic Models ==========
-class EventResponse(BaseModel):
-    id: str = Field(..., alias= "_id" )
-    name: str
-    location: str
-    date: str  # Now matches raw date string from MongoDB
-    price: float
-    tickets_available: int
-    description: str
-    picture: str
-    class Config:
-        populate_by_name = True
-
-   
-
 # ========== Updated Endpoint ==========
-@app.get("/events", response_model=List[EventResponse])
+# Headers relayed from the Event Service listing response
+PASSTHROUGH_HEADERS = ("content-encoding", "vary", "etag", "x-next-cursor", "x-total-count", "x-total-pages", "x-page")
+
+# The Event Service body is relayed as-is (possibly compressed), so FastAPI must not re-validate it
+@app.get("/events", response_class=Response)
 async def get_events(
+    request: Request,
     search: Optional[str] = None,
+    mode: Optional[str] = None,
     page: int = 1,
-    db: Session = Depends(get_db)
+    per_page: Optional[int] = None,
+    after: Optional[str] = None,
+    fields: Optional[str] = None,
+    date_from: Optional[str] = None,
+    date_to: Optional[str] = None,
+    price_min: Optional[float] = None,
+    price_max: Optional[float] = None,
+    location: Optional[str] = None,
+    available: Optional[bool] = None,
+    sort: Optional[str] = None
 ):
     try:
-        async with httpx.AsyncClient() as client:
-            params = {"search": search, "page": page}
-            response = await client.get(EVENT_SERVICE_URL, params=params)
-            response.raise_for_status()
-            
-            data = response.json()
-            # Explicitly validate each event
-            return [EventResponse(**event) for event in data['events']]
+        params = {"search": search, "mode": mode, "page": page, "per_page": per_page,
+                  "after": after, "fields": fields, "envelope": "0",
+                  "date_from": date_from, "date_to": date_to, "price_min": price_min,
+                  "price_max": price_max, "location": location, "sort": sort,
+                  "available": "1" if available else None}
+        params = {key: value for key, value in params.items() if value is not None}
+        # Let the Event Service compress for our caller, then relay its bytes untouched
+        headers = {"Accept-Encoding": request.headers.get("accept-encoding", "identity")}
+        # Conditional GET: the Event Service answers 304 if the client's copy is current
+        if "if-none-match" in request.headers:
+            headers["If-None-Match"] = request.headers["if-none-match"]
+        upstream, body = await downstream.request_raw("event", "list_events", "GET", EVENT_API_URL,
+                                                      params=params, headers=headers)
+        if upstream.status_code == 400:
+            raise HTTPException(status_code=400, detail="Invalid event listing parameters")
+        if upstream.status_code == 304:
+            return Response(status_code=304, headers={"ETag": upstream.headers["etag"]})
+        upstream.raise_for_status()
+
+        return Response(
+            content=body,
+            media_type="application/json",
+            headers={name: upstream.headers[name] for name in PASSTHROUGH_HEADERS if name in upstream.headers}
+        )
             
     except httpx.HTTPError as e:
         logging.error(f"Event service error: {str(e)}")
@@ -241,9 +417,79 @@ class Event(BaseModel):
 @app.post("/create")
 async def create(event: Event):
     url = f"{EVENT_SERVICE_URL}/create"  # Update this if Flask runs on a different host/port
-    async with httpx.AsyncClient() as client:
-        response = await client.post(url, json=event.model_dump())
-        return {
-            "status_code": response.status_code,
-            "response": response.json()
-        }
\ No newline at end of file
+    response = await downstream.request("event", "create_event", "POST", url, json=event.model_dump())
+    return {
+        "status_code": response.status_code,
+        "response": response.json()
+    }
+
+# Connection pool usage for the shared downstream clients
+@app.get("/stats/http-pool")
+async def http_pool_stats():
+    return downstream.pool_stats()
+
+# Hit/miss counters for the client-side event cache
+@app.get("/stats/event-cache")
+async def event_cache_stats():
+    return {**event_cache.stats(), "stale": stale_event_cache.stats()}
+
+async def fetch_user_bookings(user_id: int, limit: int, after: Optional[str] = None):
+    """One page of a user's bookings, newest first; returns (bookings, next_cursor)"""
+    params = {"user_id": user_id, "limit": limit}
+    if after:
+        params["after"] = after
+    response = await downstream.request("booking", "list_bookings", "GET", BOOKING_SERVICE_URL, params=params)
+    if response.status_code == 400:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid bookings cursor")
+    response.raise_for_status()
+    body = response.json()
+    return body["bookings"], body.get("next_cursor")
+
+async def fetch_events_batch(event_ids: List[str], fields: Optional[List[str]] = None):
+    if not event_ids:
+        return []
+    response = await downstream.request("event", "batch_events", "POST", f"{EVENT_API_URL}/batch", json={"ids": event_ids, "fields": fields})
+    response.raise_for_status()
+    return response.json()["events"]
+
+# User dashboard: profile, bookings and booked events in about three round trips.
+# Bookings come a page at a time: pass the returned next_cursor as `after` for older ones.
+@app.get("/users/{user_id}/dashboard", response_model=dict)
+async def get_dashboard(
+    user_id: int,
+    limit: int = Query(DASHBOARD_BOOKINGS_LIMIT, ge=1, le=200),
+    after: Optional[str] = None,
+    db: AsyncSession = Depends(get_db)
+):
+    try:
+        # Both are awaited even if one fails, so the session is never closed
+        # while the user query is still running on it
+        user, page = await asyncio.gather(
+            get_user_by(db, User.id == user_id),
+            fetch_user_bookings(user_id, limit, after),
+            return_exceptions=True
+        )
+        for result in (user, page):
+            if isinstance(result, BaseException):
+                raise result
+        bookings, next_cursor = page
+        if not user:
+            raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="User not found")
+        await db.close()
+
+        event_ids = list(dict.fromkeys(booking["event_id"] for booking in bookings))
+        events = await fetch_events_batch(event_ids, ["name", "location", "date", "price", "picture"])
+    except httpx.HTTPError as e:
+        logging.error(f"Dashboard downstream error: {str(e)}")
+        raise HTTPException(
+            status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+            detail="Downstream service unavailable"
+        )
+
+    events_by_id = dict(zip(event_ids, events))
+    return {
+        "user": {"id": user.id, "email": user.email, "name": user.name},
+        "bookings": [{**booking, "event": events_by_id.get(booking["event_id"])} for booking in bookings],
+        "has_more_bookings": next_cursor is not None,
+        "next_cursor": next_cursor
+    }
@@ -0,0 +1,244 @@
+"""Minimal Prometheus instrumentation shared by the services
+
+Each service image ships its own copy of this file; keep them identical.
+Metrics are plain in-process counters behind one lock each, rendered in the
+Prometheus text format at /metrics. Values computed on demand (pool gauges,
+cross-process counters) are registered as callbacks and only read at scrape
+time, so they cost nothing per request.
+"""
+import threading
+import time
+from bisect import bisect_left
+
+CONTENT_TYPE = "text/plain; version=0.0.4; charset=utf-8"
+
+# Request latency buckets in seconds
+DEFAULT_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0)
+
+
+def _escape(value):
+    return str(value).replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+
+def _labels(names, values, extra=""):
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+
+def _number(value):
+    if value == float("inf"):
+        return "+Inf"
+    return repr(float(value)) if isinstance(value, float) else str(value)
+
+
+class Counter:
+    def __init__(self, name, help, labels=()):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def inc(self, *label_values, amount=1):
+        with self._lock:
+            self._values[label_values] = self._values.get(label_values, 0) + amount
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} counter"]
+        with self._lock:
+            items = list(self._values.items())
+        for label_values, value in items:
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+
+class Histogram:
+    def __init__(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        self.name = name
+        self.help = help
+        self.labels = tuple(labels)
+        self.buckets = tuple(buckets)
+        # label values -> [per-bucket counts (last is +Inf), sum]
+        self._values = {}
+        self._lock = threading.Lock()
+
+    def observe(self, seconds, *label_values):
+        index = bisect_left(self.buckets, seconds)
+        with self._lock:
+            entry = self._values.get(label_values)
+            if entry is None:
+                entry = self._values[label_values] = [[0] * (len(self.buckets) + 1), 0.0]
+            entry[0][index] += 1
+            entry[1] += seconds
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} histogram"]
+        with self._lock:
+            items = [(label_values, list(counts), total) for label_values, (counts, total) in self._values.items()]
+        for label_values, counts, total in items:
+            cumulative = 0
+            for bound, count in zip(self.buckets + (float("inf"),), counts):
+                cumulative += count
+                le = f'le="{_number(bound)}"'
+                lines.append(f"{self.name}_bucket{_labels(self.labels, label_values, le)} {cumulative}")
+            lines.append(f"{self.name}_sum{_labels(self.labels, label_values)} {_number(total)}")
+            lines.append(f"{self.name}_count{_labels(self.labels, label_values)} {cumulative}")
+        return lines
+
+
+class Callback:
+    """Gauge or counter whose samples come from `collect()` at scrape time
+
+    collect() returns {label values tuple: number}.
+    """
+
+    def __init__(self, name, help, kind, labels, collect):
+        self.name = name
+        self.help = help
+        self.kind = kind
+        self.labels = tuple(labels)
+        self.collect = collect
+
+    def render(self):
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        for label_values, value in self.collect().items():
+            lines.append(f"{self.name}{_labels(self.labels, label_values)} {_number(value)}")
+        return lines
+
+
+class Registry:
+    def __init__(self):
+        self._metrics = []
+        self.scrape_seconds = 0.0
+
+    def register(self, metric):
+        self._metrics.append(metric)
+        return metric
+
+    def counter(self, name, help, labels=()):
+        return self.register(Counter(name, help, labels))
+
+    def histogram(self, name, help, labels=(), buckets=DEFAULT_BUCKETS):
+        return self.register(Histogram(name, help, labels, buckets))
+
+    def gauge_callback(self, name, help, collect, labels=()):
+        return self.register(Callback(name, help, "gauge", labels, collect))
+
+    def counter_callback(self, name, help, collect, labels=()):
+        return self.register(Callback(name, help, "counter", labels, collect))
+
+    def render(self):
+        started = time.perf_counter()
+        lines = []
+        for metric in self._metrics:
+            try:
+                lines.extend(metric.render())
+            except Exception as e:
+                lines.append(f"# {metric.name} unavailable: {_escape(e)}")
+        lines.append("# HELP metrics_scrape_duration_seconds Time spent rendering the previous scrape")
+        lines.append("# TYPE metrics_scrape_duration_seconds gauge")
+        lines.append(f"metrics_scrape_duration_seconds {_number(self.scrape_seconds)}")
+        self.scrape_seconds = time.perf_counter() - started
+        return "\n".join(lines) + "\n"
+
+
+REGISTRY = Registry()
+
+http_requests = REGISTRY.counter(
+    "http_requests_total", "HTTP requests handled, by route template", ("method", "route", "status"))
+http_latency = REGISTRY.histogram(
+    "http_request_duration_seconds", "HTTP request latency, by route template", ("method", "route"))
+outbound_latency = REGISTRY.histogram(
+    "outbound_http_duration_seconds", "Latency of calls to other services", ("service", "method", "status"))
+mongo_latency = REGISTRY.histogram(
+    "mongodb_command_duration_seconds", "MongoDB command latency", ("command", "outcome"),
+    buckets=(0.001, 0.0025, 0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0))
+rabbitmq_published = REGISTRY.counter(
+    "rabbitmq_messages_published_total", "Messages published to RabbitMQ", ("queue",))
+
+
+def observe_outbound(service, method, status, seconds):
+    """Record one call to another service (status is the HTTP code or 'error')"""
+    outbound_latency.observe(seconds, service, method, status)
+
+
+def instrument_flask(app):
+    """Time every request by its URL rule and serve /metrics"""
+    from flask import Response, g, request
+
+    @app.before_request
+    def _start_timer():
+        g._metrics_started = time.perf_counter()
+
+    @app.after_request
+    def _record(response):
+        started = g.pop("_metrics_started", None)
+        if started is not None:
+            route = request.url_rule.rule if request.url_rule is not None else "unmatched"
+            http_latency.observe(time.perf_counter() - started, request.method, route)
+            http_requests.inc(request.method, route, response.status_code)
+        return response
+
+    @app.route("/metrics")
+    def metrics():
+        return Response(REGISTRY.render(), mimetype=CONTENT_TYPE)
+
+
+def instrument_fastapi(app):
+    """Time every request by its route path and serve /metrics"""
+    from fastapi import Request, Response
+
+    @app.middleware("http")
+    async def _record(request: Request, call_next):
+        started = time.perf_counter()
+        status = 500
+        try:
+            response = await call_next(request)
+            status = response.status_code
+            return response
+        finally:
+            route = request.scope.get("route")
+            route = route.path if route is not None else "unmatched"
+            http_latency.observe(time.perf_counter() - started, request.method, route)
+            http_requests.inc(request.method, route, status)
+
+    @app.get("/metrics", include_in_schema=False)
+    async def metrics():
+        return Response(REGISTRY.render(), media_type=CONTENT_TYPE)
+
+
+def instrument_sqlalchemy_pool(engine, name="default"):
+    """Export checked-out/overflow/size gauges for an (async or sync) engine's pool"""
+    pool = getattr(engine, "sync_engine", engine).pool
+    REGISTRY.gauge_callback("sqlalchemy_pool_checked_out", "Connections currently checked out",
+                            lambda: {(name,): pool.checkedout()}, ("pool",))
+    REGISTRY.gauge_callback("sqlalchemy_pool_overflow", "Connections open beyond pool_size (negative: unused capacity)",
+                            lambda: {(name,): pool.overflow()}, ("pool",))
+    REGISTRY.gauge_callback("sqlalchemy_pool_size", "Configured pool size",
+                            lambda: {(name,): pool.size()}, ("pool",))
+
+
+def mongo_listener():
+    """pymongo CommandListener timing every command; pass it in MongoClient(event_listeners=[...])"""
+    from pymongo import monitoring
+
+    class MongoCommandTimer(monitoring.CommandListener):
+        def started(self, event):
+            pass
+
+        def succeeded(self, event):
+            mongo_latency.observe(event.duration_micros / 1e6, event.command_name, "ok")
+
+        def failed(self, event):
+            mongo_latency.observe(event.duration_micros / 1e6, event.command_name, "error")
+
+    return MongoCommandTimer()
+
+
+def instrument_requests_session(session, service):
+    """Record outbound timings for a requests.Session from each response's elapsed time"""
+    def _record(response, *args, **kwargs):
+        observe_outbound(service, response.request.method, response.status_code, response.elapsed.total_seconds())
+    session.hooks["response"].append(_record)
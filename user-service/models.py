@@ -1,4 +1,4 @@
-from sqlalchemy import Column, Integer, String
+from sqlalchemy import Column, DateTime, Integer, String, func
 from database import Base
 
 class User(Base):
@@ -6,4 +6,18 @@ class User(Base):
     id = Column(Integer, primary_key=True, index=True)
     email = Column(String, unique=True, index=True)
     password_hash = Column(String)
-    name = Column(String)
\ No newline at end of file
+    name = Column(String)
+
+
+class PendingRelease(Base):
+    """Ticket release the Event Service refused or may not have applied, waiting to be retried"""
+    __tablename__ = "pending_releases"
+    id = Column(Integer, primary_key=True)
+    event_id = Column(String, nullable=False)
+    tickets = Column(Integer, nullable=False)
+    # Event Service reservation to release; without one, `tickets` are given back as a count
+    reservation_id = Column(String)
+    attempts = Column(Integer, nullable=False, default=0)
+    # Set while a retrier is sending it; a crashed retrier's claim runs out
+    claimed_until = Column(DateTime)
+    created_at = Column(DateTime, server_default=func.now())
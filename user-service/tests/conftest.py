@@ -0,0 +1,57 @@
+"""User Service test setup
+
+Downstream services are StubService instances (benchmarks/stub_services.py)
+listening on local ports. Tests touching the users table need PostgreSQL:
+point TEST_USER_DB_URL at a scratch database (its tables are truncated
+between tests); without it those tests are skipped.
+"""
+import asyncio
+import os
+import sys
+import pytest
+
+SERVICE_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+sys.path.insert(0, SERVICE_DIR)
+
+TEST_USER_DB_URL = os.getenv("TEST_USER_DB_URL")
+# The async engine connects lazily, so main imports fine even without a database
+os.environ["USER_DB_URL"] = TEST_USER_DB_URL or "postgresql://localhost/unused"
+os.environ.setdefault("SECRET_KEY", "test-secret")
+
+from benchmarks.stub_services import StubService
+
+
+@pytest.fixture
+def main_module():
+    import main
+    main.event_cache.clear()
+    main.stale_event_cache.clear()
+    return main
+
+
+@pytest.fixture
+def event_service():
+    with StubService() as stub:
+        yield stub
+
+
+@pytest.fixture
+def booking_service():
+    with StubService() as stub:
+        yield stub
+
+
+@pytest.fixture
+def database(main_module):
+    if not TEST_USER_DB_URL:
+        pytest.skip("needs a PostgreSQL database (set TEST_USER_DB_URL)")
+    from sqlalchemy import text
+
+    async def reset():
+        async with main_module.engine.begin() as conn:
+            await conn.run_sync(main_module.Base.metadata.create_all)
+            await conn.execute(text("TRUNCATE users, pending_releases RESTART IDENTITY"))
+        await main_module.engine.dispose()
+
+    asyncio.run(reset())
+    return main_module
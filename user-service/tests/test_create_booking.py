@@ -0,0 +1,195 @@
+import asyncio
+import time
+import pytest
+from sqlalchemy import select
+from benchmarks.stub_services import StubService, gateway_client
+
+EVENT_ID = "64b000000000000000000001"
+BOOKING = {"user_id": 1, "event_id": EVENT_ID, "tickets": 2}
+CREATED = {"id": 1, "user_id": 1, "event_id": EVENT_ID, "tickets": 2, "amount": 50.0, "status": "confirmed"}
+REPLAYED = {"Idempotent-Replayed": "true"}
+
+
+@pytest.fixture
+def event_service(event_service):
+    event_service.route("GET", f"/events/{EVENT_ID}", lambda req: (200, {"_id": EVENT_ID, "price": 25.0}, {}))
+    event_service.route("POST", f"/api/events/{EVENT_ID}/reserve", lambda req: (200, {"reserved": 2}, {}))
+    event_service.route("POST", f"/api/events/{EVENT_ID}/release", lambda req: (200, {"released": 2}, {}))
+    return event_service
+
+
+@pytest.fixture
+def gateway(database, monkeypatch):
+    monkeypatch.setitem(database.downstream.ENDPOINT_TIMEOUTS, "create_booking", 0.2)
+    return database
+
+
+def created(reservation_id):
+    return {**CREATED, "reservation_id": reservation_id}
+
+
+def answers(*replies):
+    """Booking Service route giving `replies` in turn
+
+    A number is a delay before booking with the request's reservation,
+    "replay" replays that booking, and a callable is called with the request.
+    """
+    replies = list(replies)
+
+    def handler(req):
+        reply = replies.pop(0) if len(replies) > 1 else replies[0]
+        if isinstance(reply, (int, float)):
+            time.sleep(reply)
+            return 201, created(req.json()["reservation_id"]), {}
+        if reply == "replay":
+            return 201, created(req.json()["reservation_id"]), REPLAYED
+        return reply(req) if callable(reply) else reply
+    return handler
+
+
+def post_booking(main, event_service, booking_url, headers=None):
+    async def scenario():
+        from models import User
+        async with main.SessionLocal() as db:
+            db.add(User(email="buyer@example.com", password_hash="x", name="Buyer"))
+            await db.commit()
+        async with gateway_client(main, event_service.url, booking_url) as client:
+            return await client.post("/bookings", json=BOOKING, headers=headers or {})
+    return asyncio.run(scenario())
+
+
+def releases(event_service):
+    return len(event_service.calls("POST", f"/api/events/{EVENT_ID}/release"))
+
+
+def reservation_id(event_service):
+    return event_service.calls("POST", f"/api/events/{EVENT_ID}/reserve")[0].json()["reservation_id"]
+
+
+def pending(main):
+    async def rows():
+        from models import PendingRelease
+        async with main.SessionLocal() as db:
+            found = [(row.event_id, row.tickets, row.reservation_id)
+                     for row in (await db.execute(select(PendingRelease))).scalars()]
+        # Pooled connections belong to this event loop
+        await main.engine.dispose()
+        return found
+    return asyncio.run(rows())
+
+
+def test_replay_of_our_own_timed_out_attempt_keeps_the_reservation(gateway, event_service, booking_service):
+    # Attempt 0 commits but answers too late; attempt 1 gets the stored booking back
+    booking_service.route("POST", "/bookings", answers(0.5, "replay"))
+
+    response = post_booking(gateway, event_service, booking_service.url)
+
+    assert response.status_code == 200
+    assert response.json() == created(reservation_id(event_service))
+    assert releases(event_service) == 0
+    keys = {req.headers["Idempotency-Key"] for req in booking_service.calls("POST", "/bookings")}
+    assert len(keys) == 1
+
+
+def test_replay_of_an_earlier_client_request_gives_the_new_reservation_back(gateway, event_service, booking_service):
+    booking_service.route("POST", "/bookings", answers((201, created("earlier"), REPLAYED)))
+
+    response = post_booking(gateway, event_service, booking_service.url, {"Idempotency-Key": "client-key"})
+
+    assert response.status_code == 200
+    assert releases(event_service) == 1
+    release = event_service.calls("POST", f"/api/events/{EVENT_ID}/release")[0].json()
+    assert release["reservation_id"] == reservation_id(event_service)
+    assert booking_service.calls()[0].headers["Idempotency-Key"] == "client-key"
+
+
+def test_replay_of_an_earlier_client_request_after_our_retry_still_releases(gateway, event_service, booking_service):
+    earlier = (201, created("earlier"), REPLAYED)
+    booking_service.route("POST", "/bookings", answers(lambda req: time.sleep(0.5) or earlier, earlier))
+
+    response = post_booking(gateway, event_service, booking_service.url, {"Idempotency-Key": "client-key"})
+
+    assert response.status_code == 200
+    assert len(booking_service.calls()) == 2
+    assert releases(event_service) == 1
+
+
+def test_unknown_outcome_keeps_the_reservation_and_returns_the_key(gateway, event_service, booking_service):
+    booking_service.route("POST", "/bookings", answers(0.5))
+
+    response = post_booking(gateway, event_service, booking_service.url)
+
+    assert response.status_code == 504
+    assert response.headers["Idempotency-Key"] == booking_service.calls()[0].headers["Idempotency-Key"]
+    assert len(booking_service.calls()) == gateway.BOOKING_CREATE_RETRIES + 1
+    assert releases(event_service) == 0
+
+
+def test_booking_service_unreachable_releases_the_reservation(gateway, event_service):
+    with StubService() as closed:
+        url = closed.url
+
+    response = post_booking(gateway, event_service, url)
+
+    assert response.status_code == 503
+    assert releases(event_service) == 1
+
+
+def test_rejected_booking_releases_the_reservation(gateway, event_service, booking_service):
+    booking_service.route("POST", "/bookings", answers((422, {"error": "key reused"}, {})))
+
+    response = post_booking(gateway, event_service, booking_service.url, {"Idempotency-Key": "client-key"})
+
+    assert response.status_code == 422
+    assert response.json()["detail"] == "key reused"
+    assert releases(event_service) == 1
+
+
+def test_booking_service_error_page_releases_the_reservation(gateway, event_service, booking_service):
+    booking_service.route("POST", "/bookings", answers((500, b"<html>Internal Server Error</html>", {})))
+
+    response = post_booking(gateway, event_service, booking_service.url)
+
+    assert response.status_code == 502
+    assert response.json()["detail"] == "Booking failed"
+    assert releases(event_service) == 1
+
+
+def test_reserve_timeout_queues_a_release_of_that_reservation(gateway, event_service, booking_service, monkeypatch):
+    monkeypatch.setitem(gateway.downstream.ENDPOINT_TIMEOUTS, "reserve_tickets", 0.1)
+    event_service.route("POST", f"/api/events/{EVENT_ID}/reserve", lambda req: time.sleep(0.3) or (200, {}, {}))
+
+    response = post_booking(gateway, event_service, booking_service.url)
+
+    assert response.status_code == 504
+    assert pending(gateway) == [(EVENT_ID, 2, reservation_id(event_service))]
+    assert booking_service.calls() == []
+
+
+def test_reserve_refused_by_an_open_circuit_is_a_503(gateway, event_service, booking_service, monkeypatch):
+    async def refused(*args):
+        raise gateway.downstream.DownstreamUnavailable("event", "circuit open")
+    monkeypatch.setattr(gateway, "reserve_tickets", refused)
+
+    response = post_booking(gateway, event_service, booking_service.url)
+
+    assert response.status_code == 503
+    assert pending(gateway) == []
+
+
+def test_reserve_server_error_queues_a_release(gateway, event_service, booking_service):
+    event_service.route("POST", f"/api/events/{EVENT_ID}/reserve", lambda req: (500, b"upstream crashed", {}))
+
+    response = post_booking(gateway, event_service, booking_service.url)
+
+    assert response.status_code == 503
+    assert pending(gateway) == [(EVENT_ID, 2, reservation_id(event_service))]
+
+
+def test_reserve_rejection_without_a_json_body_keeps_its_status(gateway, event_service, booking_service):
+    event_service.route("POST", f"/api/events/{EVENT_ID}/reserve", lambda req: (400, b"bad request", {}))
+
+    response = post_booking(gateway, event_service, booking_service.url)
+
+    assert (response.status_code, response.json()["detail"]) == (400, "Ticket reservation failed")
+    assert pending(gateway) == []
@@ -0,0 +1,80 @@
+import asyncio
+from benchmarks.stub_services import gateway_client
+
+EVENTS = {f"64b00000000000000000000{i}": {"_id": f"64b00000000000000000000{i}", "name": f"Event {i}"}
+          for i in range(1, 4)}
+
+
+def bookings_page(req):
+    """Two pages of bookings: the first carries a cursor to the second"""
+    if req.query.get("after") == ["page-2"]:
+        return 200, {"bookings": [{"id": 1, "event_id": "64b000000000000000000001"}], "next_cursor": None}, {}
+    if req.query.get("after"):
+        return 400, {"error": "Invalid created_from, created_to or after"}, {}
+    page = [{"id": 3, "event_id": "64b000000000000000000002"}, {"id": 2, "event_id": "64b000000000000000000002"}]
+    return 200, {"bookings": page, "next_cursor": "page-2"}, {}
+
+
+def events_batch(req):
+    return 200, {"events": [EVENTS.get(eid) for eid in req.json()["ids"]]}, {}
+
+
+def get_dashboard(main, event_service, booking_service, *paths, user=True):
+    async def scenario():
+        if user:
+            from models import User
+            async with main.SessionLocal() as db:
+                db.add(User(email="reader@example.com", password_hash="x", name="Reader"))
+                await db.commit()
+        async with gateway_client(main, event_service.url, booking_service.url) as client:
+            return [await client.get(path) for path in paths]
+    return asyncio.run(scenario())
+
+
+def test_dashboard_pages_through_bookings(database, event_service, booking_service):
+    booking_service.route("GET", "/bookings", bookings_page)
+    event_service.route("POST", "/api/events/batch", events_batch)
+
+    first, second = get_dashboard(database, event_service, booking_service,
+                                  "/users/1/dashboard?limit=2", "/users/1/dashboard?limit=2&after=page-2")
+
+    assert first.status_code == second.status_code == 200
+    first, second = first.json(), second.json()
+    assert first["user"]["email"] == "reader@example.com"
+    assert [(b["id"], b["event"]["name"]) for b in first["bookings"]] == [(3, "Event 2"), (2, "Event 2")]
+    assert (first["has_more_bookings"], first["next_cursor"]) == (True, "page-2")
+    assert [(b["id"], b["event"]["name"]) for b in second["bookings"]] == [(1, "Event 1")]
+    assert (second["has_more_bookings"], second["next_cursor"]) == (False, None)
+
+    assert [req.query["limit"] for req in booking_service.calls("GET", "/bookings")] == [["2"], ["2"]]
+    # Each page's events are looked up in one batch call, each event once
+    assert [req.json()["ids"] for req in event_service.calls("POST", "/api/events/batch")] == [
+        ["64b000000000000000000002"], ["64b000000000000000000001"]]
+
+
+def test_dashboard_asks_for_the_default_page_size(database, event_service, booking_service):
+    booking_service.route("GET", "/bookings", lambda req: (200, {"bookings": [], "next_cursor": None}, {}))
+
+    [response] = get_dashboard(database, event_service, booking_service, "/users/1/dashboard")
+
+    assert response.json()["bookings"] == []
+    assert booking_service.calls()[0].query["limit"] == [str(database.DASHBOARD_BOOKINGS_LIMIT)]
+    assert event_service.calls() == []
+
+
+def test_dashboard_errors(database, event_service, booking_service):
+    booking_service.route("GET", "/bookings", bookings_page)
+
+    missing, bad_cursor = get_dashboard(database, event_service, booking_service,
+                                        "/users/2/dashboard", "/users/1/dashboard?after=bogus")
+
+    assert missing.status_code == 404
+    assert bad_cursor.status_code == 400
+
+
+def test_dashboard_is_unavailable_while_bookings_fail(database, event_service, booking_service):
+    booking_service.route("GET", "/bookings", lambda req: (500, {"error": "down"}, {}))
+
+    [response] = get_dashboard(database, event_service, booking_service, "/users/1/dashboard")
+
+    assert response.status_code == 503
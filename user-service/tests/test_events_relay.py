@@ -0,0 +1,50 @@
+import asyncio
+import gzip
+import json
+from benchmarks.stub_services import gateway_client
+
+EVENTS = [{"_id": "e1", "name": "Gig", "date": None, "price": 10.0}]
+
+
+def get(main_module, event_service, booking_service, path, headers=None):
+    async def scenario():
+        async with gateway_client(main_module, event_service.url, booking_service.url) as client:
+            return await client.get(path, headers=headers)
+    return asyncio.run(scenario())
+
+
+def test_listing_body_is_relayed_untouched(main_module, event_service, booking_service):
+    # Not an EventResponse shape: nothing on the gateway may re-validate it
+    body = json.dumps(EVENTS).encode()
+    event_service.route("GET", "/api/events", lambda req: (200, body, {
+        "Content-Type": "application/json", "X-Next-Cursor": "abc", "ETag": 'W/"1"'}))
+
+    response = get(main_module, event_service, booking_service, "/events?fields=name&available=true")
+
+    assert response.status_code == 200
+    assert response.content == body
+    assert response.headers["x-next-cursor"] == "abc"
+    assert response.headers["etag"] == 'W/"1"'
+    assert event_service.calls()[0].query == {
+        "page": ["1"], "fields": ["name"], "envelope": ["0"], "available": ["1"]}
+
+
+def test_compressed_listing_is_passed_through(main_module, event_service, booking_service):
+    compressed = gzip.compress(json.dumps(EVENTS).encode())
+    event_service.route("GET", "/api/events", lambda req: (200, compressed, {
+        "Content-Type": "application/json", "Content-Encoding": "gzip", "Vary": "Accept-Encoding"}))
+
+    response = get(main_module, event_service, booking_service, "/events", {"Accept-Encoding": "gzip"})
+
+    assert response.headers["content-encoding"] == "gzip"
+    assert response.json() == EVENTS
+    assert event_service.calls()[0].headers["Accept-Encoding"] == "gzip"
+
+
+def test_not_modified_is_forwarded(main_module, event_service, booking_service):
+    event_service.route("GET", "/api/events", lambda req: (304, b"", {"ETag": 'W/"1"'}))
+
+    response = get(main_module, event_service, booking_service, "/events", {"If-None-Match": 'W/"1"'})
+
+    assert response.status_code == 304
+    assert event_service.calls()[0].headers["If-None-Match"] == 'W/"1"'
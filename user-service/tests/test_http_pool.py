@@ -0,0 +1,79 @@
+import asyncio
+import httpcore
+import httpx
+from benchmarks.stub_services import gateway_client
+
+
+def run(main, event_service, booking_service, scenario):
+    async def wrapped():
+        async with gateway_client(main, event_service.url, booking_service.url) as client:
+            return await scenario(client)
+    return asyncio.run(wrapped())
+
+
+def test_httpx_pool_contract(main_module, event_service, booking_service):
+    """pool_stats reads AsyncHTTPTransport._pool; fail loudly if httpx moves it"""
+    downstream = main_module.downstream
+
+    async def scenario(client):
+        pooled = downstream._clients["event"]
+        return pooled._transport, pooled._transport._pool
+
+    transport, pool = run(main_module, event_service, booking_service, scenario)
+
+    assert isinstance(transport, httpx.AsyncHTTPTransport), f"httpx {httpx.__version__} changed the default transport"
+    assert isinstance(pool, httpcore.AsyncConnectionPool), f"httpx {httpx.__version__} no longer pools via httpcore"
+    assert isinstance(pool.connections, list)
+
+
+def test_sequential_requests_reuse_one_connection(main_module, event_service, booking_service):
+    event_service.route("GET", "/api/events", lambda req: (200, [], {}))
+    downstream = main_module.downstream
+
+    async def scenario(client):
+        for _ in range(5):
+            await downstream.request("event", "list_events", "GET", "/api/events")
+        return downstream.pool_stats()["event"]
+
+    stats = run(main_module, event_service, booking_service, scenario)
+
+    assert stats["requests"] == 5 and stats["in_flight"] == 0
+    assert stats["open_connections"] == 1
+    assert stats["idle_connections"] == 1 and stats["active_connections"] == 0
+
+
+def test_concurrent_requests_open_connections_that_stay_pooled(main_module, event_service, booking_service):
+    event_service.route("GET", "/api/events", lambda req: (200, [], {}))
+    event_service.delay = 0.1
+    downstream = main_module.downstream
+
+    async def scenario(client):
+        calls = [downstream.request("event", "list_events", "GET", "/api/events") for _ in range(3)]
+        in_flight = asyncio.gather(*calls)
+        await asyncio.sleep(0.05)
+        during = downstream.pool_stats()["event"]
+        await in_flight
+        return during, downstream.pool_stats()["event"]
+
+    during, after = run(main_module, event_service, booking_service, scenario)
+
+    assert during["in_flight"] == 3 and during["active_connections"] == 3
+    assert after["in_flight"] == 0
+    assert after["open_connections"] == 3 and after["idle_connections"] == 3
+
+
+def test_pool_stats_endpoint(main_module, event_service, booking_service):
+    booking_service.route("GET", "/bookings", lambda req: (200, {"bookings": [], "next_cursor": None}, {}))
+    downstream = main_module.downstream
+
+    async def scenario(client):
+        await downstream.request("booking", "list_bookings", "GET", "/bookings")
+        return (await client.get("/stats/http-pool")).json()
+
+    stats = run(main_module, event_service, booking_service, scenario)
+
+    assert set(stats) == {"event", "booking"}
+    assert stats["booking"]["base_url"] == booking_service.url
+    assert stats["booking"]["requests"] == 1 and stats["booking"]["open_connections"] == 1
+    assert stats["event"]["requests"] == 0 and stats["event"]["open_connections"] == 0
+    assert stats["event"]["circuit"]["state"] == "closed"
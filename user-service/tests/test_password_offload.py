@@ -0,0 +1,110 @@
+"""bcrypt runs on the hash executor, never on the event loop
+
+The real hash is replaced by one that blocks until the test releases it, so
+these check what runs where and what can proceed meanwhile, not how long it
+takes (benchmarks/login_latency.py measures that).
+"""
+import asyncio
+import threading
+import pytest
+import auth
+from benchmarks.stub_services import gateway_client
+
+EMAIL = "offload@example.com"
+PASSWORD = "secret"
+
+
+class BlockingHasher:
+    """Stands in for the passlib context; every call waits for `release`"""
+
+    def __init__(self):
+        self.release = threading.Event()
+        self.threads = []
+        self.running = 0
+        self.peak = 0
+        self._lock = threading.Lock()
+
+    def _call(self, result):
+        with self._lock:
+            self.threads.append(threading.current_thread().name)
+            self.running += 1
+            self.peak = max(self.peak, self.running)
+        self.release.wait(5)
+        with self._lock:
+            self.running -= 1
+        return result
+
+    def hash(self, password):
+        return self._call(f"hashed:{password}")
+
+    def verify(self, plain, hashed):
+        return self._call(hashed == f"hashed:{plain}")
+
+
+@pytest.fixture
+def hasher(monkeypatch):
+    fake = BlockingHasher()
+    monkeypatch.setattr(auth, "pwd_context", fake)
+    yield fake
+    fake.release.set()
+
+
+def test_hashing_runs_on_the_executor_while_the_loop_keeps_going(hasher):
+    async def scenario():
+        verify = asyncio.create_task(auth.verify_password_async(PASSWORD, f"hashed:{PASSWORD}"))
+        await asyncio.sleep(0)
+        # The loop is free while the hash is blocked in its worker thread
+        ticks = 0
+        for _ in range(10):
+            await asyncio.sleep(0)
+            ticks += 1
+        assert not verify.done()
+        hasher.release.set()
+        return ticks, await verify
+
+    ticks, verified = asyncio.run(scenario())
+
+    assert (ticks, verified) == (10, True)
+    assert hasher.threads[0].startswith("bcrypt") and hasher.threads[0] != threading.main_thread().name
+
+
+def test_concurrent_hashes_are_bounded_by_the_worker_count(hasher):
+    async def scenario():
+        hashes = [asyncio.create_task(auth.get_password_hash_async(f"pw{i}"))
+                  for i in range(auth.PASSWORD_HASH_WORKERS * 2)]
+        while hasher.running < auth.PASSWORD_HASH_WORKERS:
+            await asyncio.sleep(0.01)
+        await asyncio.sleep(0.05)
+        running = hasher.running
+        hasher.release.set()
+        return running, await asyncio.gather(*hashes)
+
+    running, hashed = asyncio.run(scenario())
+
+    assert running == hasher.peak == auth.PASSWORD_HASH_WORKERS
+    assert hashed == [f"hashed:pw{i}" for i in range(auth.PASSWORD_HASH_WORKERS * 2)]
+
+
+def test_events_are_served_while_a_login_is_hashing(database, hasher, event_service):
+    event_service.route("GET", "/api/events", lambda req: (200, [], {}))
+    main = database
+
+    async def scenario():
+        async with gateway_client(main, event_service.url, event_service.url) as client:
+            hasher.release.set()
+            await client.post("/register", json={"email": EMAIL, "password": PASSWORD, "name": "Offload"})
+            hasher.release.clear()
+
+            login = asyncio.create_task(client.post("/login", json={"username": EMAIL, "password": PASSWORD}))
+            while hasher.running == 0:
+                await asyncio.sleep(0.01)
+            events = await client.get("/events")
+            pending = not login.done()
+            hasher.release.set()
+            return events.status_code, pending, await login
+
+    events_status, login_pending, login = asyncio.run(scenario())
+
+    assert events_status == 200
+    assert login_pending
+    assert login.status_code == 200 and login.json()["access_token"]
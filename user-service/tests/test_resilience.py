@@ -0,0 +1,207 @@
+import asyncio
+import time
+import httpx
+import pytest
+from sqlalchemy import select
+import compensation
+from benchmarks.stub_services import StubService, gateway_client
+from models import PendingRelease
+
+EVENT_ID = "64b000000000000000000001"
+EVENT = {"_id": EVENT_ID, "name": "Gig", "price": 25.0}
+
+
+@pytest.fixture
+def breaker(main_module, monkeypatch):
+    """Breakers that open after 2 failures and allow a probe after 0.3 s"""
+    monkeypatch.setattr(main_module.downstream, "BREAKER_FAILURE_THRESHOLD", 2)
+    monkeypatch.setattr(main_module.downstream, "BREAKER_RESET_TIMEOUT", 0.3)
+    return main_module
+
+
+def run(main, event_service, booking_service, scenario):
+    async def wrapped():
+        async with gateway_client(main, event_service.url, booking_service.url):
+            return await scenario()
+    return asyncio.run(wrapped())
+
+
+def failing_then(recovered):
+    """Route answering 500 until `recovered` is set"""
+    return lambda req: (200, EVENT, {}) if recovered else (500, {"error": "down"}, {})
+
+
+def test_breaker_opens_fails_fast_and_closes_after_a_probe(breaker, event_service, booking_service):
+    recovered = []
+    event_service.route("GET", "/api/events", failing_then(recovered))
+    downstream = breaker.downstream
+
+    async def scenario():
+        for _ in range(2):
+            assert (await downstream.request("event", "list_events", "GET", "/api/events")).status_code == 500
+        with pytest.raises(downstream.DownstreamUnavailable):
+            await downstream.request("event", "list_events", "GET", "/api/events")
+        sent_while_open = len(event_service.calls())
+        assert downstream.breaker_open("event")
+
+        recovered.append(True)
+        await asyncio.sleep(0.35)
+        assert not downstream.breaker_open("event")
+        probe = await downstream.request("event", "list_events", "GET", "/api/events")
+        return sent_while_open, probe.status_code, downstream.pool_stats()["event"]["circuit"]
+
+    sent_while_open, status, circuit = run(breaker, event_service, booking_service, scenario)
+
+    assert sent_while_open == 2
+    assert status == 200
+    assert circuit["state"] == "closed"
+    assert circuit["trips"] == 1 and circuit["rejected"] == 1
+
+
+def test_failed_probe_reopens_the_breaker(breaker, event_service, booking_service):
+    event_service.route("GET", "/api/events", failing_then([]))
+    downstream = breaker.downstream
+
+    async def scenario():
+        for _ in range(2):
+            await downstream.request("event", "list_events", "GET", "/api/events")
+        await asyncio.sleep(0.35)
+        await downstream.request("event", "list_events", "GET", "/api/events")
+        return downstream.breaker_open("event")
+
+    assert run(breaker, event_service, booking_service, scenario)
+    assert len(event_service.calls()) == 3
+
+
+def test_requests_beyond_the_in_flight_limit_are_shed(main_module, event_service, booking_service, monkeypatch):
+    monkeypatch.setattr(main_module.downstream, "DOWNSTREAM_MAX_IN_FLIGHT", 2)
+    event_service.route("GET", "/api/events", lambda req: (200, [], {}))
+    event_service.delay = 0.2
+    downstream = main_module.downstream
+
+    async def scenario():
+        results = await asyncio.gather(
+            *(downstream.request("event", "list_events", "GET", "/api/events") for _ in range(5)),
+            return_exceptions=True)
+        return results, downstream.pool_stats()["event"]["shed"]
+
+    results, shed = run(main_module, event_service, booking_service, scenario)
+
+    assert sum(isinstance(r, httpx.Response) for r in results) == 2
+    assert sum(isinstance(r, downstream.DownstreamUnavailable) for r in results) == 3
+    assert shed == 3
+    assert len(event_service.calls()) == 2
+
+
+def test_stale_event_is_served_while_the_event_service_is_down(main_module, event_service, booking_service,
+                                                               monkeypatch):
+    monkeypatch.setattr(main_module, "EVENT_CLIENT_CACHE_TTL", 0)
+    up = [True]
+    event_service.route("GET", f"/events/{EVENT_ID}",
+                        lambda req: (200, EVENT, {}) if up else None)
+
+    async def scenario():
+        fresh = await main_module.fetch_event(EVENT_ID)
+        up.clear()
+        return fresh, await main_module.fetch_event(EVENT_ID)
+
+    fresh, stale = run(main_module, event_service, booking_service, scenario)
+
+    assert fresh == stale == EVENT
+    assert len(event_service.calls()) == 2
+
+
+def pending(main):
+    async def rows():
+        async with main.SessionLocal() as db:
+            return [(row.event_id, row.tickets) for row in (await db.execute(select(PendingRelease))).scalars()]
+    return rows()
+
+
+def test_release_refused_by_an_open_circuit_is_queued_and_retried(database, event_service, booking_service,
+                                                                   monkeypatch):
+    main = database
+    monkeypatch.setattr(main.downstream, "BREAKER_FAILURE_THRESHOLD", 1)
+    monkeypatch.setattr(main.downstream, "BREAKER_RESET_TIMEOUT", 0.3)
+    recovered = []
+    event_service.route("GET", "/api/events", failing_then(recovered))
+    event_service.route("POST", f"/api/events/{EVENT_ID}/release", lambda req: (200, {"released": 2}, {}))
+
+    async def scenario():
+        await main.downstream.request("event", "list_events", "GET", "/api/events")
+        await main.release_tickets(EVENT_ID, 2)
+        queued = await pending(main)
+        # Nothing is sent while the circuit is open
+        skipped = await compensation.retry_pending(main.send_release)
+        recovered.append(True)
+        await asyncio.sleep(0.35)
+        released = await compensation.retry_pending(main.send_release)
+        return queued, skipped, released, await pending(main)
+
+    queued, skipped, released, left = run(main, event_service, booking_service, scenario)
+
+    assert queued == [(EVENT_ID, 2)]
+    assert (skipped, released, left) == (0, 1, [])
+    assert len(event_service.calls("POST", f"/api/events/{EVENT_ID}/release")) == 1
+
+
+def test_release_with_an_unknown_outcome_is_resent_by_reservation_id(database, event_service, booking_service,
+                                                                     monkeypatch):
+    main = database
+    monkeypatch.setitem(main.downstream.ENDPOINT_TIMEOUTS, "release_tickets", 0.1)
+    slow = [True]
+    event_service.route("POST", f"/api/events/{EVENT_ID}/release",
+                        lambda req: (slow and time.sleep(0.3)) or (200, {"released": 2}, {}))
+
+    async def scenario():
+        await main.release_tickets(EVENT_ID, 2, "reservation-1")
+        queued = await pending(main)
+        slow.clear()
+        return queued, await compensation.retry_pending(main.send_release), await pending(main)
+
+    queued, released, left = run(main, event_service, booking_service, scenario)
+
+    assert (queued, released, left) == ([(EVENT_ID, 2)], 1, [])
+    sent = event_service.calls("POST", f"/api/events/{EVENT_ID}/release")
+    assert [req.json()["reservation_id"] for req in sent] == ["reservation-1"] * 2
+
+
+def test_release_by_count_with_an_unknown_outcome_is_not_resent(database, event_service, booking_service,
+                                                                monkeypatch):
+    main = database
+    monkeypatch.setitem(main.downstream.ENDPOINT_TIMEOUTS, "release_tickets", 0.1)
+    event_service.route("POST", f"/api/events/{EVENT_ID}/release",
+                        lambda req: time.sleep(0.3) or (200, {"released": 2}, {}))
+
+    async def scenario():
+        await main.release_tickets(EVENT_ID, 2)
+        return await pending(main)
+
+    assert run(main, event_service, booking_service, scenario) == []
+
+
+def test_queued_releases_are_claimed_not_locked_while_sent(database, event_service, booking_service):
+    main = database
+    outcomes = [compensation.RETRY, compensation.RELEASED]
+
+    async def send(event_id, tickets, reservation_id):
+        # Another retrier finds nothing to claim, and the row can be locked at once
+        others = await compensation.claim_pending(10)
+        async with main.SessionLocal() as db:
+            await db.execute(select(PendingRelease).with_for_update(nowait=True))
+            await db.commit()
+        seen.append((reservation_id, others))
+        return outcomes.pop(0)
+
+    async def scenario():
+        await compensation.queue_release(EVENT_ID, 2, "reservation-1")
+        retried = await compensation.retry_pending(send)
+        async with main.SessionLocal() as db:
+            attempts = (await db.execute(select(PendingRelease.attempts))).scalar_one()
+        return retried, attempts, await compensation.retry_pending(send), await pending(main)
+
+    seen = []
+    retried, attempts, released, left = run(main, event_service, booking_service, scenario)
+
+    assert seen == [("reservation-1", []), ("reservation-1", [])]
+    assert (retried, attempts, released, left) == (0, 1, 1, [])